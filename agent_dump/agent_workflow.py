@@ -9,10 +9,16 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'emotuna.settings')
 import django
 django.setup()
 
+import logging
+import time
+
+from django.conf import settings
+
 from agent_dump.tidb_vector_utils import TiDBVectorDB
 from sklearn.feature_extraction.text import TfidfVectorizer
 import numpy as np
-from openai import OpenAI
+
+logger = logging.getLogger(__name__)
 
 # --- Embedding logic ---
 _vectorizer = TfidfVectorizer()
@@ -38,16 +44,25 @@ def get_embedding(text):
 
 # --- Kimi API setup ---
 KIMI_KEY = os.getenv('KIMI_KEY')
-KIMI_BASE_URL = 'https://api.moonshot.ai/v1'
+KIMI_BASE_URL = os.getenv('KIMI_BASE_URL', 'https://api.moonshot.ai/v1')
 KIMI_MODEL = 'kimi-k2-0905-preview'
 
-if not KIMI_KEY:
-    raise RuntimeError("KIMI_KEY not set in environment variables.")
+_client = None
+
 
-client = OpenAI(
-    api_key=KIMI_KEY,
-    base_url=KIMI_BASE_URL,
-)
+class LLMUnavailable(Exception):
+    """The LLM failed or did not answer within the reply deadline."""
+
+
+def get_client():
+    """The Kimi (OpenAI-compatible) client, created on first use."""
+    global _client
+    if _client is None:
+        if not KIMI_KEY:
+            raise RuntimeError("KIMI_KEY not set in environment variables.")
+        from openai import OpenAI
+        _client = OpenAI(api_key=KIMI_KEY, base_url=KIMI_BASE_URL)
+    return _client
 
 
 
@@ -61,12 +76,20 @@ def cosine_similarity(a, b):
 
 
 def find_similar_messages(query, username, top_n=3):
-    """Find top-N similar messages for a user."""
+    """Find top-N similar messages among the user's own embedded messages."""
+    from django.contrib.auth.models import User
+    user_id = User.objects.filter(username=username).values_list('id', flat=True).first()
+    if user_id is None:
+        return []
     db = TiDBVectorDB()
     db.create_table()
     query_emb = get_embedding(query).astype(np.float32)
     with db.conn.cursor() as cursor:
-        cursor.execute('SELECT id, user_id, message, embedding, embedding_shape, reply_message FROM message_embeddings')
+        # Replies may be reused verbatim (retrieval_reply): never look at other users' messages
+        cursor.execute(
+            'SELECT id, user_id, message, embedding, embedding_shape, reply_message FROM message_embeddings WHERE user_id = %s',
+            (user_id,)
+        )
         rows = cursor.fetchall()
     similarities = []
     for row in rows:
@@ -82,7 +105,6 @@ def find_similar_messages(query, username, top_n=3):
             except Exception:
                 continue
         emb = np.frombuffer(emb_bytes, dtype=np.float32)[:emb_len]
-        # Optionally filter by user_id if you want strict per-user retrieval
         sim = cosine_similarity(query_emb, emb)
         similarities.append((sim, msg_text, reply_text))
     similarities.sort(reverse=True, key=lambda x: x[0])
@@ -90,7 +112,12 @@ def find_similar_messages(query, username, top_n=3):
     return similarities[:top_n]
 
 
-def call_kimi_api(prompt):
+def call_kimi_api(prompt, timeout=None):
+    """
+    The model's reply to `prompt`. Raises LLMUnavailable on any API error or
+    when no answer arrives within `timeout` seconds (no retries then, so the
+    caller's deadline holds).
+    """
     system_prompt = (
         "You are Kimi, an AI assistant provided by Moonshot AI. "
         "You are proficient in Chinese and English conversations. "
@@ -98,6 +125,9 @@ def call_kimi_api(prompt):
         "You will reject any questions involving terrorism, racism, or explicit content. "
         "Moonshot AI is a proper noun and should not be translated."
     )
+    client = get_client()
+    if timeout is not None:
+        client = client.with_options(timeout=timeout, max_retries=0)
     try:
         completion = client.chat.completions.create(
             model=KIMI_MODEL,
@@ -107,20 +137,61 @@ def call_kimi_api(prompt):
             ],
             temperature=0.6,
         )
-        return completion.choices[0].message.content
     except Exception as e:
-        return f"[Kimi API error: {e}]"
+        raise LLMUnavailable(str(e)) from e
+    content = completion.choices[0].message.content
+    if not content:
+        raise LLMUnavailable("empty completion")
+    return content
 
 
-def agent_generate_reply(new_message, username):
-    """Generate a reply in the user's style using similar messages as context."""
+def retrieval_reply(similar, min_similarity=None):
+    """The nearest past reply if it is similar enough to reuse as is, else None."""
+    if min_similarity is None:
+        min_similarity = settings.REPLY_FALLBACK_MIN_SIMILARITY
+    for sim, msg, reply in similar:
+        if reply:
+            return reply if sim >= min_similarity else None
+    return None
+
+
+def format_history(history):
+    """('contact' | 'user', text) lines of the ongoing conversation as prompt text."""
+    speakers = {'contact': 'Contact', 'user': 'User'}
+    return "".join(f"{speakers[role]}: {text}\n" for role, text in history)
+
+
+def agent_generate_reply(new_message, username, history=None):
+    """
+    Generate a reply in the user's style using similar messages as context.
+    `history` is the recent conversation with this contact, oldest first, as
+    ('contact' | 'user', text) pairs (see agent_dump.conversation_context).
+
+    The whole call is bounded by LLM_REPLY_DEADLINE seconds. If the LLM fails
+    or is still silent by then, the nearest past reply is reused when it is at
+    least REPLY_FALLBACK_MIN_SIMILARITY similar; otherwise None is returned and
+    the message waits for the user to write a reply.
+    """
+    deadline = time.monotonic() + settings.LLM_REPLY_DEADLINE
     similar = find_similar_messages(new_message, username, top_n=3)
     context = ""
     for sim, msg, reply in similar:
         context += f"Past message: {msg}\nUser reply: {reply}\n"
+    if history:
+        context += f"\nRecent conversation:\n{format_history(history)}"
     prompt = f"{context}\nNew message: {new_message}\nReply in the user's style:"
-    ai_reply = call_kimi_api(prompt)
-    return ai_reply
+    remaining = deadline - time.monotonic()
+    try:
+        if remaining <= 0:
+            raise LLMUnavailable("deadline spent on retrieval")
+        return call_kimi_api(prompt, timeout=remaining)
+    except LLMUnavailable as e:
+        fallback = retrieval_reply(similar)
+        logger.warning(
+            "LLM unavailable, %s: %s", "reusing nearest past reply" if fallback else "leaving reply to the user", e,
+            extra={"user": username},
+        )
+        return fallback
 
 
 def main():
@@ -128,7 +199,7 @@ def main():
     new_message = input('Enter a new message: ')
     reply = agent_generate_reply(new_message, username)
     print('\nAI-generated reply:')
-    print(reply)
+    print(reply or '(none: the LLM did not answer in time and no past reply was close enough)')
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,86 @@
+"""
+Recent conversation per contact, kept in memory for prompt building.
+
+agent_generate_reply retrieves the user's most similar past messages but
+knows nothing about the conversation in progress. Each TelegramUserBotManager
+keeps a ConversationBuffers: for every contact it has talked to recently, a
+ring buffer (deque with maxlen) of the last CONVERSATION_CONTEXT_TURNS lines,
+as ('contact' | 'user', text).
+
+A buffer is seeded with one query from ChatMessage the first time a contact
+writes, then kept current by the handler (incoming messages) and the send
+paths (replies actually sent), so later messages build their prompt without a
+database round-trip. Buffers untouched for CONVERSATION_CONTEXT_IDLE seconds
+are dropped and seeded again if the contact comes back.
+
+All methods except load() are called from the bot's event loop only.
+"""
+
+import time
+from collections import deque
+
+from django.conf import settings
+
+from chat.models import ChatMessage
+
+
+def history_lines(rows):
+    """Chronological (message, reply_message, reply_sent) rows as ('contact' | 'user', text) lines."""
+    lines = []
+    for message, reply, sent in rows:
+        if message:
+            lines.append(('contact', message))
+        if reply and sent:
+            lines.append(('user', reply))
+    return lines
+
+
+class ConversationBuffers:
+    def __init__(self, user, turns=None, idle=None):
+        self.user = user
+        self.turns = turns or settings.CONVERSATION_CONTEXT_TURNS
+        self.idle = idle or settings.CONVERSATION_CONTEXT_IDLE
+        # {contact_id: [deque, last_used]}
+        self._buffers = {}
+        self._last_sweep = time.monotonic()
+
+    def __len__(self):
+        return len(self._buffers)
+
+    def load(self, contact_id):
+        """Recent lines for a contact from the database (sync; one query)."""
+        rows = (
+            ChatMessage.objects.filter(user=self.user, contact_id=contact_id)
+            .order_by('-timestamp', '-id')
+            .values_list('message', 'reply_message', 'reply_sent')[:self.turns]
+        )
+        return history_lines(reversed(list(rows)))[-self.turns:]
+
+    def get(self, contact_id):
+        """The contact's recent lines, oldest first, or None if not buffered yet."""
+        self._sweep()
+        entry = self._buffers.get(contact_id)
+        if entry is None:
+            return None
+        entry[1] = time.monotonic()
+        return list(entry[0])
+
+    def seed(self, contact_id, lines):
+        self._buffers[contact_id] = [deque(lines, maxlen=self.turns), time.monotonic()]
+        return list(lines)
+
+    def append(self, contact_id, role, text):
+        # Not buffered: seeded from the database (which has this line) when next needed
+        entry = self._buffers.get(contact_id)
+        if entry is None or not text:
+            return
+        entry[0].append((role, text))
+        entry[1] = time.monotonic()
+
+    def _sweep(self):
+        now = time.monotonic()
+        if now - self._last_sweep < min(self.idle, 60):
+            return
+        self._last_sweep = now
+        for contact_id in [c for c, (_, used) in self._buffers.items() if now - used > self.idle]:
+            del self._buffers[contact_id]
@@ -0,0 +1,176 @@
+"""
+Bulk import of a user's Telegram chat history to seed reply retrieval.
+
+Runs on a started userbot's event loop with its client (a second client on
+the same session would be rejected by Telegram). Private dialogs are walked
+newest to oldest with iter_messages, TELEGRAM_HISTORY_PAGE_SIZE messages at a
+time. Each page is grouped into turns (consecutive incoming messages and the
+user's replies that follow them), bulk-inserted as ChatMessage rows and
+queued for batched classification and embedding in the same transaction that
+advances the checkpoint on TelegramHistoryImport. Only one page is held in
+memory, and a bot started again continues from the checkpoint.
+"""
+
+import logging
+from collections import namedtuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from chat.models import ChatMessage, Contact, TelegramHistoryImport
+
+logger = logging.getLogger(__name__)
+
+Turn = namedtuple('Turn', 'incoming outgoing')
+
+
+def pair_turns(messages, hold_back=True):
+    """
+    Group chronological messages into turns. With `hold_back`, the oldest turn
+    is left out because its incoming part may continue on the previous page.
+    Returns (turns, resume_id): the next page should be fetched with
+    offset_id=resume_id, i.e. start again just before the first kept turn.
+    """
+    turns = []
+    for message in messages:
+        if not message.out:
+            if not turns or turns[-1].outgoing:
+                turns.append(Turn([], []))
+            turns[-1].incoming.append(message)
+        else:
+            if not turns:
+                turns.append(Turn([], []))
+            turns[-1].outgoing.append(message)
+    if hold_back and len(turns) > 1:
+        turns.pop(0)
+    resume_id = (turns[0].incoming or turns[0].outgoing)[0].id if turns else 0
+    return turns, resume_id
+
+
+def _join(messages):
+    return '\n'.join(m.raw_text for m in messages if m.raw_text) or None
+
+
+class HistoryImporter:
+    def __init__(self, bot, record):
+        self.bot = bot
+        self.client = bot.client
+        self.user = bot.user
+        self.record = record
+        self.page_size = settings.TELEGRAM_HISTORY_PAGE_SIZE
+        self.max_per_dialog = settings.TELEGRAM_HISTORY_MAX_PER_DIALOG
+
+    async def run(self):
+        logger.info("History import started", extra={"user": self.user.username, "import_id": self.record.id})
+        try:
+            for dialog in await self._dialogs():
+                if not self.bot.running:
+                    # Left 'running': picked up again when the bot next starts
+                    return
+                await self._import_dialog(dialog)
+        except Exception as e:
+            logger.exception("History import failed", extra={"user": self.user.username, "import_id": self.record.id})
+            await sync_to_async(self._finish)('failed', str(e))
+            return
+        if self.bot.running:
+            await sync_to_async(self._finish)('done')
+            logger.info("History import finished", extra={
+                "user": self.user.username, "import_id": self.record.id,
+                "messages_fetched": self.record.messages_fetched, "messages_created": self.record.messages_created,
+            })
+
+    async def _dialogs(self):
+        done = set(self.record.completed_dialogs)
+        dialogs = [
+            dialog async for dialog in self.client.iter_dialogs()
+            if dialog.is_user and dialog.id not in done
+            and not getattr(dialog.entity, 'bot', False) and not getattr(dialog.entity, 'is_self', False)
+        ]
+        # The dialog interrupted last time goes first, so its checkpoint still applies
+        dialogs.sort(key=lambda dialog: dialog.id != self.record.dialog_id)
+        return dialogs
+
+    async def _import_dialog(self, dialog):
+        record = self.record
+        if record.dialog_id != dialog.id:
+            record.dialog_id, record.offset_id, record.dialog_fetched = dialog.id, 0, 0
+        contact_id = await sync_to_async(self._contact_id)(dialog.entity)
+        while self.bot.running:
+            limit = min(self.page_size, self.max_per_dialog - record.dialog_fetched)
+            page = []
+            if limit > 0:
+                page = [m async for m in self.client.iter_messages(dialog.entity, limit=limit, offset_id=record.offset_id)]
+            last = len(page) < limit or record.dialog_fetched + len(page) >= self.max_per_dialog
+            turns, resume_id = pair_turns(page[::-1], hold_back=not last)
+            consumed = len(page) if last else sum(1 for m in page if m.id >= resume_id)
+            await sync_to_async(self._store_page)(dialog.id, contact_id, turns, resume_id, consumed, last)
+            if last:
+                return
+
+    def _contact_id(self, entity):
+        username = getattr(entity, 'username', None)
+        name = username or getattr(entity, 'first_name', None) or str(entity.id)
+        contact, created = Contact.objects.get_or_create(user=self.user, name=name, platform='Telegram')
+        if not contact.telegram_user_id or (username and not contact.telegram_username):
+            contact.telegram_user_id = contact.telegram_user_id or entity.id
+            contact.telegram_username = contact.telegram_username or username
+            contact.save(update_fields=['telegram_user_id', 'telegram_username'])
+        return contact.id
+
+    def _rows(self, dialog_id, contact_id, turns):
+        # Messages newer than the import belong to the live handler
+        turns = [t for t in turns if t.incoming and t.incoming[-1].date < self.record.created_at]
+        existing = set(ChatMessage.objects.filter(
+            user=self.user, telegram_chat_id=dialog_id, telegram_message_id__in=[m.id for t in turns for m in t.incoming],
+        ).values_list('telegram_message_id', flat=True))
+        rows = []
+        for turn in turns:
+            message = _join(turn.incoming)
+            if not message or existing.intersection(m.id for m in turn.incoming):
+                continue
+            reply = _join(turn.outgoing)
+            # The user's own past reply: nothing to approve or send
+            rows.append(ChatMessage(
+                user=self.user,
+                contact_id=contact_id,
+                timestamp=turn.incoming[-1].date,
+                message=message,
+                reply_message=reply,
+                user_approved_reply=reply is not None,
+                reply_sent=True,
+                platform='Telegram',
+                telegram_chat_id=dialog_id,
+                telegram_message_id=turn.incoming[-1].id,
+            ))
+        return rows
+
+    def _store_page(self, dialog_id, contact_id, turns, resume_id, consumed, last):
+        from analytics.rollups import record_created
+        from chat.tasks import classify_messages, embed_messages
+        record = self.record
+        with transaction.atomic():
+            created = ChatMessage.objects.bulk_create(self._rows(dialog_id, contact_id, turns))
+            # bulk_create sends no post_save
+            record_created(created)
+            record.messages_fetched += consumed
+            record.messages_created += len(created)
+            if last:
+                record.completed_dialogs.append(dialog_id)
+                record.dialog_id, record.offset_id, record.dialog_fetched = None, 0, 0
+            else:
+                record.offset_id = resume_id
+                record.dialog_fetched += consumed
+            record.save(update_fields=[
+                'completed_dialogs', 'dialog_id', 'offset_id', 'dialog_fetched', 'messages_fetched', 'messages_created', 'updated_at',
+            ])
+            if created:
+                ids = [m.id for m in created]
+                classify_messages.enqueue({'message_ids': ids}, user=self.user)
+                embed_messages.enqueue({'user_id': self.user.id, 'message_ids': ids}, user=self.user)
+
+    def _finish(self, status, error=None):
+        # update(), not save(): after a failure the in-memory checkpoint may be ahead of the database
+        TelegramHistoryImport.objects.filter(pk=self.record.pk).update(status=status, error=error, finished_at=timezone.now())
+        self.record.status = status
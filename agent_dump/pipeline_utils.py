@@ -10,12 +10,75 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'emotuna.settings')
 import django
 django.setup()
 
+from django.db import transaction
 from chat.models import ChatMessage
 from agent_dump.tidb_vector_utils import TiDBVectorDB
 from sklearn.feature_extraction.text import TfidfVectorizer
 import numpy as np
 import requests
+import logging
 
+logger = logging.getLogger(__name__)
+
+
+CLASSIFICATION_MODEL = 'facebook/bart-large-mnli'
+SENTIMENT_MODEL = 'cardiffnlp/twitter-roberta-base-sentiment-latest'
+TOXICITY_MODEL = 'unitary/toxic-bert'
+CLASSIFICATION_LABELS = ["important", "toxic", "nsfw", "joy", "anger", "sadness", "fear", "surprise", "neutral"]
+EMOTION_LABELS = ["joy", "anger", "sadness", "fear", "surprise", "neutral"]
+CLASSIFIED_FIELDS = ['is_important', 'is_toxic', 'is_nsfw', 'emotion', 'sentiment']
+# Texts per Hugging Face request when classifying in bulk
+CLASSIFY_BATCH_SIZE = 32
+
+
+def _hf_endpoint():
+    HF_API_KEY = os.getenv('HF_API_KEY')
+    if not HF_API_KEY:
+        raise RuntimeError("HF_API_KEY not set in environment variables.")
+    HF_API_URL = os.getenv('HF_API_URL', 'https://api-inference.huggingface.co/models/')
+    return HF_API_URL, {"Authorization": f"Bearer {HF_API_KEY}"}
+
+
+def _query_hf(endpoint, model, payload):
+    url, headers = endpoint
+    try:
+        response = requests.post(url + model, headers=headers, json=payload, timeout=15)
+        response.raise_for_status()
+        return response.json()
+    except Exception as e:
+        logger.warning("HF API error for %s: %s", model, e)
+        return {}
+
+
+def _label_scores(result):
+    scores = {lbl: 0 for lbl in CLASSIFICATION_LABELS}
+    if isinstance(result, dict) and 'labels' in result and 'scores' in result:
+        for lbl, score in zip(result['labels'], result['scores']):
+            scores[lbl] = score
+    return scores
+
+
+def _sentiment_label(result):
+    while isinstance(result, list) and result:
+        result = result[0]
+    return result.get('label', None) if isinstance(result, dict) else None
+
+
+def _is_toxic(entries):
+    try:
+        toxic_score = next((x['score'] for x in entries if x['label'] == 'toxic'), 0)
+        return toxic_score > 0.5
+    except Exception:
+        return False
+
+
+def _apply_classification(msg, scores, sentiment, toxic):
+    msg.is_important = scores.get('important', 0) > 0.5
+    msg.is_toxic = scores.get('toxic', 0) > 0.5 or toxic
+    msg.is_nsfw = scores.get('nsfw', 0) > 0.5
+    # Set emotion to the label with the highest score among emotion labels
+    msg.emotion = max(EMOTION_LABELS, key=lambda lbl: scores.get(lbl, 0)) if any(scores.get(lbl, 0) > 0 for lbl in EMOTION_LABELS) else None
+    msg.sentiment = sentiment
 
 
 def classify_new_message(msg):
@@ -23,63 +86,54 @@ def classify_new_message(msg):
     Classify a single ChatMessage instance (update emotion, sentiment, etc. in-place and save).
     Accepts either a ChatMessage instance or a message ID.
     """
-    HF_API_KEY = os.getenv('HF_API_KEY')
-    if not HF_API_KEY:
-        raise RuntimeError("HF_API_KEY not set in environment variables.")
-    HF_API_URL = 'https://api-inference.huggingface.co/models/'
-    CLASSIFICATION_MODEL = 'facebook/bart-large-mnli'
-    SENTIMENT_MODEL = 'cardiffnlp/twitter-roberta-base-sentiment-latest'
-    TOXICITY_MODEL = 'unitary/toxic-bert'
-    HEADERS = {"Authorization": f"Bearer {HF_API_KEY}"}
-
-    def query_hf(model, payload):
-        try:
-            response = requests.post(HF_API_URL + model, headers=HEADERS, json=payload, timeout=15)
-            response.raise_for_status()
-            return response.json()
-        except Exception as e:
-            print(f"[HF API error for {model}]: {e}")
-            return {}
-
-    def classify_message(message):
-        labels = ["important", "toxic", "nsfw", "joy", "anger", "sadness", "fear", "surprise", "neutral"]
-        result = query_hf(CLASSIFICATION_MODEL, {"inputs": message, "parameters": {"candidate_labels": labels}})
-        scores = {lbl: 0 for lbl in labels}
-        if 'labels' in result and 'scores' in result:
-            for lbl, score in zip(result['labels'], result['scores']):
-                scores[lbl] = score
-        return scores
-
-    def detect_sentiment(message):
-        result = query_hf(SENTIMENT_MODEL, {"inputs": message})
-        if isinstance(result, list):
-            result = result[0]
-        if isinstance(result, list):
-            result = result[0]
-        return result.get('label', None)
-
-    def detect_toxicity(message):
-        result = query_hf(TOXICITY_MODEL, {"inputs": message})
-        try:
-            toxic_score = next((x['score'] for x in result[0] if x['label'] == 'toxic'), 0)
-            return toxic_score > 0.5
-        except Exception:
-            return False
-
+    endpoint = _hf_endpoint()
     # Accept either a ChatMessage instance or an ID
     if isinstance(msg, int):
         msg = ChatMessage.objects.get(id=msg)
-    print(f"Classifying: {msg.message}")
-    scores = classify_message(msg.message)
-    msg.is_important = scores.get('important', 0) > 0.5
-    msg.is_toxic = scores.get('toxic', 0) > 0.5 or detect_toxicity(msg.message)
-    msg.is_nsfw = scores.get('nsfw', 0) > 0.5
-    # Set emotion to the label with the highest score among emotion labels
-    emotion_labels = ["joy", "anger", "sadness", "fear", "surprise", "neutral"]
-    msg.emotion = max(emotion_labels, key=lambda lbl: scores.get(lbl, 0)) if any(scores.get(lbl, 0) > 0 for lbl in emotion_labels) else None
-    msg.sentiment = detect_sentiment(msg.message)
-    msg.save()
-    print(f'Classification complete for message id={msg.id}.')
+    logger.debug("Classifying message", extra={"message_id": msg.id, "user_id": msg.user_id})
+    scores = _label_scores(_query_hf(endpoint, CLASSIFICATION_MODEL, {"inputs": msg.message, "parameters": {"candidate_labels": CLASSIFICATION_LABELS}}))
+    toxic = False
+    if not scores.get('toxic', 0) > 0.5:
+        result = _query_hf(endpoint, TOXICITY_MODEL, {"inputs": msg.message})
+        toxic = _is_toxic(result[0]) if isinstance(result, list) and result else False
+    sentiment = _sentiment_label(_query_hf(endpoint, SENTIMENT_MODEL, {"inputs": msg.message}))
+    _apply_classification(msg, scores, sentiment, toxic)
+    msg.save(update_fields=CLASSIFIED_FIELDS)
+    logger.debug("Classification complete", extra={"message_id": msg.id, "user_id": msg.user_id})
+
+
+def _batch_results(result, size):
+    # A batched call answers with one entry per input; anything else (an error) counts as no result
+    return result if isinstance(result, list) and len(result) == size else [None] * size
+
+
+def classify_messages(msgs, batch_size=CLASSIFY_BATCH_SIZE):
+    """
+    Classify many ChatMessage instances (or IDs) with batched Hugging Face requests:
+    one call per model for every `batch_size` texts instead of three per message.
+    Rows are written with bulk_update and the analytics rollups adjusted in one pass.
+    """
+    from analytics.rollups import record_updated
+    endpoint = _hf_endpoint()
+    ids = [m if isinstance(m, int) else m.id for m in msgs]
+    classified = 0
+    for start in range(0, len(ids), batch_size):
+        batch = [m for m in ChatMessage.objects.filter(id__in=ids[start:start + batch_size]).order_by('id') if m.message]
+        if not batch:
+            continue
+        texts = [m.message for m in batch]
+        label_results = _batch_results(_query_hf(endpoint, CLASSIFICATION_MODEL, {"inputs": texts, "parameters": {"candidate_labels": CLASSIFICATION_LABELS}}), len(batch))
+        toxicity_results = _batch_results(_query_hf(endpoint, TOXICITY_MODEL, {"inputs": texts}), len(batch))
+        sentiment_results = _batch_results(_query_hf(endpoint, SENTIMENT_MODEL, {"inputs": texts}), len(batch))
+        for msg, labels, toxicity, sentiment in zip(batch, label_results, toxicity_results, sentiment_results):
+            _apply_classification(msg, _label_scores(labels), _sentiment_label(sentiment), _is_toxic(toxicity or []))
+        with transaction.atomic():
+            ChatMessage.objects.bulk_update(batch, CLASSIFIED_FIELDS)
+            # bulk_update sends no post_save
+            record_updated(batch)
+        classified += len(batch)
+    logger.debug("Batch classification complete", extra={"count": classified})
+    return classified
 
 
 
@@ -102,7 +156,7 @@ def embed_new_message(msg):
     reply_texts = [m.reply_message for m in messages if m.reply_message]
     fit_corpus = texts + reply_texts if reply_texts else texts
     if not fit_corpus:
-        print('No messages to embed.')
+        logger.debug("No messages to embed", extra={"user_id": user_id})
         db.close()
         return
     vectorizer = TfidfVectorizer()
@@ -118,4 +172,46 @@ def embed_new_message(msg):
         reply_emb.astype(np.float32) if reply_emb is not None else None
     )
     db.close()
-    print(f'Embedding stored in TiDB for message id={msg.id}.')
+    logger.debug("Embedding stored in TiDB", extra={"message_id": msg.id, "user_id": msg.user_id})
+
+
+
+def embed_messages(msgs, user_id):
+    """
+    Embed many ChatMessage instances (or IDs) of one user in a single pass and store them in TiDB.
+    Fits the user's TfidfVectorizer once and transforms all texts together, instead of
+    refitting per message as embed_new_message does.
+    """
+    ids = [m if isinstance(m, int) else m.id for m in msgs]
+    if not ids:
+        return
+    corpus = ChatMessage.objects.filter(user_id=user_id).values_list('message', 'reply_message')
+    texts = []
+    reply_texts = []
+    for message, reply in corpus.iterator(chunk_size=2000):
+        if message:
+            texts.append(message)
+        if reply:
+            reply_texts.append(reply)
+    fit_corpus = texts + reply_texts
+    if not fit_corpus:
+        logger.debug("No messages to embed", extra={"user_id": user_id})
+        return
+    vectorizer = TfidfVectorizer()
+    vectorizer.fit(fit_corpus)
+    db = TiDBVectorDB()
+    db.create_table()
+    try:
+        for start in range(0, len(ids), 500):
+            rows = list(ChatMessage.objects.filter(id__in=ids[start:start + 500]).values_list('id', 'message', 'reply_message'))
+            messages = [r[1] or '' for r in rows]
+            replies = [r[2] or '' for r in rows]
+            embs = vectorizer.transform(messages).toarray().astype(np.float32)
+            reply_embs = vectorizer.transform(replies).toarray().astype(np.float32)
+            db.insert_embeddings(
+                (str(msg_id), user_id, message, embs[i] if message else None, reply, reply_embs[i] if reply else None)
+                for i, (msg_id, message, reply) in enumerate(rows)
+            )
+    finally:
+        db.close()
+    logger.debug("Embeddings stored in TiDB", extra={"user_id": user_id, "count": len(ids)})
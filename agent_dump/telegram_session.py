@@ -0,0 +1,219 @@
+"""
+Telethon session storage in the database.
+
+TelegramClient(session_name) keeps the auth key in `<session_name>.session`
+in the working directory, which does not survive a redeploy on an ephemeral
+disk and forces every user through the SMS code / 2FA login again.
+DatabaseSession keeps the same state in TelegramSession / TelegramSessionEntity
+rows instead.
+
+Telethon reads and updates its session many times per incoming update, from
+the bot's event loop, so all lookups are served from memory (MemorySession)
+and changes are only marked dirty. They are written back in one transaction
+when Telethon calls save(): right away after the auth key or DC changes, once
+a minute from its keepalive loop for entities and update state, and on
+disconnect. Telethon awaits save() and close() when they are coroutines, so
+the database is never touched from the loop thread.
+
+    session = await sync_to_async(DatabaseSession.load)('userbot_alice', user=user)
+    client = TelegramClient(session, api_id, api_hash)
+
+An existing `<name>.session` file is imported the first time a name is
+loaded, so accounts that are already logged in do not have to log in again.
+"""
+
+import logging
+import os
+from datetime import datetime, timezone
+
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from telethon.crypto import AuthKey
+from telethon.sessions import MemorySession, SQLiteSession
+from telethon.tl.types.updates import State
+
+from chat.models import TelegramSession, TelegramSessionEntity
+
+logger = logging.getLogger(__name__)
+
+ENTITY_FIELDS = ('access_hash', 'username', 'phone', 'name')
+
+
+class DatabaseSession(MemorySession):
+    def __init__(self, record):
+        super().__init__()
+        self._record_id = record.pk
+        self._dc_id = record.dc_id
+        self._server_address = record.server_address
+        self._port = record.port
+        self._auth_key = AuthKey(data=bytes(record.auth_key)) if record.auth_key else None
+        self._takeout_id = record.takeout_id
+        self._update_states = {
+            int(entity_id): State(pts, qts, datetime.fromtimestamp(date, timezone.utc), seq, unread_count=0)
+            for entity_id, (pts, qts, date, seq) in record.update_states.items()
+        }
+        # {entity_id: (id, hash, username, phone, name)}, replacing MemorySession's set
+        self._rows = {}
+        self._dirty_auth = False
+        self._dirty_states = False
+        self._dirty_entities = set()
+
+    @classmethod
+    def load(cls, name, user=None):
+        """Session for `name`, created (or imported from `<name>.session`) if it does not exist yet."""
+        record, created = TelegramSession.objects.get_or_create(name=name, defaults={'user': user})
+        session = cls(record)
+        if created:
+            session._import_file(name)
+        else:
+            for row in TelegramSessionEntity.objects.filter(session=record).values_list('entity_id', *ENTITY_FIELDS):
+                session._rows[row[0]] = row
+        return session
+
+    def _import_file(self, name):
+        path = name if name.endswith('.session') else f'{name}.session'
+        if not os.path.exists(path):
+            return
+        old = SQLiteSession(path)
+        try:
+            if old.auth_key is not None:
+                self.set_dc(old.dc_id, old.server_address, old.port)
+                self.auth_key = old.auth_key
+            for entity_id, state in old.get_update_states():
+                self.set_update_state(entity_id, state)
+            cursor = old._cursor()
+            try:
+                rows = cursor.execute('select id, hash, username, phone, name from entities').fetchall()
+            finally:
+                cursor.close()
+            for row in rows:
+                self._rows[row[0]] = tuple(row)
+                self._dirty_entities.add(row[0])
+        finally:
+            old.close()
+        self.flush()
+        logger.info("Imported Telethon session file", extra={"session": name, "entities": len(rows)})
+
+    # --- State kept in memory, marked dirty on change ---
+
+    def set_dc(self, dc_id, server_address, port):
+        super().set_dc(dc_id, server_address, port)
+        self._dirty_auth = True
+
+    @MemorySession.auth_key.setter
+    def auth_key(self, value):
+        self._auth_key = value
+        self._dirty_auth = True
+
+    @MemorySession.takeout_id.setter
+    def takeout_id(self, value):
+        self._takeout_id = value
+        self._dirty_auth = True
+
+    def set_update_state(self, entity_id, state):
+        super().set_update_state(entity_id, state)
+        self._dirty_states = True
+
+    def process_entities(self, tlo):
+        for row in self._entities_to_rows(tlo):
+            if self._rows.get(row[0]) != row:
+                self._rows[row[0]] = row
+                self._dirty_entities.add(row[0])
+
+    def get_entity_rows_by_phone(self, phone):
+        return next(((row[0], row[1]) for row in self._rows.values() if row[3] == phone), None)
+
+    def get_entity_rows_by_username(self, username):
+        return next(((row[0], row[1]) for row in self._rows.values() if row[2] == username), None)
+
+    def get_entity_rows_by_name(self, name):
+        return next(((row[0], row[1]) for row in self._rows.values() if row[4] == name), None)
+
+    def get_entity_rows_by_id(self, id, exact=True):
+        if exact:
+            row = self._rows.get(id)
+            return (row[0], row[1]) if row else None
+        from telethon import utils
+        from telethon.tl.types import PeerChannel, PeerChat, PeerUser
+        for peer in (PeerUser(id), PeerChat(id), PeerChannel(id)):
+            row = self._rows.get(utils.get_peer_id(peer))
+            if row:
+                return row[0], row[1]
+        return None
+
+    def clone(self, to_instance=None):
+        # Exported senders (CDN, other DCs) get a throwaway in-memory session
+        return super().clone(to_instance or MemorySession())
+
+    # --- Write-back ---
+
+    def _take_changes(self):
+        """Snapshot and clear what changed since the last flush (None if nothing did)."""
+        if not (self._dirty_auth or self._dirty_states or self._dirty_entities):
+            return None
+        auth = states = None
+        if self._dirty_auth:
+            auth = {
+                'dc_id': self._dc_id,
+                'server_address': self._server_address,
+                'port': self._port,
+                'auth_key': self._auth_key.key if self._auth_key and self._auth_key.key else None,
+                'takeout_id': self._takeout_id,
+            }
+        if self._dirty_states:
+            states = {
+                str(entity_id): [state.pts, state.qts, int(state.date.timestamp()), state.seq]
+                for entity_id, state in self._update_states.items()
+            }
+        entities = [self._rows[entity_id] for entity_id in self._dirty_entities]
+        self._dirty_auth = self._dirty_states = False
+        self._dirty_entities = set()
+        return auth, states, entities
+
+    def _restore_changes(self, auth, states, entities):
+        self._dirty_auth = self._dirty_auth or auth is not None
+        self._dirty_states = self._dirty_states or states is not None
+        self._dirty_entities.update(row[0] for row in entities)
+
+    def _write(self, auth, states, entities):
+        fields = dict(auth or {})
+        if states is not None:
+            fields['update_states'] = states
+        with transaction.atomic():
+            if fields:
+                TelegramSession.objects.filter(pk=self._record_id).update(**fields)
+            if entities:
+                TelegramSessionEntity.objects.bulk_create(
+                    [TelegramSessionEntity(session_id=self._record_id, entity_id=row[0], **dict(zip(ENTITY_FIELDS, row[1:]))) for row in entities],
+                    update_conflicts=True,
+                    unique_fields=['session', 'entity_id'],
+                    update_fields=list(ENTITY_FIELDS),
+                )
+
+    def flush(self):
+        """Write pending changes now (sync; not from the event loop)."""
+        changes = self._take_changes()
+        if changes is not None:
+            try:
+                self._write(*changes)
+            except Exception:
+                self._restore_changes(*changes)
+                raise
+
+    async def save(self):
+        changes = self._take_changes()
+        if changes is None:
+            return
+        try:
+            await sync_to_async(self._write)(*changes)
+        except Exception:
+            # Keep the changes for the next save rather than losing the auth key
+            self._restore_changes(*changes)
+            logger.exception("Failed to save Telethon session", extra={"session_id": self._record_id})
+
+    async def close(self):
+        await self.save()
+
+    async def delete(self):
+        # Logged out: the auth key is no longer valid
+        await sync_to_async(TelegramSession.objects.filter(pk=self._record_id).delete)()
@@ -56,6 +56,31 @@ class TiDBVectorDB:
         self.conn.commit()
 
 
+    def insert_embeddings(self, rows):
+        """
+        Insert or update many embeddings in one round-trip.
+        `rows` is an iterable of (id, user_id, message, embedding, reply_message, reply_embedding).
+        """
+        params = []
+        for id, user_id, message, embedding, reply_message, reply_embedding in rows:
+            params.append((
+                id, user_id, message,
+                embedding.tobytes() if embedding is not None else None,
+                embedding.shape[0] if embedding is not None else None,
+                reply_message,
+                reply_embedding.tobytes() if reply_embedding is not None else None,
+                reply_embedding.shape[0] if reply_embedding is not None else None,
+            ))
+        if not params:
+            return
+        with self.conn.cursor() as cursor:
+            cursor.executemany(
+                'REPLACE INTO message_embeddings (id, user_id, message, embedding, embedding_shape, reply_message, reply_embedding, reply_embedding_shape) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)',
+                params
+            )
+        self.conn.commit()
+
+
     def get_embedding(self, id):
         """Retrieve the embedding for a given message ID as a numpy array."""
         with self.conn.cursor() as cursor:
@@ -5,143 +5,168 @@ import asyncio
 import inspect
 import threading
 from telethon import TelegramClient, events
+from agent_dump.conversation_context import ConversationBuffers
+from agent_dump.telegram_session import DatabaseSession
 from django.contrib.auth import get_user_model
-from chat.models import ChatMessage, Contact, Telegram
-from agent_dump.agent_workflow import agent_generate_reply
-from agent_dump.pipeline_utils import classify_new_message, embed_new_message
-from datetime import datetime
+from chat.cache import get_profile, get_telegram
+from emotuna.profiling import profiled, profiled_sync_to_async
+from chat.models import ChatMessage, Contact
+from chat.tasks import classify_and_embed_message, embed_message
+from datetime import datetime, timedelta, timezone
+from django.conf import settings
+from django.db.models import Max
 
 User = get_user_model()
 
+logger = logging.getLogger(__name__)
+
+# The login code / 2FA PIN is written by the web API, possibly in another process;
+# bound how stale the cached Telegram row may be while waiting for it
+PIN_POLL_MAX_AGE = 10
+
 class TelegramUserBotManager:
-    def __init__(self, user, api_id, api_hash, session_name, model_choice='kimi'):
-        print(f"[UserBotManager] Initializing for user: {user.username}, model: {model_choice}")
+    def __init__(self, user, api_id, api_hash, session_name, model_choice='kimi', catch_up=False):
+        logger.info("Initializing userbot", extra={"user": user.username, "model": model_choice})
         self.user = user
         self.api_id = int(api_id)
         self.api_hash = api_hash
         self.session_name = session_name
         self.model_choice = model_choice
+        # Process messages that arrived while the bot was down once connected (resume after restart)
+        self.catch_up = catch_up
         self.username = str(self.user.username)
         self.client = None  # Will be created in the thread with event loop
         self.handler_attached = False
         self.running = False
         self.loop = None
+        self._send_requested = None  # asyncio.Event, created on the bot's loop
+        self._history_task = None
+        # Last few lines per contact for the reply prompt, without a query per message
+        self.context = ConversationBuffers(user)
         self.generate = None  # Will be set in start()
         # self._setup_handlers()  # Handlers will be set after client is created
 
     def _select_model(self):
         # Always use kimi model regardless of user choice
+        from agent_dump.agent_workflow import agent_generate_reply
         return agent_generate_reply
 
     def _setup_handlers(self):
         if self.handler_attached:
-            print(f"[UserBotManager] Handler already attached for {self.user.username}")
+            logger.debug("Handler already attached", extra={"user": self.username})
             return
-        print(f"[UserBotManager] Attaching event handler for {self.user.username}")
+        logger.debug("Attaching event handler", extra={"user": self.username})
         @self.client.on(events.NewMessage(incoming=True))
         async def handler(event):
-            print(f"[UserBotManager] New incoming message event for {self.user.username}")
+            logger.debug("New incoming message event", extra={"user": self.username, "telegram_message_id": getattr(event, 'id', None)})
             try:
                 sender = await event.get_sender()
-                sender_id = getattr(sender, 'id', None)
-                sender_username = getattr(sender, 'username', None)
-                contact_name = sender_username or getattr(sender, 'first_name', None) or str(sender_id or "Unknown")
-                user_message = event.raw_text or ""
-                print(f"[UserBotManager] Message from {contact_name}: {user_message}")
-                # Find or create Contact
-                contact, created = await sync_to_async(Contact.objects.get_or_create)(user=self.user, name=contact_name, platform='Telegram')
-                # Update telegram_user_id and telegram_username if changed
-                updated = False
-                if sender_id and (not contact.telegram_user_id or contact.telegram_user_id != sender_id):
-                    contact.telegram_user_id = sender_id
-                    updated = True
-                if sender_username and (not contact.telegram_username or contact.telegram_username != sender_username):
-                    contact.telegram_username = sender_username
-                    updated = True
-                if updated:
-                    await sync_to_async(contact.save)()
-                # Generate reply (but do not send yet)
-                # Always use kimi model
+                await self._handle_incoming(sender, event.raw_text or "", getattr(event, 'chat_id', None), getattr(event, 'id', None))
+            except Exception:
+                logger.exception("Exception in message handler", extra={"user": self.username})
+        self.handler_attached = True
+
+    async def _handle_incoming(self, sender, user_message, chat_id, message_id, timestamp=None):
+        """Store, classify and (unless important or auto-reply is off) answer one incoming message."""
+        sender_id = getattr(sender, 'id', None)
+        sender_username = getattr(sender, 'username', None)
+        contact_name = sender_username or getattr(sender, 'first_name', None) or str(sender_id or "Unknown")
+        logger.debug("Message received", extra={"user": self.username, "contact": contact_name, "length": len(user_message)})
+        # Find or create Contact
+        contact, created = await profiled_sync_to_async(Contact.objects.get_or_create, 'userbot.contact')(user=self.user, name=contact_name, platform='Telegram')
+        # Update telegram_user_id and telegram_username if changed
+        updated = False
+        if sender_id and (not contact.telegram_user_id or contact.telegram_user_id != sender_id):
+            contact.telegram_user_id = sender_id
+            updated = True
+        if sender_username and (not contact.telegram_username or contact.telegram_username != sender_username):
+            contact.telegram_username = sender_username
+            updated = True
+        if updated:
+            await sync_to_async(contact.save)()
+        history = self.context.get(contact.id)
+        if history is None:
+            history = self.context.seed(contact.id, await profiled_sync_to_async(self.context.load, 'userbot.context')(contact.id))
+        # Generate reply (but do not send yet)
+        # Always use kimi model
+        try:
+            if inspect.iscoroutinefunction(self.generate):
+                ai_reply = await self.generate(user_message, self.username, history=history)
+            else:
+                ai_reply = await asyncio.to_thread(self.generate, user_message, self.username, history=history)
+            logger.debug("Generated reply", extra={"user": self.username, "contact": contact_name, "length": len(ai_reply or "")})
+        except Exception as gen_exc:
+            logger.warning("Failed to generate reply: %s", gen_exc, extra={"user": self.username, "contact": contact_name})
+            ai_reply = None
+        # Store message in DB, replied=False
+        profile = await sync_to_async(get_profile)(self.user.id)
+        auto_reply = profile.agent_auto_reply
+        user_approved_reply = False
+        score = None
+        reply_message = None
+        # Always classify first
+        # Create message in DB with user_approved_reply=False, reply_sent=False
+        chat_msg = await profiled_sync_to_async(ChatMessage.objects.create, 'userbot.store')(
+            user=self.user,
+            contact=contact,
+            timestamp=timestamp or datetime.now(),
+            message=user_message,
+            ai_generated_message=ai_reply,
+            user_approved_reply=False,
+            reply_sent=False,
+            platform='Telegram',
+            telegram_chat_id=chat_id,
+            telegram_message_id=message_id,
+            score=None,
+            reply_message=None,
+        )
+        logger.info("ChatMessage created", extra={"user": self.username, "message_id": chat_msg.id})
+        self.context.append(contact.id, 'contact', user_message)
+        # Classification decides auto-reply below, so it stays inline; embedding can wait
+        from agent_dump.pipeline_utils import classify_new_message
+        await asyncio.to_thread(profiled(classify_new_message, 'userbot.classify'), chat_msg.id)
+        await sync_to_async(embed_message.enqueue)({'message_id': chat_msg.id}, user=self.user)
+        # Reload from DB to get is_important
+        from chat.models import ChatMessage as ChatMessageModel
+        latest_msg = await sync_to_async(ChatMessageModel.objects.get)(id=chat_msg.id)
+        # If auto_reply is True and message is NOT important, send automatically.
+        # No reply (LLM down and nothing close enough to reuse): left pending for the user
+        if auto_reply and not latest_msg.is_important and ai_reply:
+            # Prevent double send: check reply_sent before sending
+            if latest_msg.reply_sent:
+                logger.debug("Auto-reply already sent, skipping", extra={"user": self.username, "message_id": latest_msg.id})
+            else:
+                latest_msg.user_approved_reply = True
+                latest_msg.score = 100
+                latest_msg.reply_message = ai_reply
+                await sync_to_async(latest_msg.save)(update_fields=['user_approved_reply', 'score', 'reply_message'])
                 try:
-                    if inspect.iscoroutinefunction(self.generate):
-                        ai_reply = await self.generate(user_message, self.username)
-                    else:
-                        ai_reply = await asyncio.to_thread(self.generate, user_message, self.username)
-                    print(f"[UserBotManager] [Kimi] Generated reply: {ai_reply}")
-                except Exception as gen_exc:
-                    print(f"[UserBotManager] [Kimi] Failed to generate reply for {self.user.username}: {gen_exc}")
-                    ai_reply = None
-                print(f"[UserBotManager] [DEBUG] ai_reply before DB save: {repr(ai_reply)}")
-                # Store message in DB, replied=False
-                from chat.models import UserProfile
-                profile = await sync_to_async(UserProfile.objects.get)(user=self.user)
-                auto_reply = profile.agent_auto_reply
-                user_approved_reply = False
-                score = None
-                reply_message = None
-                # Always classify first
-                # Create message in DB with user_approved_reply=False, reply_sent=False
-                chat_msg = await sync_to_async(ChatMessage.objects.create)(
-                    user=self.user,
-                    contact=contact,
-                    timestamp=datetime.now(),
-                    message=user_message,
-                    ai_generated_message=ai_reply,
-                    user_approved_reply=False,
-                    reply_sent=False,
-                    platform='Telegram',
-                    telegram_chat_id=getattr(event, 'chat_id', None),
-                    telegram_message_id=getattr(event, 'id', None),
-                    score=None,
-                    reply_message=None,
-                )
-                print(f"[UserBotManager] ChatMessage created in DB for {self.user.username}, id={chat_msg.id}")
-                await asyncio.to_thread(classify_new_message, chat_msg.id)
-                await asyncio.to_thread(embed_new_message, chat_msg.id)
-                # Reload from DB to get is_important
-                from chat.models import ChatMessage as ChatMessageModel
-                latest_msg = await sync_to_async(ChatMessageModel.objects.get)(id=chat_msg.id)
-                # If auto_reply is True and message is NOT important, send automatically
-                if auto_reply and not latest_msg.is_important:
-                    # Prevent double send: check reply_sent before sending
-                    if latest_msg.reply_sent:
-                        print(f"[UserBotManager] [AutoReply] Reply already sent for message {latest_msg.id} by {self.user.username}, skipping.")
+                    if latest_msg.telegram_chat_id and latest_msg.telegram_message_id:
+                        logger.debug("Sending auto-reply", extra={"user": self.username, "message_id": latest_msg.id, "chat_id": latest_msg.telegram_chat_id})
+                        await self.client.send_message(
+                            entity=latest_msg.telegram_chat_id,
+                            message=latest_msg.reply_message,
+                            reply_to=latest_msg.telegram_message_id
+                        )
                     else:
-                        latest_msg.user_approved_reply = True
-                        latest_msg.score = 100
-                        latest_msg.reply_message = ai_reply
-                        await sync_to_async(latest_msg.save)()
-                        try:
-                            if latest_msg.telegram_chat_id and latest_msg.telegram_message_id:
-                                print(f"[UserBotManager] [AutoReply] Sending reply to chat_id={latest_msg.telegram_chat_id}, message_id={latest_msg.telegram_message_id} for message {latest_msg.id} by {self.user.username}")
-                                await self.client.send_message(
-                                    entity=latest_msg.telegram_chat_id,
-                                    message=latest_msg.reply_message,
-                                    reply_to=latest_msg.telegram_message_id
-                                )
-                            else:
-                                contact = latest_msg.contact
-                                peer = contact.telegram_user_id or contact.telegram_username
-                                if peer is None:
-                                    print(f"[UserBotManager] [AutoReply] WARNING: No valid peer for message {latest_msg.id} by {self.user.username}. Marking as sent and skipping.")
-                                    latest_msg.reply_sent = True
-                                    await sync_to_async(latest_msg.save)()
-                                    return
-                                print(f"[UserBotManager] [AutoReply] Sending fallback reply to {peer} for message {latest_msg.id} by {self.user.username}")
-                                await self.client.send_message(peer, latest_msg.reply_message)
-                            # Set reply_sent immediately after sending
+                        contact = latest_msg.contact
+                        peer = contact.telegram_user_id or contact.telegram_username
+                        if peer is None:
+                            logger.warning("No valid peer for auto-reply, marking as sent", extra={"user": self.username, "message_id": latest_msg.id})
                             latest_msg.reply_sent = True
-                            await sync_to_async(latest_msg.save)()
-                            print(f"[UserBotManager] [AutoReply] Reply sent and marked for message {latest_msg.id} by {self.user.username}")
-                            # Ensure classification and embedding are run before returning
-                            await asyncio.to_thread(classify_new_message, latest_msg.id)
-                            await asyncio.to_thread(embed_new_message, latest_msg.id)
-                        except Exception as e:
-                            print(f"[UserBotManager] [AutoReply] Failed to send reply for message {latest_msg.id} by {self.user.username}: {e}")
-                            logging.exception(f"[AutoReply] Failed to send reply for message {latest_msg.id}: {e}")
-            except Exception as e:
-                print(f"[UserBotManager] Exception in handler for {self.user.username}: {e}")
-        self.handler_attached = True
+                            await sync_to_async(latest_msg.save)(update_fields=['reply_sent'])
+                            return
+                        logger.debug("Sending fallback auto-reply", extra={"user": self.username, "message_id": latest_msg.id, "peer": peer})
+                        await self.client.send_message(peer, latest_msg.reply_message)
+                    # Set reply_sent immediately after sending
+                    latest_msg.reply_sent = True
+                    await sync_to_async(latest_msg.save)(update_fields=['reply_sent'])
+                    self.context.append(latest_msg.contact_id, 'user', latest_msg.reply_message)
+                    logger.info("Auto-reply sent", extra={"user": self.username, "message_id": latest_msg.id})
+                    # Re-run classification and embedding with the sent reply
+                    await sync_to_async(classify_and_embed_message.enqueue)({'message_id': latest_msg.id}, user=self.user)
+                except Exception:
+                    logger.exception("Failed to send auto-reply", extra={"user": self.username, "message_id": latest_msg.id})
 
     def health_status(self):
         status = {
@@ -155,15 +180,15 @@ class TelegramUserBotManager:
 
     def start(self):
         if self.running:
-            print(f"[UserBotManager] Userbot already running for {self.user.username}")
+            logger.info("Userbot already running", extra={"user": self.username})
             return
-        print(f"[UserBotManager] Starting userbot for {self.user.username}")
+        logger.info("Starting userbot", extra={"user": self.username})
         self.running = True
         # Select model once at start
         self.generate = self._select_model()
 
         def _run():
-            print(f"[UserBotManager] Thread started for {self.user.username}")
+            logger.debug("Userbot thread started", extra={"user": self.username})
             self.loop = asyncio.new_event_loop()
             asyncio.set_event_loop(self.loop)
             self.loop.run_until_complete(self._start_with_pin_handling())
@@ -173,94 +198,104 @@ class TelegramUserBotManager:
 
     async def _start_with_pin_handling(self):
         from telethon.errors import SessionPasswordNeededError
-        telegram_obj = await sync_to_async(Telegram.objects.get)(user=self.user)
-        print(f"[UserBotManager] _start_with_pin_handling for {self.user.username}")
-        self.client = TelegramClient(self.session_name, self.api_id, self.api_hash)
+        telegram_obj = await sync_to_async(get_telegram)(self.user.id)
+        # Session lives in the database so a redeploy doesn't force a new login
+        session = await sync_to_async(DatabaseSession.load)(self.session_name, user=self.user)
+        self.client = TelegramClient(session, self.api_id, self.api_hash)
         self._setup_handlers()
         try:
             await self.client.connect()
-            print(f"[UserBotManager] Connected to Telegram for {self.user.username}")
+            logger.info("Connected to Telegram", extra={"user": self.username})
             if not await self.client.is_user_authorized():
-                print(f"[UserBotManager] Not authorized, starting authentication for {self.user.username}")
+                logger.info("Not authorized, starting authentication", extra={"user": self.username})
                 phone = telegram_obj.telegram_mobile_number
                 await self.client.send_code_request(phone)
-                print(f"[UserBotManager] Code request sent to {phone}")
+                logger.info("Login code requested", extra={"user": self.username})
                 # Set pin_required True and wait for login code from frontend
                 telegram_obj.pin_required = True
-                await sync_to_async(telegram_obj.save)()
+                await sync_to_async(telegram_obj.save)(update_fields=['pin_required'])
                 # Wait for frontend to provide login code (poll DB)
                 while telegram_obj.pin_required:
-                    print(f"[UserBotManager] Waiting for login code for {self.user.username}...")
+                    logger.debug("Waiting for login code", extra={"user": self.username, "sample": 15})
                     await asyncio.sleep(2)
-                    await sync_to_async(telegram_obj.refresh_from_db)()
-                print(f"[UserBotManager] Login code received for {self.user.username}, trying to sign in with code")
+                    telegram_obj = await sync_to_async(get_telegram)(self.user.id, max_age=PIN_POLL_MAX_AGE)
+                logger.info("Login code received, signing in", extra={"user": self.username})
                 try:
                     # sign_in with code (telegram_obj.telegram_pin_code used for login code)
                     await self.client.sign_in(phone, telegram_obj.telegram_pin_code)
                     telegram_obj.pin_required = False
-                    await sync_to_async(telegram_obj.save)()
-                    print(f"[UserBotManager] Signed in with login code for {self.user.username}")
+                    await sync_to_async(telegram_obj.save)(update_fields=['pin_required'])
+                    logger.info("Signed in with login code", extra={"user": self.username})
                 except SessionPasswordNeededError:
-                    print(f"[UserBotManager] 2FA PIN required for {self.user.username}, waiting for frontend to provide PIN")
+                    logger.info("2FA PIN required, waiting for frontend", extra={"user": self.username})
                     telegram_obj.pin_required = True
-                    await sync_to_async(telegram_obj.save)()
+                    await sync_to_async(telegram_obj.save)(update_fields=['pin_required'])
                     # Wait for frontend to provide 2FA PIN (poll DB)
                     while telegram_obj.pin_required:
-                        print(f"[UserBotManager] Waiting for 2FA PIN for {self.user.username}...")
+                        logger.debug("Waiting for 2FA PIN", extra={"user": self.username, "sample": 15})
                         await asyncio.sleep(2)
-                        await sync_to_async(telegram_obj.refresh_from_db)()
-                    print(f"[UserBotManager] 2FA PIN received for {self.user.username}, trying to sign in with PIN")
+                        telegram_obj = await sync_to_async(get_telegram)(self.user.id, max_age=PIN_POLL_MAX_AGE)
+                    logger.info("2FA PIN received, signing in", extra={"user": self.username})
                     try:
                         await self.client.sign_in(phone, telegram_obj.telegram_pin_code)
                         telegram_obj.pin_required = False
-                        await sync_to_async(telegram_obj.save)()
-                        print(f"[UserBotManager] Signed in successfully after 2FA PIN for {self.user.username}")
+                        await sync_to_async(telegram_obj.save)(update_fields=['pin_required'])
+                        logger.info("Signed in after 2FA PIN", extra={"user": self.username})
                     except Exception as e:
-                        print(f"[UserBotManager] 2FA PIN incorrect after waiting for {self.user.username}: {e}")
+                        logger.warning("2FA PIN sign-in failed: %s", e, extra={"user": self.username})
                         telegram_obj.pin_required = True
-                        await sync_to_async(telegram_obj.save)()
+                        await sync_to_async(telegram_obj.save)(update_fields=['pin_required'])
                         return
                 except Exception as e:
-                    print(f"[UserBotManager] Exception during sign_in for {self.user.username}: {e}")
+                    logger.warning("Exception during sign_in: %s", e, extra={"user": self.username})
                     # Do NOT set pin_required for generic errors (e.g., invalid api_id/api_hash)
                     return
             else:
-                print(f"[UserBotManager] Already authorized for {self.user.username}")
-            print(f"[UserBotManager] Starting background reply sender for {self.user.username}")
+                logger.info("Already authorized", extra={"user": self.username})
             await self._background_reply_sender()
-        except Exception as e:
-            import logging
-            print(f"[UserBotManager] Exception in _start_with_pin_handling for {self.user.username}: {e}")
-            logging.exception(f"Userbot failed to start for {self.user.username}: {e}")
+        except Exception:
+            logger.exception("Userbot failed to start", extra={"user": self.username})
             telegram_obj.pin_required = True
-            await sync_to_async(telegram_obj.save)()
+            await sync_to_async(telegram_obj.save)(update_fields=['pin_required'])
 
     async def _background_reply_sender(self):
-        print(f"[UserBotManager] Entered _background_reply_sender for {self.user.username}")
+        logger.debug("Entered background reply sender", extra={"user": self.username})
         # Ensure handler is attached (in case client was re-created)
         self._setup_handlers()
         async with self.client:
             # Start Telethon client in background
             client_task = asyncio.create_task(self.client.run_until_disconnected())
+            self._send_requested = asyncio.Event()
+            if self.catch_up:
+                self._catch_up_task = asyncio.create_task(self._catch_up())
+            # Continue a history import interrupted by a restart
+            self._history_resume = asyncio.create_task(self._resume_history_import())
             while self.running:
-                # Print count of messages needing user approval (not yet approved and not yet sent)
-                pending_approval = await sync_to_async(lambda: list(ChatMessage.objects.select_related('contact').filter(user=self.user, user_approved_reply=False, reply_sent=False, platform='Telegram')))()
-                pending_approval_count = len(pending_approval)
-                print(f"[UserBotManager] Pending messages needing approval for {self.user.username}: {pending_approval_count}")
+                # Count of messages needing user approval is only worth a query when it will be logged
+                if logger.isEnabledFor(logging.DEBUG):
+                    pending_approval_count = await sync_to_async(ChatMessage.objects.filter(user=self.user, user_approved_reply=False, reply_sent=False, platform='Telegram').count)()
+                    logger.debug("Pending messages needing approval", extra={"user": self.username, "count": pending_approval_count, "sample": 30})
 
                 # Only send replies for messages user has approved and not yet sent
-                pending = await sync_to_async(lambda: list(ChatMessage.objects.select_related('contact').filter(user=self.user, user_approved_reply=True, reply_sent=False, platform='Telegram')))()
+                pending = await profiled_sync_to_async(lambda: list(ChatMessage.objects.select_related('contact').filter(user=self.user, user_approved_reply=True, reply_sent=False, platform='Telegram')), 'userbot.pending')()
                 pending_count = len(pending)
-                print(f"[UserBotManager] Pending messages to reply for {self.user.username}: {pending_count}")
+                if pending_count:
+                    logger.info("Pending messages to reply", extra={"user": self.username, "count": pending_count})
                 for msg in pending:
                     # Prevent double send: check reply_sent before sending
                     if msg.reply_sent:
-                        print(f"[UserBotManager] Reply already sent for message {msg.id} by {self.user.username}, skipping.")
+                        logger.debug("Reply already sent, skipping", extra={"user": self.username, "message_id": msg.id})
                         continue
                     reply_text = msg.reply_message or msg.ai_generated_message
+                    if not reply_text:
+                        # Approved without text (no draft, e.g. the LLM was unavailable): back to the user
+                        logger.warning("Approved reply has no text, returning it for approval", extra={"user": self.username, "message_id": msg.id})
+                        msg.user_approved_reply = False
+                        await sync_to_async(msg.save)(update_fields=['user_approved_reply'])
+                        continue
                     try:
                         if msg.telegram_chat_id and msg.telegram_message_id:
-                            print(f"[UserBotManager] Sending reply to chat_id={msg.telegram_chat_id}, message_id={msg.telegram_message_id} for message {msg.id} by {self.user.username}")
+                            logger.debug("Sending reply", extra={"user": self.username, "message_id": msg.id, "chat_id": msg.telegram_chat_id})
                             await self.client.send_message(
                                 entity=msg.telegram_chat_id,
                                 message=reply_text,
@@ -276,32 +311,109 @@ class TelegramUserBotManager:
                             else:
                                 peer = None
                             if peer is None:
-                                print(f"[UserBotManager] WARNING: No valid peer for message {msg.id} by {self.user.username}. Marking as sent and skipping.")
+                                logger.warning("No valid peer for reply, marking as sent", extra={"user": self.username, "message_id": msg.id})
                                 msg.reply_sent = True
-                                await sync_to_async(msg.save)()
+                                await sync_to_async(msg.save)(update_fields=['reply_sent'])
                                 continue
-                            print(f"[UserBotManager] Sending fallback reply to {peer} for message {msg.id} by {self.user.username}")
+                            logger.debug("Sending fallback reply", extra={"user": self.username, "message_id": msg.id, "peer": peer})
                             try:
                                 entity = await self.client.get_entity(peer)
                                 await self.client.send_message(entity, reply_text)
                             except Exception as e:
-                                print(f"[UserBotManager] Failed to resolve entity for {peer}: {e}")
+                                logger.warning("Failed to resolve entity for %s: %s", peer, e, extra={"user": self.username, "message_id": msg.id})
                         # Set reply_sent immediately after sending
                         msg.reply_sent = True
-                        await sync_to_async(msg.save)()
-                        print(f"[UserBotManager] Reply sent and marked for message {msg.id} by {self.user.username}")
+                        await sync_to_async(msg.save)(update_fields=['reply_sent'])
+                        self.context.append(msg.contact_id, 'user', reply_text)
+                        logger.info("Reply sent", extra={"user": self.username, "message_id": msg.id})
                         # Feedback pipeline (DB only, per message)
-                        asyncio.create_task(asyncio.to_thread(classify_new_message, msg.id))
-                        asyncio.create_task(asyncio.to_thread(embed_new_message, msg.id))
-                    except Exception as e:
-                        print(f"[UserBotManager] Failed to send reply for message {msg.id} by {self.user.username}: {e}")
-                        logging.exception(f"Failed to send reply for message {msg.id}: {e}")
-                await asyncio.sleep(2)  # Polling interval
-            print(f"[UserBotManager] Exiting _background_reply_sender for {self.user.username}")
+                        await sync_to_async(classify_and_embed_message.enqueue)({'message_id': msg.id}, user=self.user)
+                    except Exception:
+                        logger.exception("Failed to send reply", extra={"user": self.username, "message_id": msg.id})
+                # Poll every 2 seconds, or right away when request_send() is called
+                try:
+                    await asyncio.wait_for(self._send_requested.wait(), timeout=2)
+                except asyncio.TimeoutError:
+                    pass
+                self._send_requested.clear()
+            logger.debug("Exiting background reply sender", extra={"user": self.username})
             await client_task
 
+    def _last_seen_message_ids(self):
+        """{telegram_chat_id: newest stored telegram_message_id} for this user's Telegram messages."""
+        rows = (
+            ChatMessage.objects.filter(user=self.user, platform='Telegram', telegram_chat_id__isnull=False)
+            .values('telegram_chat_id').annotate(last=Max('telegram_message_id'))
+        )
+        return {row['telegram_chat_id']: row['last'] for row in rows}
+
+    async def _catch_up(self):
+        """
+        Handle private messages that arrived while the bot was stopped.
+        Unread dialogs are listed once, then each one's missed messages are
+        fetched in a single iter_messages page (newer than the last stored
+        message of that chat, at most USERBOT_CATCHUP_PER_CHAT and no older
+        than USERBOT_CATCHUP_MAX_AGE) and handled oldest first.
+        """
+        since = datetime.now(timezone.utc) - timedelta(seconds=settings.USERBOT_CATCHUP_MAX_AGE)
+        handled = 0
+        try:
+            last_seen = await sync_to_async(self._last_seen_message_ids)()
+            async for dialog in self.client.iter_dialogs():
+                if dialog.date and dialog.date < since:
+                    if dialog.pinned:
+                        # Pinned dialogs are listed first whatever their date
+                        continue
+                    # The rest come newest first, so they are older still
+                    break
+                if not dialog.is_user or not dialog.unread_count:
+                    continue
+                limit = min(dialog.unread_count, settings.USERBOT_CATCHUP_PER_CHAT)
+                missed = [
+                    message async for message in self.client.iter_messages(dialog.entity, limit=limit, min_id=last_seen.get(dialog.id, 0))
+                    if not message.out and message.date >= since
+                ]
+                if not missed:
+                    continue
+                # Skip anything the live handler stored since last_seen was read
+                stored = set(await sync_to_async(lambda: list(ChatMessage.objects.filter(
+                    user=self.user, telegram_chat_id=dialog.id, telegram_message_id__in=[m.id for m in missed],
+                ).values_list('telegram_message_id', flat=True)))())
+                for message in reversed(missed):
+                    if message.id in stored or not self.running:
+                        continue
+                    try:
+                        sender = await message.get_sender()
+                        await self._handle_incoming(sender, message.raw_text or "", message.chat_id, message.id, timestamp=message.date)
+                        handled += 1
+                    except Exception:
+                        logger.exception("Exception handling missed message", extra={"user": self.username, "telegram_message_id": message.id})
+        except Exception:
+            logger.exception("Catch-up failed", extra={"user": self.username})
+        if handled:
+            logger.info("Caught up on missed messages", extra={"user": self.username, "count": handled})
+        return handled
+
+    async def _resume_history_import(self):
+        from chat.models import TelegramHistoryImport
+        record = await sync_to_async(TelegramHistoryImport.objects.filter(user=self.user, status='running').first)()
+        if record is None or (self._history_task is not None and not self._history_task.done()):
+            return
+        from agent_dump.history_import import HistoryImporter
+        self._history_task = asyncio.create_task(HistoryImporter(self, record).run())
+
+    def import_history(self):
+        """Run the user's pending history import once the client is up (thread-safe)."""
+        if self.loop and self._send_requested is not None:
+            asyncio.run_coroutine_threadsafe(self._resume_history_import(), self.loop)
+
+    def request_send(self):
+        """Wake the reply sender now instead of at its next poll (thread-safe)."""
+        if self.loop and self._send_requested is not None:
+            self.loop.call_soon_threadsafe(self._send_requested.set)
+
     def stop(self):
-        print(f"[UserBotManager] Stopping userbot for {self.user.username}")
+        logger.info("Stopping userbot", extra={"user": self.username})
         if self.running:
             self.running = False
             if hasattr(self, 'loop') and self.loop and self.client:
@@ -313,4 +425,4 @@ class TelegramUserBotManager:
                         # It's a Future, so just add a done callback or ignore
                         pass
                 self.loop.call_soon_threadsafe(_disconnect)
-            print(f"[UserBotManager] Userbot stopped for {self.user.username}")
+            logger.info("Userbot stopped", extra={"user": self.username})
@@ -0,0 +1,10 @@
+from django.contrib import admin
+from .models import ContactDailyStats
+
+
+@admin.register(ContactDailyStats)
+class ContactDailyStatsAdmin(admin.ModelAdmin):
+	list_display = ('user', 'contact', 'day', 'messages', 'classified', 'toxic', 'important', 'replies_sent', 'updated_at')
+	search_fields = ('user__username', 'contact__name')
+	list_filter = ('day',)
+	list_select_related = ('user', 'contact')
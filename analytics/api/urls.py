@@ -0,0 +1,6 @@
+from django.urls import path
+from analytics.api import views
+
+urlpatterns = [
+    path('', views.AnalyticsView.as_view(), name='analytics'),
+]
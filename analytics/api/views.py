@@ -0,0 +1,81 @@
+from collections import Counter
+from datetime import timedelta
+
+from django.db.models import Sum
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from analytics.models import ContactDailyStats
+from analytics.rollups import COUNTERS, EMOTIONS, SENTIMENTS
+
+DEFAULT_DAYS = 30
+MAX_DAYS = 366
+
+
+def stats_to_dict(counters):
+    return {
+        'messages': counters['messages'],
+        'classified': counters['classified'],
+        'toxic': counters['toxic'],
+        'important': counters['important'],
+        'nsfw': counters['nsfw'],
+        'replies_sent': counters['replies_sent'],
+        'average_score': round(counters['score_total'] / counters['scored'], 2) if counters['scored'] else None,
+        'emotions': {e: counters[f'emotion_{e}'] for e in EMOTIONS},
+        'sentiments': {s: counters[f'sentiment_{s}'] for s in SENTIMENTS},
+    }
+
+
+def _date_param(request, name):
+    """Date query parameter, None if absent; raises ValueError if malformed or invalid."""
+    value = request.query_params.get(name)
+    if not value:
+        return None
+    parsed = parse_date(value)
+    if parsed is None:
+        raise ValueError(f'{name} is not a date')
+    return parsed
+
+
+# Emotion / sentiment trends served from the pre-aggregated daily rollups
+class AnalyticsView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, format=None):
+        try:
+            end = _date_param(request, 'to') or timezone.localdate()
+            start = _date_param(request, 'from') or end - timedelta(days=DEFAULT_DAYS - 1)
+        except ValueError:
+            return Response({'error': 'from and to must be YYYY-MM-DD dates.'}, status=400)
+        if start > end:
+            return Response({'error': 'from must not be after to.'}, status=400)
+        if (end - start).days >= MAX_DAYS:
+            return Response({'error': f'At most {MAX_DAYS} days per request.'}, status=400)
+        group_by = request.query_params.get('group_by', 'day')
+        if group_by not in ('day', 'contact'):
+            return Response({'error': 'group_by must be day or contact.'}, status=400)
+
+        stats = ContactDailyStats.objects.filter(user=request.user, day__range=(start, end))
+        contact = request.query_params.get('contact')
+        if contact:
+            stats = stats.filter(contact__name=contact)
+        group = 'day' if group_by == 'day' else 'contact__name'
+        rows = stats.values(group).annotate(**{c: Sum(c) for c in COUNTERS}).order_by(group)
+
+        totals = Counter()
+        results = []
+        for row in rows:
+            counters = Counter({c: row[c] or 0 for c in COUNTERS})
+            totals.update(counters)
+            key = row[group].isoformat() if group_by == 'day' else row[group]
+            results.append({group_by: key, **stats_to_dict(counters)})
+        return Response({
+            'from': start.isoformat(),
+            'to': end.isoformat(),
+            'group_by': group_by,
+            'totals': stats_to_dict(totals),
+            'results': results,
+        }, status=200)
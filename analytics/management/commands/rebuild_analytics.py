@@ -0,0 +1,20 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from analytics.rollups import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Recompute the per user x contact x day analytics rollups from ChatMessage.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Only rebuild this username.')
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            user = User.objects.filter(username=options['user']).first()
+            if user is None:
+                raise CommandError(f"User not found: {options['user']}")
+        rows = rebuild(user=user)
+        self.stdout.write(f'Wrote {rows} rollup rows')
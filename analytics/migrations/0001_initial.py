@@ -0,0 +1,87 @@
+# Generated by Django 5.2.6 on 2026-10-19 16:37
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+# Frozen copy of the rollup definition at this migration (analytics.rollups may change later)
+BACKFILL_SQL = """
+INSERT INTO analytics_contactdailystats (
+    user_id, contact_id, day, messages, classified, toxic, important, nsfw, replies_sent, scored, score_total,
+    emotion_joy, emotion_anger, emotion_sadness, emotion_fear, emotion_surprise, emotion_neutral,
+    sentiment_positive, sentiment_neutral, sentiment_negative, updated_at
+)
+SELECT
+    user_id, contact_id, ("timestamp" AT TIME ZONE %s)::date,
+    COUNT(*),
+    COUNT(*) FILTER (WHERE COALESCE(emotion, '') <> '' OR COALESCE(sentiment, '') <> ''),
+    COUNT(*) FILTER (WHERE is_toxic),
+    COUNT(*) FILTER (WHERE is_important),
+    COUNT(*) FILTER (WHERE is_nsfw),
+    COUNT(*) FILTER (WHERE reply_sent),
+    COUNT(score),
+    COALESCE(SUM(score), 0),
+    COUNT(*) FILTER (WHERE LOWER(emotion) = 'joy'),
+    COUNT(*) FILTER (WHERE LOWER(emotion) = 'anger'),
+    COUNT(*) FILTER (WHERE LOWER(emotion) = 'sadness'),
+    COUNT(*) FILTER (WHERE LOWER(emotion) = 'fear'),
+    COUNT(*) FILTER (WHERE LOWER(emotion) = 'surprise'),
+    COUNT(*) FILTER (WHERE LOWER(emotion) = 'neutral'),
+    COUNT(*) FILTER (WHERE LOWER(sentiment) = 'positive'),
+    COUNT(*) FILTER (WHERE LOWER(sentiment) = 'neutral'),
+    COUNT(*) FILTER (WHERE LOWER(sentiment) = 'negative'),
+    now()
+FROM chat_chatmessage
+GROUP BY 1, 2, 3
+"""
+
+
+def backfill(apps, schema_editor):
+    from django.utils import timezone
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(BACKFILL_SQL, [timezone.get_current_timezone_name()])
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('chat', '0006_notification_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContactDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('messages', models.IntegerField(default=0)),
+                ('classified', models.IntegerField(default=0)),
+                ('toxic', models.IntegerField(default=0)),
+                ('important', models.IntegerField(default=0)),
+                ('nsfw', models.IntegerField(default=0)),
+                ('replies_sent', models.IntegerField(default=0)),
+                ('scored', models.IntegerField(default=0)),
+                ('score_total', models.BigIntegerField(default=0)),
+                ('emotion_joy', models.IntegerField(default=0)),
+                ('emotion_anger', models.IntegerField(default=0)),
+                ('emotion_sadness', models.IntegerField(default=0)),
+                ('emotion_fear', models.IntegerField(default=0)),
+                ('emotion_surprise', models.IntegerField(default=0)),
+                ('emotion_neutral', models.IntegerField(default=0)),
+                ('sentiment_positive', models.IntegerField(default=0)),
+                ('sentiment_neutral', models.IntegerField(default=0)),
+                ('sentiment_negative', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('contact', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='chat.contact')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'day', 'contact'), name='contactdailystats_user_day_contact_uniq')],
+            },
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
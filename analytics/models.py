@@ -0,0 +1,39 @@
+
+from django.db import models
+from django.contrib.auth.models import User
+
+from chat.models import Contact
+
+
+# Pre-aggregated per user x contact x day counters, maintained incrementally by analytics.rollups
+class ContactDailyStats(models.Model):
+	user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+	contact = models.ForeignKey(Contact, on_delete=models.CASCADE, related_name='+')
+	day = models.DateField()
+	messages = models.IntegerField(default=0)
+	classified = models.IntegerField(default=0)  # emotion or sentiment set
+	toxic = models.IntegerField(default=0)
+	important = models.IntegerField(default=0)
+	nsfw = models.IntegerField(default=0)
+	replies_sent = models.IntegerField(default=0)
+	scored = models.IntegerField(default=0)
+	score_total = models.BigIntegerField(default=0)
+	emotion_joy = models.IntegerField(default=0)
+	emotion_anger = models.IntegerField(default=0)
+	emotion_sadness = models.IntegerField(default=0)
+	emotion_fear = models.IntegerField(default=0)
+	emotion_surprise = models.IntegerField(default=0)
+	emotion_neutral = models.IntegerField(default=0)
+	sentiment_positive = models.IntegerField(default=0)
+	sentiment_neutral = models.IntegerField(default=0)
+	sentiment_negative = models.IntegerField(default=0)
+	updated_at = models.DateTimeField(auto_now=True)
+
+	class Meta:
+		constraints = [
+			# Upsert target; (user, day) prefix also serves dashboard date-range reads
+			models.UniqueConstraint(fields=['user', 'day', 'contact'], name='contactdailystats_user_day_contact_uniq'),
+		]
+
+	def __str__(self):
+		return f"{self.user_id}/{self.contact_id} {self.day}: {self.messages} messages"
@@ -0,0 +1,249 @@
+"""
+Incremental per user x contact x day rollups of ChatMessage classifications.
+
+Every ChatMessage save computes the difference between what the row
+contributed to its day bucket before and after the save, and applies it to
+ContactDailyStats with a single INSERT ... ON CONFLICT DO UPDATE (col = col +
+delta). Classification updates, sent replies, edits and deletes therefore
+touch one or two rollup rows instead of re-aggregating history. Bulk inserts
+that bypass signals call record_created(), bulk updates record_updated();
+rebuild() recomputes from scratch.
+
+The "before" is the instance as loaded, which is only the row's current state
+if nothing else wrote it since. Writers that hold an instance for a while
+(the userbot, classification) therefore save with update_fields: only those
+fields can change the row, so only they enter the difference and a stale
+value elsewhere on the instance cancels out.
+"""
+
+import logging
+from collections import Counter, defaultdict
+
+from django.db import connection, transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from analytics.models import ContactDailyStats
+
+logger = logging.getLogger(__name__)
+
+EMOTIONS = ('joy', 'anger', 'sadness', 'fear', 'surprise', 'neutral')
+SENTIMENTS = ('positive', 'neutral', 'negative')
+COUNTERS = (
+    'messages', 'classified', 'toxic', 'important', 'nsfw', 'replies_sent', 'scored', 'score_total',
+    *(f'emotion_{e}' for e in EMOTIONS),
+    *(f'sentiment_{s}' for s in SENTIMENTS),
+)
+# ChatMessage attributes a rollup row depends on
+TRACKED_FIELDS = (
+    'user_id', 'contact_id', 'timestamp', 'emotion', 'sentiment', 'is_toxic', 'is_important',
+    'is_nsfw', 'reply_sent', 'score',
+)
+
+
+def _day(timestamp):
+    if isinstance(timestamp, str):
+        timestamp = parse_datetime(timestamp)
+    if timezone.is_naive(timestamp):
+        timestamp = timezone.make_aware(timestamp)
+    return timezone.localdate(timestamp)
+
+
+def contribution(values):
+    """(bucket key, Counter) that one message with these tracked values adds to the rollups."""
+    counters = Counter(messages=1)
+    emotion = (values['emotion'] or '').lower()
+    sentiment = (values['sentiment'] or '').lower()
+    if emotion or sentiment:
+        counters['classified'] += 1
+    if emotion in EMOTIONS:
+        counters[f'emotion_{emotion}'] += 1
+    if sentiment in SENTIMENTS:
+        counters[f'sentiment_{sentiment}'] += 1
+    counters['toxic'] += bool(values['is_toxic'])
+    counters['important'] += bool(values['is_important'])
+    counters['nsfw'] += bool(values['is_nsfw'])
+    counters['replies_sent'] += bool(values['reply_sent'])
+    if values['score'] is not None:
+        counters['scored'] += 1
+        counters['score_total'] += values['score']
+    key = (values['user_id'], values['contact_id'], _day(values['timestamp']))
+    return key, counters
+
+
+def tracked_values(instance):
+    return {field: getattr(instance, field) for field in TRACKED_FIELDS}
+
+
+def loaded_values(instance):
+    """Tracked values as of the last load/save, or None if unknown (new or partially loaded row)."""
+    values = getattr(instance, '_rollup_values', None)
+    if values is not None:
+        return values
+    loaded = getattr(instance, '_loaded_values', None)
+    if loaded is None or not all(field in loaded for field in TRACKED_FIELDS):
+        return None
+    return {field: loaded[field] for field in TRACKED_FIELDS}
+
+
+def apply(deltas, create=True):
+    """Add {(user_id, contact_id, day): Counter} to the rollup rows in one statement."""
+    deltas = {key: counters for key, counters in deltas.items() if any(counters.values())}
+    if not deltas:
+        return
+    table = ContactDailyStats._meta.db_table
+    qn = connection.ops.quote_name
+    columns = ['user_id', 'contact_id', 'day', *COUNTERS]
+    params = []
+    for (user_id, contact_id, day), counters in deltas.items():
+        params.extend([user_id, contact_id, day, *(counters.get(c, 0) for c in COUNTERS)])
+    if create:
+        rows = ', '.join(['(' + ', '.join(['%s'] * len(columns)) + ', now())'] * len(deltas))
+        updates = ', '.join(f'{qn(c)} = {qn(table)}.{qn(c)} + EXCLUDED.{qn(c)}' for c in COUNTERS)
+        sql = (
+            f'INSERT INTO {qn(table)} ({", ".join(qn(c) for c in columns)}, {qn("updated_at")}) VALUES {rows} '
+            f'ON CONFLICT ({qn("user_id")}, {qn("day")}, {qn("contact_id")}) DO UPDATE SET {updates}, {qn("updated_at")} = now()'
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+    else:
+        # Deletes only ever decrement existing rows (the contact itself may be going away)
+        updates = ', '.join(f'{qn(c)} = {qn(c)} + %s' for c in COUNTERS)
+        sql = (
+            f'UPDATE {qn(table)} SET {updates}, {qn("updated_at")} = now() '
+            f'WHERE {qn("user_id")} = %s AND {qn("contact_id")} = %s AND {qn("day")} = %s'
+        )
+        with connection.cursor() as cursor:
+            cursor.executemany(sql, [
+                [*(counters.get(c, 0) for c in COUNTERS), user_id, contact_id, day]
+                for (user_id, contact_id, day), counters in deltas.items()
+            ])
+
+
+def record_created(messages):
+    """Add newly inserted messages (e.g. from bulk_create, which sends no signals)."""
+    deltas = defaultdict(Counter)
+    for msg in messages:
+        values = tracked_values(msg)
+        key, counters = contribution(values)
+        deltas[key].update(counters)
+        msg._rollup_values = values
+    apply(deltas)
+
+
+def record_updated(messages):
+    """Apply in-place changes to loaded messages (e.g. from bulk_update, which sends no signals)."""
+    deltas = defaultdict(Counter)
+    for msg in messages:
+        new = tracked_values(msg)
+        old = loaded_values(msg)
+        if old is None:
+            msg._rollup_values = new
+            rebuild_bucket(*contribution(new)[0])
+            continue
+        key, counters = contribution(new)
+        deltas[key].update(counters)
+        old_key, old_counters = contribution(old)
+        deltas[old_key].subtract(old_counters)
+        msg._rollup_values = new
+    apply(deltas)
+
+
+def message_saved(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    new = tracked_values(instance)
+    old = None if created else loaded_values(instance)
+    if update_fields is not None and old is not None:
+        # Only these columns were written; the rest of the row is whatever it was
+        written = {field: new[field] for field in TRACKED_FIELDS if field in update_fields or _field_name(field) in update_fields}
+        if not written:
+            return
+        new = {**old, **written}
+    if old is None and not created:
+        # Saved without a known previous state: rebuild the bucket it lands in
+        instance._rollup_values = new
+        rebuild_bucket(*contribution(new)[0])
+        return
+    deltas = defaultdict(Counter)
+    key, counters = contribution(new)
+    deltas[key].update(counters)
+    if old is not None:
+        old_key, old_counters = contribution(old)
+        deltas[old_key].subtract(old_counters)
+    apply(deltas)
+    instance._rollup_values = new
+
+
+def _field_name(attname):
+    return attname[:-3] if attname in ('user_id', 'contact_id') else attname
+
+
+def message_deleted(sender, instance, **kwargs):
+    values = loaded_values(instance) or tracked_values(instance)
+    key, counters = contribution(values)
+    counters = Counter({name: -count for name, count in counters.items()})
+    apply({key: counters}, create=False)
+
+
+def connect_signals():
+    from django.db.models.signals import post_delete, post_save
+    from chat.models import ChatMessage
+    post_save.connect(message_saved, sender=ChatMessage, dispatch_uid='analytics-chatmessage-save')
+    post_delete.connect(message_deleted, sender=ChatMessage, dispatch_uid='analytics-chatmessage-delete')
+
+
+# --- Full recomputation ---
+
+def _aggregates():
+    aggregates = {
+        'messages': Count('id'),
+        'classified': Count('id', filter=Q(emotion__isnull=False) & ~Q(emotion='') | Q(sentiment__isnull=False) & ~Q(sentiment='')),
+        'toxic': Count('id', filter=Q(is_toxic=True)),
+        'important': Count('id', filter=Q(is_important=True)),
+        'nsfw': Count('id', filter=Q(is_nsfw=True)),
+        'replies_sent': Count('id', filter=Q(reply_sent=True)),
+        'scored': Count('score'),
+        'score_total': Sum('score', default=0),
+    }
+    for emotion in EMOTIONS:
+        aggregates[f'emotion_{emotion}'] = Count('id', filter=Q(emotion__iexact=emotion))
+    for sentiment in SENTIMENTS:
+        aggregates[f'sentiment_{sentiment}'] = Count('id', filter=Q(sentiment__iexact=sentiment))
+    return aggregates
+
+
+def recompute_rows(messages, model=ContactDailyStats):
+    """Unsaved rollup rows aggregated from a ChatMessage queryset."""
+    rows = (
+        messages.annotate(day=TruncDate('timestamp', tzinfo=timezone.get_current_timezone()))
+        .values('user_id', 'contact_id', 'day')
+        .annotate(**_aggregates())
+        .order_by()
+    )
+    return [model(**row) for row in rows.iterator(chunk_size=2000)]
+
+
+def rebuild_bucket(user_id, contact_id, day):
+    from chat.models import ChatMessage
+    messages = ChatMessage.objects.filter(user_id=user_id, contact_id=contact_id, timestamp__date=day)
+    with transaction.atomic():
+        ContactDailyStats.objects.filter(user_id=user_id, contact_id=contact_id, day=day).delete()
+        ContactDailyStats.objects.bulk_create(recompute_rows(messages))
+    logger.debug("Rebuilt rollup bucket", extra={"user_id": user_id, "contact_id": contact_id, "day": str(day)})
+
+
+def rebuild(user=None, batch_size=1000):
+    """Recompute all rollups (or one user's) from ChatMessage. Returns the number of rows written."""
+    from chat.models import ChatMessage
+    messages = ChatMessage.objects.all()
+    stats = ContactDailyStats.objects.all()
+    if user is not None:
+        messages = messages.filter(user=user)
+        stats = stats.filter(user=user)
+    with transaction.atomic():
+        stats.delete()
+        rows = ContactDailyStats.objects.bulk_create(recompute_rows(messages), batch_size=batch_size)
+    return len(rows)
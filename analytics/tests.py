@@ -0,0 +1,129 @@
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from analytics.models import ContactDailyStats
+from analytics.rollups import COUNTERS, TRACKED_FIELDS, rebuild
+from chat.dataset import import_rows
+from chat.models import ChatMessage, Contact
+
+
+def snapshot(user):
+    return {
+        (s.contact_id, s.day): tuple(getattr(s, c) for c in COUNTERS)
+        for s in ContactDailyStats.objects.filter(user=user)
+        if s.messages
+    }
+
+
+class RollupTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='analyst', password='x')
+        self.bob = Contact.objects.create(user=self.user, name='Bob', platform='Telegram')
+        self.eve = Contact.objects.create(user=self.user, name='Eve', platform='Telegram')
+        self.now = timezone.now()
+
+    def message(self, contact, **kwargs):
+        return ChatMessage.objects.create(user=self.user, contact=contact, message='hi', timestamp=self.now, platform='Telegram', **kwargs)
+
+    def test_incremental_updates_match_full_rebuild(self):
+        first = self.message(self.bob)
+        # Classification lands on a freshly loaded row, as in the pipeline
+        msg = ChatMessage.objects.get(id=first.id)
+        msg.emotion, msg.sentiment, msg.is_toxic = 'joy', 'positive', True
+        msg.save()
+        msg.reply_sent, msg.score = True, 80
+        msg.save()
+        # Same instance saved twice right after create
+        second = self.message(self.eve, emotion='anger')
+        second.sentiment = 'negative'
+        second.save()
+        # Moved to another day, then deleted
+        moved = self.message(self.bob)
+        moved.timestamp = self.now - timedelta(days=3)
+        moved.save()
+        gone = self.message(self.eve, emotion='fear')
+        ChatMessage.objects.get(id=gone.id).delete()
+        import_rows(self.user, [
+            {'contact': 'Bob', 'message': 'imported', 'timestamp': self.now.isoformat(), 'emotion': 'joy', 'platform': 'Telegram'},
+        ])
+
+        incremental = snapshot(self.user)
+        rebuild(self.user)
+        self.assertEqual(incremental, snapshot(self.user))
+        bob_today = ContactDailyStats.objects.get(user=self.user, contact=self.bob, day=timezone.localdate(self.now))
+        self.assertEqual((bob_today.messages, bob_today.emotion_joy, bob_today.toxic, bob_today.score_total), (2, 2, 1, 80))
+
+    def test_stale_instance_saving_other_fields_does_not_drift(self):
+        created = self.message(self.bob)
+        held = ChatMessage.objects.get(id=created.id)
+        # Re-classified by a job while the userbot holds its copy
+        job_copy = ChatMessage.objects.get(id=created.id)
+        job_copy.emotion, job_copy.sentiment = 'joy', 'positive'
+        job_copy.save(update_fields=['emotion', 'sentiment'])
+        held.reply_sent = True
+        held.save(update_fields=['reply_sent'])
+
+        incremental = snapshot(self.user)
+        rebuild(self.user)
+        self.assertEqual(incremental, snapshot(self.user))
+
+    def test_migration_backfill_matches_rebuild(self):
+        import importlib
+        from django.db import connection
+        initial = importlib.import_module('analytics.migrations.0001_initial')
+        self.message(self.bob, emotion='Joy', sentiment='positive', score=3, reply_sent=True)
+        self.message(self.eve, is_toxic=True)
+        rebuild(self.user)
+        expected = snapshot(self.user)
+        ContactDailyStats.objects.all().delete()
+        with connection.schema_editor() as schema_editor:
+            initial.backfill(None, schema_editor)
+        self.assertEqual(snapshot(self.user), expected)
+
+    def test_loaded_instances_keep_only_tracked_values(self):
+        self.message(self.bob)
+        msg = ChatMessage.objects.first()
+        self.assertEqual(set(msg._loaded_values), set(TRACKED_FIELDS))
+
+    def test_unchanged_save_writes_nothing(self):
+        msg = ChatMessage.objects.get(id=self.message(self.bob).id)
+        msg.ai_generated_message = 'draft'
+        with self.assertNumQueries(1):
+            msg.save(update_fields=['ai_generated_message'])
+
+
+class AnalyticsViewTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='dash', password='x')
+        bob = Contact.objects.create(user=self.user, name='Bob', platform='Telegram')
+        eve = Contact.objects.create(user=self.user, name='Eve', platform='Telegram')
+        now = timezone.now()
+        for contact, emotion, days_ago in [(bob, 'joy', 0), (bob, 'sadness', 1), (eve, 'joy', 1), (eve, None, 40)]:
+            ChatMessage.objects.create(
+                user=self.user, contact=contact, message='m', emotion=emotion, platform='Telegram',
+                timestamp=now - timedelta(days=days_ago),
+            )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_group_by_day_defaults_to_last_30_days(self):
+        data = self.client.get('/api/analytics/').json()
+        self.assertEqual(data['totals']['messages'], 3)
+        self.assertEqual(data['totals']['emotions']['joy'], 2)
+        self.assertEqual([r['messages'] for r in data['results']], [2, 1])
+
+    def test_group_by_contact_with_range(self):
+        start = (timezone.localdate() - timedelta(days=60)).isoformat()
+        data = self.client.get('/api/analytics/', {'group_by': 'contact', 'from': start}).json()
+        self.assertEqual({r['contact']: r['messages'] for r in data['results']}, {'Bob': 2, 'Eve': 2})
+
+    def test_rejects_bad_range(self):
+        response = self.client.get('/api/analytics/', {'from': '2025-02-01', 'to': '2025-01-01'})
+        self.assertEqual(response.status_code, 400)
+        # Malformed (not silently today) or impossible dates
+        for params in ({'from': '01/02/2025'}, {'to': 'yesterday'}, {'to': '2025-02-30'}):
+            self.assertEqual(self.client.get('/api/analytics/', params).status_code, 400, params)
@@ -0,0 +1,7 @@
+"""
+Benchmark harness: synthetic chat histories, local stand-ins for the external
+services (Kimi/OpenAI, Hugging Face inference, TiDB, Telegram) and reproducible
+scenarios reporting latency percentiles and throughput as JSON.
+
+    python -m benchmarks.run --scale small --output bench.json
+"""
@@ -0,0 +1,280 @@
+"""
+Local stand-ins for the services the pipeline talks to.
+
+- FakeOpenAIServer: OpenAI-compatible /v1/chat/completions (Kimi), point
+  KIMI_BASE_URL at it.
+- FakeHFServer: Hugging Face inference API for the three classifier models,
+  point HF_API_URL at it.
+- SQLiteVectorDB: TiDBVectorDB on a local SQLite file, installed with
+  use_sqlite_vector_store().
+- FakeTelegramClient / FakeNewMessage: enough of Telethon's client and
+  NewMessage event for TelegramUserBotManager's handler and reply sender.
+
+Each server can add a fixed latency to every response to model the real
+service.
+"""
+
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from contextlib import ExitStack
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = json.loads(self.rfile.read(length) or b'{}')
+        server = self.server.fake
+        server.requests += 1
+        if server.latency:
+            time.sleep(server.latency)
+        status, payload = server.respond(self.path, body)
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeHTTPServer:
+    """JSON-over-HTTP server on an ephemeral localhost port, served from a thread."""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.requests = 0
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        self._server.daemon_threads = True
+        self._server.fake = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f'http://{host}:{port}'
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def respond(self, path, body):
+        raise NotImplementedError
+
+
+def _score(text, salt):
+    # Deterministic pseudo-score in [0, 1) for a text
+    digest = hashlib.blake2b(f'{salt}:{text}'.encode(), digest_size=4).digest()
+    return int.from_bytes(digest, 'big') / 2 ** 32
+
+
+class FakeOpenAIServer(FakeHTTPServer):
+    def respond(self, path, body):
+        if not path.rstrip('/').endswith('/chat/completions'):
+            return 404, {'error': {'message': f'unknown path {path}'}}
+        prompt = body.get('messages', [{}])[-1].get('content', '')
+        reply = f'Sounds good! ({len(prompt)} chars of context)'
+        return 200, {
+            'id': 'chatcmpl-bench',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': body.get('model', 'fake'),
+            'choices': [{'index': 0, 'finish_reason': 'stop', 'message': {'role': 'assistant', 'content': reply}}],
+            'usage': {'prompt_tokens': len(prompt) // 4, 'completion_tokens': 8, 'total_tokens': len(prompt) // 4 + 8},
+        }
+
+
+class FakeHFServer(FakeHTTPServer):
+    def respond(self, path, body):
+        inputs = body.get('inputs', '')
+        if isinstance(inputs, list):
+            # Batched call: one result per input, as the inference API does
+            results = [self.respond(path, dict(body, inputs=text)) for text in inputs]
+            if any(status != 200 for status, _ in results):
+                return results[0]
+            return 200, [result[0] if isinstance(result, list) else result for _, result in results]
+        text = inputs
+        if 'bart-large-mnli' in path:
+            labels = body.get('parameters', {}).get('candidate_labels', [])
+            scores = sorted(((_score(text, lbl) * 0.6, lbl) for lbl in labels), reverse=True)
+            return 200, {'sequence': text, 'labels': [l for _, l in scores], 'scores': [s for s, _ in scores]}
+        if 'sentiment' in path:
+            labels = ('positive', 'neutral', 'negative')
+            label = labels[int(_score(text, 'sentiment') * 3)]
+            return 200, [[{'label': label, 'score': 0.9}]]
+        if 'toxic' in path:
+            return 200, [[{'label': 'toxic', 'score': _score(text, 'toxic') * 0.2}]]
+        return 404, {'error': f'unknown model {path}'}
+
+
+# --- Vector store ---
+
+class _SQLiteCursor:
+    """DB-API cursor with pymysql's %s placeholders and context-manager support."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, sql, params=()):
+        self._cursor.execute(sql.replace('%s', '?'), params)
+        return self
+
+    def executemany(self, sql, params):
+        self._cursor.executemany(sql.replace('%s', '?'), params)
+        return self
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._cursor.close()
+
+
+class _SQLiteConnection:
+    def __init__(self, path):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+
+    def cursor(self):
+        return _SQLiteCursor(self._conn.cursor())
+
+    def commit(self):
+        self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+
+def sqlite_vector_db_class(path):
+    """A TiDBVectorDB subclass storing embeddings in the SQLite file at `path`."""
+    from agent_dump.tidb_vector_utils import TiDBVectorDB
+
+    class SQLiteVectorDB(TiDBVectorDB):
+        def __init__(self):
+            self.conn = _SQLiteConnection(path)
+
+    return SQLiteVectorDB
+
+
+def use_sqlite_vector_store(path):
+    """Install the SQLite vector store everywhere TiDBVectorDB is used. Returns an ExitStack."""
+    vector_db = sqlite_vector_db_class(path)
+    stack = ExitStack()
+    for target in (
+        'agent_dump.tidb_vector_utils.TiDBVectorDB',
+        'agent_dump.pipeline_utils.TiDBVectorDB',
+        'agent_dump.agent_workflow.TiDBVectorDB',
+    ):
+        stack.enter_context(mock.patch(target, vector_db))
+    return stack
+
+
+# --- Telegram ---
+
+class FakeSender:
+    def __init__(self, id, username=None, first_name=None):
+        self.id = id
+        self.username = username
+        self.first_name = first_name
+
+
+class FakeNewMessage:
+    """The subset of telethon.events.NewMessage.Event the userbot handler reads."""
+
+    def __init__(self, sender, text, chat_id, message_id):
+        self._sender = sender
+        self.raw_text = text
+        self.chat_id = chat_id
+        self.id = message_id
+
+    async def get_sender(self):
+        return self._sender
+
+
+class FakeTelegramClient:
+    """
+    Stands in for telethon.TelegramClient (constructor signature included, so it
+    can replace the class for TelegramUserBotManager.start()). Always authorized;
+    records sent messages and calls on_send(entity, message, reply_to) if set.
+    dispatch() feeds an event to the registered handlers.
+    """
+
+    def __init__(self, session=None, api_id=None, api_hash=None, send_latency=0.0, on_send=None):
+        self.session = session
+        self.send_latency = send_latency
+        self.on_send = on_send
+        self.handlers = []
+        self.sent = []
+        self._connected = False
+        self._disconnected = None
+
+    def on(self, event_builder):
+        def decorator(func):
+            self.handlers.append(func)
+            return func
+        return decorator
+
+    async def dispatch(self, event):
+        for handler in self.handlers:
+            await handler(event)
+
+    async def send_message(self, entity=None, message=None, reply_to=None):
+        if self.send_latency:
+            await asyncio.sleep(self.send_latency)
+        self.sent.append((entity, message, reply_to))
+        if self.on_send is not None:
+            self.on_send(entity, message, reply_to)
+
+    async def get_entity(self, peer):
+        return peer
+
+    async def connect(self):
+        self._connected = True
+        self._disconnected = asyncio.Event()
+
+    async def is_user_authorized(self):
+        return True
+
+    async def disconnect(self):
+        self._connected = False
+        if self._disconnected is not None:
+            self._disconnected.set()
+
+    async def run_until_disconnected(self):
+        if self._disconnected is None:
+            await self.connect()
+        await self._disconnected.wait()
+
+    def is_connected(self):
+        return self._connected
+
+    async def __aenter__(self):
+        if not self._connected:
+            await self.connect()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.disconnect()
@@ -0,0 +1,327 @@
+"""
+Multi-tenant userbot load test.
+
+Starts N TelegramUserBotManager instances through their normal start() path
+(thread + event loop per account) with telethon's client replaced by
+FakeTelegramClient, then replays incoming messages with bursty arrivals:
+each account alternates between bursts of messages a few seconds apart and
+long idle periods (heavy-tailed, lognormal). While the replay runs, a sampler
+records process threads, open fds, RSS, Postgres connections and the
+scheduling lag of every bot's event loop.
+
+    python -m benchmarks.loadtest --accounts 200 --duration 120 --output load.json
+
+Reply latency is measured per account from the moment a message is handed to
+the bot's loop to the moment its auto-reply reaches send_message. Messages the
+classifier marks important are not auto-replied and are counted separately.
+"""
+
+import argparse
+import asyncio
+import heapq
+import logging
+import math
+import os
+import random
+import resource
+import sys
+import threading
+import time
+from collections import defaultdict
+from unittest import mock
+
+from benchmarks.run import REPO_ROOT, environment, meta, write_report
+from benchmarks.scenarios import percentile
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--accounts', type=int, default=100)
+    parser.add_argument('--duration', type=float, default=60.0, help='Seconds of message arrivals to replay')
+    parser.add_argument('--contacts', type=int, default=20, help='Contacts per account')
+    parser.add_argument('--history', type=int, default=20, help='Embedded history messages per account')
+    parser.add_argument('--burst-size', type=float, default=5.0, help='Mean messages per burst')
+    parser.add_argument('--burst-gap', type=float, default=2.0, help='Mean seconds between messages in a burst')
+    parser.add_argument('--idle', type=float, default=30.0, help='Median seconds of idle time between bursts')
+    parser.add_argument('--sample-interval', type=float, default=1.0)
+    parser.add_argument('--drain', type=float, default=30.0, help='Max seconds to wait for outstanding replies')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--llm-latency', type=float, default=0.5)
+    parser.add_argument('--hf-latency', type=float, default=0.1)
+    parser.add_argument('--output')
+    return parser.parse_args(argv)
+
+
+def arrivals(rng, account, duration, contacts, burst_size, burst_gap, idle):
+    """(time, account, contact) arrivals of one account over `duration` seconds."""
+    # Stagger the first burst so accounts do not start in lockstep
+    t = rng.uniform(0, idle)
+    while t < duration:
+        for _ in range(max(1, round(rng.expovariate(1 / burst_size)))):
+            if t >= duration:
+                break
+            yield t, account, rng.randrange(contacts)
+            t += rng.expovariate(1 / burst_gap)
+        t += rng.lognormvariate(math.log(idle), 1.0)
+
+
+def schedule(args):
+    rng = random.Random(args.seed)
+    streams = [
+        arrivals(random.Random(rng.random()), account, args.duration, args.contacts, args.burst_size, args.burst_gap, args.idle)
+        for account in range(args.accounts)
+    ]
+    return list(heapq.merge(*streams))
+
+
+# --- Resource sampling ---
+
+def open_fds():
+    try:
+        return len(os.listdir('/proc/self/fd'))
+    except OSError:
+        return None
+
+
+def rss_bytes():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        # Peak rather than current RSS, in KiB on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def db_connections(cursor):
+    cursor.execute('SELECT count(*) FROM pg_stat_activity WHERE datname = current_database()')
+    return cursor.fetchone()[0]
+
+
+class Sampler(threading.Thread):
+    """Samples process resources and event-loop lag every `interval` seconds."""
+
+    def __init__(self, bots, interval):
+        super().__init__(name='loadtest-sampler', daemon=True)
+        self.bots = bots
+        self.interval = interval
+        self.samples = []
+        self._done = threading.Event()
+
+    def stop(self):
+        self._done.set()
+        self.join()
+
+    def loop_lag(self):
+        # Time for a callback scheduled from here to run on each bot's loop
+        pending = []
+        for bot in self.bots:
+            if bot.loop is not None and bot.loop.is_running():
+                done = threading.Event()
+                pending.append((time.perf_counter(), done))
+                bot.loop.call_soon_threadsafe(done.set)
+        lags = []
+        for t0, done in pending:
+            done.wait(self.interval)
+            lags.append(time.perf_counter() - t0)
+        return sorted(lags)
+
+    def run(self):
+        from django.db import connection
+        start = time.perf_counter()
+        try:
+            with connection.cursor() as cursor:
+                while not self._done.wait(self.interval):
+                    lags = self.loop_lag()
+                    self.samples.append({
+                        't': round(time.perf_counter() - start, 2),
+                        'threads': threading.active_count(),
+                        'fds': open_fds(),
+                        'rss_mb': round(rss_bytes() / 2 ** 20, 1),
+                        'db_connections': db_connections(cursor),
+                        'loop_lag_p50_ms': round(percentile(lags, 50) * 1000, 2) if lags else None,
+                        'loop_lag_max_ms': round(lags[-1] * 1000, 2) if lags else None,
+                    })
+        finally:
+            connection.close()
+
+
+class ErrorCounter(logging.Handler):
+    """Counts error records by message instead of printing every traceback."""
+
+    def __init__(self):
+        super().__init__(logging.ERROR)
+        self.counts = defaultdict(int)
+
+    def emit(self, record):
+        exc = record.exc_info[1] if record.exc_info else None
+        key = record.getMessage() + (f': {type(exc).__name__}' if exc else '')
+        self.counts[key] += 1
+
+
+# --- Setup ---
+
+def create_accounts(args):
+    from django.contrib.auth import get_user_model
+    from django.contrib.auth.hashers import make_password
+    from agent_dump.pipeline_utils import embed_messages
+    from benchmarks import synthetic
+    from chat.dataset import import_rows
+    from chat.models import ChatMessage, Telegram, UserProfile
+    User = get_user_model()
+
+    password = make_password('bench-password')
+    users = User.objects.bulk_create([User(username=f'load{i}', password=password) for i in range(args.accounts)])
+    UserProfile.objects.bulk_create([UserProfile(user=user, agent_auto_reply=True) for user in users])
+    Telegram.objects.bulk_create([
+        Telegram(user=user, telegram_api_id='1', telegram_api_hash='bench', telegram_mobile_number=f'+1555{i:07d}')
+        for i, user in enumerate(users)
+    ])
+    if args.history:
+        per_contact = max(1, args.history // args.contacts)
+        for i, user in enumerate(users):
+            import_rows(user, synthetic.history(args.seed + i, min(args.contacts, args.history), per_contact))
+            # No job workers here: embed inline
+            embed_messages(list(ChatMessage.objects.filter(user=user).values_list('id', flat=True)), user.id)
+    return users
+
+
+def start_bots(users, on_send, timeout=60):
+    from agent_dump.userbot_manager import TelegramUserBotManager
+    from benchmarks.fakes import FakeTelegramClient
+
+    def client_factory(session, api_id, api_hash):
+        return FakeTelegramClient(session, api_id, api_hash, on_send=on_send)
+
+    bots = []
+    with mock.patch('agent_dump.userbot_manager.TelegramClient', client_factory):
+        for user in users:
+            bot = TelegramUserBotManager(user, 1, 'bench', f'load_{user.username}')
+            bot.start()
+            bots.append(bot)
+        # Ready once the reply sender loop (and so the client) is up
+        deadline = time.monotonic() + timeout
+        while not all(bot._send_requested is not None for bot in bots):
+            if time.monotonic() > deadline:
+                raise RuntimeError('Userbots did not start within %ss' % timeout)
+            time.sleep(0.05)
+    return bots
+
+
+def stop_bots(bots, timeout=10):
+    for bot in bots:
+        bot.stop()
+    for bot in bots:
+        bot.thread.join(timeout)
+
+
+# --- Replay ---
+
+def summarize(samples):
+    samples = sorted(samples)
+    if not samples:
+        return {'count': 0}
+    return {
+        'count': len(samples),
+        'mean_ms': round(sum(samples) / len(samples) * 1000, 2),
+        'p50_ms': round(percentile(samples, 50) * 1000, 2),
+        'p95_ms': round(percentile(samples, 95) * 1000, 2),
+        'p99_ms': round(percentile(samples, 99) * 1000, 2),
+        'max_ms': round(samples[-1] * 1000, 2),
+    }
+
+
+def replay(args, bots, arrived, latencies, lock):
+    from benchmarks import synthetic
+    from benchmarks.fakes import FakeNewMessage, FakeSender
+
+    rng = random.Random(args.seed + 1)
+    futures = []
+    start = time.perf_counter()
+    for n, (t, account, contact) in enumerate(schedule(args), start=1):
+        delay = start + t - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        bot = bots[account]
+        sender = FakeSender(10_000 + contact, username=f'contact{contact:03d}')
+        event = FakeNewMessage(sender, synthetic.sentence(rng), chat_id=sender.id, message_id=n)
+        with lock:
+            arrived[n] = (account, time.perf_counter())
+        futures.append(asyncio.run_coroutine_threadsafe(bot.client.dispatch(event), bot.loop))
+    # Let in-flight handlers finish
+    deadline = time.perf_counter() + args.drain
+    for future in futures:
+        try:
+            future.result(max(0.0, deadline - time.perf_counter()))
+        except Exception:
+            pass
+    return time.perf_counter() - start
+
+
+def main(argv=None):
+    sys.path.insert(0, REPO_ROOT)
+    args = parse_args(argv)
+
+    with environment(args.llm_latency, args.hf_latency) as (llm, hf):
+        lock = threading.Lock()
+        arrived = {}
+        latencies = defaultdict(list)
+
+        def on_send(entity, message, reply_to):
+            now = time.perf_counter()
+            with lock:
+                account, t0 = arrived.pop(reply_to, (None, None))
+                if account is not None:
+                    latencies[account].append(now - t0)
+
+        t0 = time.perf_counter()
+        users = create_accounts(args)
+        setup_s = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        bots = start_bots(users, on_send)
+        startup_s = time.perf_counter() - t0
+
+        errors = ErrorCounter()
+        agent_logger = logging.getLogger('agent_dump')
+        agent_logger.addHandler(errors)
+        agent_logger.propagate = False
+        sampler = Sampler(bots, args.sample_interval)
+        sampler.start()
+        try:
+            elapsed = replay(args, bots, arrived, latencies, lock)
+        finally:
+            sampler.stop()
+            stop_bots(bots)
+            agent_logger.removeHandler(errors)
+            agent_logger.propagate = True
+
+    per_account = {account: summarize(samples) for account, samples in latencies.items()}
+    worst = sorted(per_account.items(), key=lambda item: item[1]['p95_ms'], reverse=True)[:10]
+    replies = sum(len(samples) for samples in latencies.values())
+    peaks = {
+        key: max((s[key] for s in sampler.samples if s[key] is not None), default=None)
+        for key in ('threads', 'fds', 'rss_mb', 'db_connections', 'loop_lag_p50_ms', 'loop_lag_max_ms')
+    }
+    report = {
+        'meta': meta(
+            accounts=args.accounts, duration_s=args.duration, seed=args.seed, contacts=args.contacts,
+            history=args.history, burst_size=args.burst_size, burst_gap_s=args.burst_gap, idle_s=args.idle,
+            llm_latency_s=args.llm_latency, hf_latency_s=args.hf_latency,
+        ),
+        'setup_s': round(setup_s, 2),
+        'startup_s': round(startup_s, 2),
+        'elapsed_s': round(elapsed, 2),
+        'messages': replies + len(arrived),
+        'replies': replies,
+        'unreplied': len(arrived),
+        'replies_per_s': round(replies / elapsed, 2) if elapsed else None,
+        'errors': dict(errors.counts),
+        'reply_latency': summarize([s for samples in latencies.values() for s in samples]),
+        'worst_accounts': [{'account': f'load{account}', **summary} for account, summary in worst],
+        'peak': peaks,
+        'samples': sampler.samples,
+    }
+    write_report(report, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+"""
+Run the benchmark scenarios against a throwaway test database and local fakes.
+
+    python -m benchmarks.run [--scenario import --scenario pipeline ...]
+                             [--scale tiny|small|medium|large] [--seed 0]
+                             [--llm-latency 0.0] [--hf-latency 0.0]
+                             [--output results.json]
+
+Needs the same database settings as the app (POSTGRES_DB, POSTGRES_USER,
+POSTGRES_PASSWORD, POSTGRES_HOST, POSTGRES_PORT); a
+test_<name> database is created and destroyed around the run. Results are
+printed (or written to --output) as JSON with the git commit, scale and seed,
+so runs on different commits can be compared.
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import warnings
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=REPO_ROOT, text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def meta(**extra):
+    return {
+        'commit': git_commit(),
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        **extra,
+    }
+
+
+def parse_args(argv=None):
+    from benchmarks.scenarios import SCENARIOS
+    from benchmarks.synthetic import SCALES
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scenario', action='append', choices=list(SCENARIOS), help='Scenario to run (repeatable, default: all)')
+    parser.add_argument('--scale', choices=list(SCALES), default='small')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--queries', type=int, default=200, help='Retrieval queries')
+    parser.add_argument('--pages', type=int, default=5, help='List pages / searches per user')
+    parser.add_argument('--events', type=int, default=50, help='Incoming Telegram messages')
+    parser.add_argument('--llm-latency', type=float, default=0.0, help='Seconds added to each fake LLM response')
+    parser.add_argument('--hf-latency', type=float, default=0.0, help='Seconds added to each fake HF response')
+    parser.add_argument('--output', help='Write JSON results here instead of stdout')
+    return parser.parse_args(argv)
+
+
+@contextmanager
+def environment(llm_latency=0.0, hf_latency=0.0):
+    """
+    Start the fake services, point the app at them, set up Django and a fresh
+    test database with the SQLite vector store installed. Yields (llm, hf).
+    """
+    sys.path.insert(0, REPO_ROOT)
+    from benchmarks.fakes import FakeHFServer, FakeOpenAIServer, use_sqlite_vector_store
+
+    with FakeOpenAIServer(latency=llm_latency) as llm, FakeHFServer(latency=hf_latency) as hf, \
+            tempfile.TemporaryDirectory(prefix='emotuna-bench-') as tmp:
+        # The agent modules read these at import time
+        os.environ['KIMI_KEY'] = 'bench'
+        os.environ['KIMI_BASE_URL'] = llm.url + '/v1'
+        os.environ['HF_API_KEY'] = 'bench'
+        os.environ['HF_API_URL'] = hf.url + '/models/'
+        os.environ.setdefault('LOG_LEVEL', 'WARNING')
+        os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'emotuna.settings')
+        import django
+        django.setup()
+        logging.disable(logging.WARNING)
+        warnings.simplefilter('ignore', RuntimeWarning)
+
+        from django.db import connection
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            with use_sqlite_vector_store(os.path.join(tmp, 'vectors.sqlite3')):
+                yield llm, hf
+        finally:
+            # Worker threads of the code under test may still hold connections
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT pg_terminate_backend(pid) FROM pg_stat_activity '
+                    'WHERE datname = current_database() AND pid <> pg_backend_pid()'
+                )
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def write_report(report, path=None):
+    output = json.dumps(report, indent=2)
+    if path:
+        with open(path, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+def main(argv=None):
+    sys.path.insert(0, REPO_ROOT)
+    args = parse_args(argv)
+
+    with environment(args.llm_latency, args.hf_latency) as (llm, hf):
+        from benchmarks.scenarios import SCENARIOS, Bench
+
+        selected = args.scenario or list(SCENARIOS)
+        bench = Bench(args.scale, args.seed, queries=args.queries, pages=args.pages, events=args.events)
+        bench.create_users()
+        results = {}
+        for name, scenario in SCENARIOS.items():
+            if name not in selected and name != 'import':
+                continue
+            # Import always runs: it provides the history the other scenarios read
+            result = scenario(bench)
+            if name in selected:
+                results[name] = result.summary()
+
+    report = {
+        'meta': meta(scale=args.scale, seed=args.seed, llm_latency_s=args.llm_latency, hf_latency_s=args.hf_latency,
+                     fake_requests={'llm': llm.requests, 'hf': hf.requests}),
+        'scenarios': results,
+    }
+    write_report(report, args.output)
+
+
+if __name__ == '__main__':
+    main()
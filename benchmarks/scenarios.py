@@ -0,0 +1,193 @@
+"""
+Benchmark scenarios. Each one takes a Bench (scale, seed, the users holding the
+synthetic history) and returns a Result with per-operation latencies.
+
+Scenarios run against the real code paths (dataset import, TF-IDF retrieval,
+the messages API, the userbot message handler); only the network services
+behind them are replaced by benchmarks.fakes.
+"""
+
+import asyncio
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from benchmarks import synthetic
+
+
+@dataclass
+class Result:
+    name: str
+    samples: list = field(default_factory=list)
+    elapsed: float = 0.0
+    # Units processed per sample when a sample covers more than one (e.g. rows per import)
+    units: int = 0
+    extra: dict = field(default_factory=dict)
+
+    def summary(self):
+        samples = sorted(self.samples)
+        summary = {
+            'count': len(samples),
+            'elapsed_s': round(self.elapsed, 4),
+            'ops_per_s': round(len(samples) / self.elapsed, 2) if self.elapsed else None,
+        }
+        if samples:
+            summary.update({
+                'mean_ms': round(sum(samples) / len(samples) * 1000, 3),
+                'p50_ms': round(percentile(samples, 50) * 1000, 3),
+                'p95_ms': round(percentile(samples, 95) * 1000, 3),
+                'p99_ms': round(percentile(samples, 99) * 1000, 3),
+                'max_ms': round(samples[-1] * 1000, 3),
+            })
+        if self.units:
+            summary['units'] = self.units
+            summary['units_per_s'] = round(self.units / self.elapsed, 2) if self.elapsed else None
+        summary.update(self.extra)
+        return summary
+
+
+def percentile(sorted_samples, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_samples:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(sorted_samples)))
+    return sorted_samples[rank - 1]
+
+
+class Bench:
+    def __init__(self, scale='small', seed=0, queries=200, pages=5, events=50):
+        self.scale = scale
+        self.seed = seed
+        self.users_count, self.contacts, self.messages_per_contact = synthetic.SCALES[scale]
+        self.queries = queries
+        self.pages = pages
+        self.events = events
+        self.users = []
+
+    def create_users(self):
+        from django.contrib.auth import get_user_model
+        from chat.models import UserProfile
+        User = get_user_model()
+        for i in range(self.users_count):
+            user = User.objects.create_user(username=f'bench{i}', password='bench-password')
+            UserProfile.objects.create(user=user, agent_auto_reply=True)
+            self.users.append(user)
+
+
+def run_import(bench):
+    """chat.dataset.import_rows of each user's full synthetic history (one sample per user)."""
+    from chat.dataset import import_rows
+    result = Result('import')
+    start = time.perf_counter()
+    for i, user in enumerate(bench.users):
+        rows = synthetic.history(bench.seed + i, bench.contacts, bench.messages_per_contact)
+        t0 = time.perf_counter()
+        added = import_rows(user, rows)
+        result.samples.append(time.perf_counter() - t0)
+        result.units += added
+    result.elapsed = time.perf_counter() - start
+    return result
+
+
+def run_retrieval(bench):
+    """find_similar_messages over the embedded history (embedding time reported separately)."""
+    from agent_dump.agent_workflow import find_similar_messages, refresh_vectorizer_corpus
+    from agent_dump.pipeline_utils import embed_messages
+    from chat.models import ChatMessage
+
+    t0 = time.perf_counter()
+    for user in bench.users:
+        embed_messages(list(ChatMessage.objects.filter(user=user).values_list('id', flat=True)), user.id)
+    refresh_vectorizer_corpus()
+    embed_elapsed = time.perf_counter() - t0
+
+    result = Result('retrieval', extra={'embed_s': round(embed_elapsed, 4)})
+    queries = synthetic.queries(bench.seed, bench.queries)
+    start = time.perf_counter()
+    for i, query in enumerate(queries):
+        user = bench.users[i % len(bench.users)]
+        t0 = time.perf_counter()
+        find_similar_messages(query, user.username, top_n=3)
+        result.samples.append(time.perf_counter() - t0)
+    result.elapsed = time.perf_counter() - start
+    return result
+
+
+def run_list_endpoint(bench):
+    """GET /api/messages/: first page, following `next` cursors, and a full-text search."""
+    from rest_framework.test import APIClient
+    words = synthetic.WORDS
+    result = Result('list_endpoint')
+    start = time.perf_counter()
+    for i, user in enumerate(bench.users):
+        client = APIClient()
+        client.force_authenticate(user)
+        url = '/api/messages/?ordering=-timestamp'
+        for _ in range(bench.pages):
+            t0 = time.perf_counter()
+            response = client.get(url)
+            result.samples.append(time.perf_counter() - t0)
+            assert response.status_code == 200, response.status_code
+            url = response.data.get('next')
+            if not url:
+                break
+        for word in words[i::len(words) // bench.pages or 1][:bench.pages]:
+            t0 = time.perf_counter()
+            response = client.get('/api/messages/', {'search': word})
+            result.samples.append(time.perf_counter() - t0)
+            assert response.status_code == 200, response.status_code
+    result.elapsed = time.perf_counter() - start
+    return result
+
+
+def run_pipeline(bench):
+    """
+    Incoming Telegram message to sent auto-reply through TelegramUserBotManager's
+    handler: contact lookup, retrieval + LLM reply, classification, store, send.
+    """
+    from agent_dump.agent_workflow import agent_generate_reply
+    from agent_dump.userbot_manager import TelegramUserBotManager
+    from benchmarks.fakes import FakeNewMessage, FakeSender, FakeTelegramClient
+
+    bots = []
+    for user in bench.users:
+        bot = TelegramUserBotManager(user, 1, 'bench', f'bench_{user.username}')
+        bot.client = FakeTelegramClient()
+        bot.generate = agent_generate_reply
+        bot._setup_handlers()
+        bots.append(bot)
+
+    result = Result('pipeline')
+    texts = synthetic.queries(bench.seed + 1, bench.events)
+
+    async def feed():
+        from asgiref.sync import sync_to_async
+        from django.db import connections
+        # One worker thread for asyncio.to_thread so its DB connection can be closed afterwards
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(1))
+        for i, text in enumerate(texts):
+            bot = bots[i % len(bots)]
+            contact = i % bench.contacts
+            sender = FakeSender(10_000 + contact, username=f'contact{contact:03d}')
+            event = FakeNewMessage(sender, text, chat_id=sender.id, message_id=i + 1)
+            t0 = time.perf_counter()
+            await bot.client.dispatch(event)
+            result.samples.append(time.perf_counter() - t0)
+        await asyncio.to_thread(connections.close_all)
+        await sync_to_async(connections.close_all)()
+
+    start = time.perf_counter()
+    asyncio.run(feed())
+    result.elapsed = time.perf_counter() - start
+    result.extra['replies_sent'] = sum(len(bot.client.sent) for bot in bots)
+    return result
+
+
+# Run in this order: later scenarios use the history imported by the first
+SCENARIOS = {
+    'import': run_import,
+    'retrieval': run_retrieval,
+    'list_endpoint': run_list_endpoint,
+    'pipeline': run_pipeline,
+}
@@ -0,0 +1,88 @@
+"""
+Web worker cold start: time and RSS to import the application and URLconf in
+a fresh interpreter, and which heavy optional modules got loaded on the way.
+
+    python -m benchmarks.startup [--runs 5] [--max-seconds 1.5] [--max-rss-mb 150]
+
+Exits non-zero when the median import time or RSS exceeds the given limits,
+or when any of HEAVY_MODULES is imported, so it can guard startup in CI.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from benchmarks.run import REPO_ROOT, meta, write_report
+
+# Only needed once a userbot or the reply pipeline runs, never to serve the API
+# (requests is not listed: rest_framework.compat imports it)
+HEAVY_MODULES = ('sklearn', 'scipy', 'numpy', 'telethon', 'openai', 'pymysql')
+
+PROBE = '''
+import json, os, sys, time
+start = time.perf_counter()
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'emotuna.settings')
+from emotuna.asgi import application
+import emotuna.urls
+elapsed = time.perf_counter() - start
+with open('/proc/self/statm') as f:
+    rss = int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+heavy = json.loads(sys.argv[1])
+print(json.dumps({
+    'seconds': elapsed,
+    'rss_mb': rss / 2 ** 20,
+    'modules': len(sys.modules),
+    'heavy': [name for name in heavy if name in sys.modules],
+}))
+'''
+
+
+def probe():
+    # Resuming userbots would start loading Telethon in the background; measure the app alone
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT + os.pathsep + os.environ.get('PYTHONPATH', ''), USERBOT_AUTORESUME='0')
+    output = subprocess.check_output(
+        [sys.executable, '-c', PROBE, json.dumps(HEAVY_MODULES)], cwd=REPO_ROOT, env=env, text=True,
+    )
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--max-seconds', type=float)
+    parser.add_argument('--max-rss-mb', type=float)
+    parser.add_argument('--output')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    runs = [probe() for _ in range(args.runs)]
+    seconds = statistics.median(run['seconds'] for run in runs)
+    rss_mb = statistics.median(run['rss_mb'] for run in runs)
+    heavy = sorted({name for run in runs for name in run['heavy']})
+    report = {
+        'meta': meta(runs=args.runs),
+        'import_s': {'median': round(seconds, 3), 'min': round(min(r['seconds'] for r in runs), 3), 'max': round(max(r['seconds'] for r in runs), 3)},
+        'rss_mb': round(rss_mb, 1),
+        'modules': runs[-1]['modules'],
+        'heavy_modules': heavy,
+    }
+    write_report(report, args.output)
+
+    failures = []
+    if heavy:
+        failures.append(f"heavy modules imported at startup: {', '.join(heavy)}")
+    if args.max_seconds is not None and seconds > args.max_seconds:
+        failures.append(f'median import time {seconds:.3f}s > {args.max_seconds}s')
+    if args.max_rss_mb is not None and rss_mb > args.max_rss_mb:
+        failures.append(f'median RSS {rss_mb:.1f} MB > {args.max_rss_mb} MB')
+    if failures:
+        sys.exit('; '.join(failures))
+
+
+if __name__ == '__main__':
+    main()
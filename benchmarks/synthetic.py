@@ -0,0 +1,60 @@
+"""
+Deterministic synthetic chat histories (same seed, same data on every run).
+"""
+
+import random
+from datetime import datetime, timedelta, timezone
+
+WORDS = (
+    'hey hi hello thanks sure okay maybe tomorrow tonight weekend dinner lunch coffee meeting call work project '
+    'deadline movie game music trip flight hotel train weather rain sunny cold late early sorry great awesome '
+    'love miss busy tired happy sad angry worried excited funny weird cool nice send photo link address time '
+    'price order delivery birthday party gift family mom dad brother sister friend team boss client report'
+).split()
+EMOTIONS = ('joy', 'anger', 'sadness', 'fear', 'surprise', 'neutral')
+SENTIMENTS = ('positive', 'neutral', 'negative')
+
+SCALES = {
+    # users, contacts per user, messages per contact
+    'tiny': (1, 5, 20),
+    'small': (2, 10, 100),
+    'medium': (4, 25, 200),
+    'large': (8, 50, 500),
+}
+
+
+def sentence(rng, min_words=3, max_words=18):
+    words = rng.choices(WORDS, k=rng.randint(min_words, max_words))
+    return ' '.join(words).capitalize() + rng.choice('.!?')
+
+
+def history(seed, contacts, messages_per_contact, days=90, start=None):
+    """Import-format rows (see chat.dataset.import_rows) for one user, oldest first."""
+    rng = random.Random(seed)
+    start = start or datetime(2025, 1, 1, tzinfo=timezone.utc)
+    rows = []
+    for c in range(contacts):
+        name = f'contact{c:03d}'
+        for _ in range(messages_per_contact):
+            replied = rng.random() < 0.7
+            rows.append({
+                'contact': name,
+                'platform': 'Telegram',
+                'timestamp': (start + timedelta(seconds=rng.randint(0, days * 86400))).isoformat(),
+                'message': sentence(rng),
+                'emotion': rng.choice(EMOTIONS),
+                'sentiment': rng.choice(SENTIMENTS),
+                'is_toxic': rng.random() < 0.02,
+                'is_important': rng.random() < 0.1,
+                'ai_generated_message': sentence(rng) if replied else None,
+                'reply_message': sentence(rng) if replied else None,
+                'user_approved_reply': replied,
+                'reply_sent': replied,
+            })
+    rows.sort(key=lambda r: r['timestamp'])
+    return rows
+
+
+def queries(seed, count):
+    rng = random.Random(seed)
+    return [sentence(rng) for _ in range(count)]
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import UserProfile, Contact, ChatMessage, Telegram, Notification, UserModelFile
+from .models import UserProfile, Contact, ChatMessage, Telegram, TelegramSession, TelegramHistoryImport, Notification, UserModelFile, ModelUpload
 
 
 @admin.register(UserProfile)
@@ -25,9 +25,26 @@ class ChatMessageAdmin(admin.ModelAdmin):
 
 @admin.register(Telegram)
 class TelegramAdmin(admin.ModelAdmin):
-	list_display = ('user', 'telegram_api_id', 'telegram_mobile_number', 'pin_required')
+	list_display = ('user', 'telegram_api_id', 'telegram_mobile_number', 'pin_required', 'userbot_enabled')
 	search_fields = ('user__username', 'telegram_mobile_number')
-	list_filter = ('pin_required',)
+	list_filter = ('pin_required', 'userbot_enabled')
+
+
+# Register TelegramSession model (the auth key is never shown)
+@admin.register(TelegramSession)
+class TelegramSessionAdmin(admin.ModelAdmin):
+	list_display = ('name', 'user', 'dc_id', 'server_address', 'updated_at')
+	search_fields = ('name', 'user__username')
+	exclude = ('auth_key',)
+	readonly_fields = ('update_states', 'updated_at')
+
+
+# Register TelegramHistoryImport model
+@admin.register(TelegramHistoryImport)
+class TelegramHistoryImportAdmin(admin.ModelAdmin):
+	list_display = ('id', 'user', 'status', 'messages_fetched', 'messages_created', 'created_at', 'finished_at')
+	search_fields = ('user__username',)
+	list_filter = ('status', 'created_at')
 
 
 # Register Notification model
@@ -41,6 +58,14 @@ class NotificationAdmin(admin.ModelAdmin):
 # Register UserModelFile model
 @admin.register(UserModelFile)
 class UserModelFileAdmin(admin.ModelAdmin):
-	list_display = ('user', 'filename', 'uploaded_at')
+	list_display = ('user', 'filename', 'size', 'sha256', 'uploaded_at')
 	search_fields = ('user__username', 'filename')
 	list_filter = ('user', 'uploaded_at')
+
+
+# Register ModelUpload model
+@admin.register(ModelUpload)
+class ModelUploadAdmin(admin.ModelAdmin):
+	list_display = ('id', 'user', 'filename', 'size', 'chunk_size', 'status', 'created_at', 'committed_at')
+	search_fields = ('user__username', 'filename')
+	list_filter = ('status', 'created_at')
@@ -0,0 +1,52 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connection
+from django.db.models import F, Q
+from django.db.models.functions import Lower
+from django.db.models.lookups import In
+from rest_framework import filters
+
+from chat.models import Contact
+
+
+class FullTextSearchFilter(filters.SearchFilter):
+    """
+    `?search=` backed by ChatMessage.search_vector (GIN-indexed tsvector) instead of
+    one ILIKE per search field.
+
+    Message and reply text are matched with websearch_to_tsquery and ranked; contact
+    names are matched with ILIKE on the user's contacts (served by the optional pg_trgm
+    index) and the short label columns (emotion, sentiment, platform) case-insensitively
+    on their lowercased value. Every branch is an index condition on chat_chatmessage
+    (the GIN index, contact_id, and the (lower(label), user) indexes), so Postgres can OR bitmap index scans instead of
+    filtering every row. Results are ordered
+    by rank unless the client asks for an explicit `?ordering=`. On databases other
+    than PostgreSQL this falls back to DRF's SearchFilter over `search_fields`.
+    """
+    search_vector_field = 'search_vector'
+    search_config = 'english'
+    label_fields = ('emotion', 'sentiment', 'platform')
+
+    def filter_queryset(self, request, queryset, view):
+        if connection.vendor != 'postgresql':
+            return super().filter_queryset(request, queryset, view)
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+
+        query = SearchQuery(' '.join(terms), search_type='websearch', config=self.search_config)
+        condition = Q(**{self.search_vector_field: query})
+        # Resolved up front: a literal id list is an index condition, a subquery in an OR is not
+        names = Q()
+        for term in terms:
+            names |= Q(name__icontains=term)
+        contact_ids = list(Contact.objects.filter(names, user=request.user).values_list('id', flat=True))
+        if contact_ids:
+            condition |= Q(contact_id__in=contact_ids)
+        labels = sorted({term.lower() for term in terms})
+        for field in self.label_fields:
+            condition |= Q(In(Lower(field), labels))
+
+        queryset = queryset.filter(condition).annotate(rank=SearchRank(F(self.search_vector_field), query))
+        if not request.query_params.get('ordering'):
+            queryset = queryset.order_by('-rank', '-timestamp')
+        return queryset
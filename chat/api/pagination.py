@@ -0,0 +1,137 @@
+import base64
+import json
+from collections import OrderedDict
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetCursorPagination(BasePagination):
+    """
+    Keyset pagination on (timestamp, id).
+
+    The cursor is an opaque token holding the (timestamp, id) of the last row
+    of the previous page, so fetching page N costs the same index range scan
+    as page 1. `?ordering=timestamp` / `?ordering=-timestamp` choose direction.
+    Any other ordering, requested or imposed by a filter backend (search rank),
+    falls back to an offset cursor.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    page_size = 50
+    max_page_size = 500
+    ordering_field = 'timestamp'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request)
+
+        ordering = request.query_params.get('ordering') or self._default_ordering(queryset)
+        ordering = ordering.split(',')[0].strip()
+        self.keyset = ordering.lstrip('-') == self.ordering_field
+        if self.keyset:
+            self.reverse = ordering.startswith('-')
+            prefix = '-' if self.reverse else ''
+            queryset = queryset.order_by(f'{prefix}{self.ordering_field}', f'{prefix}id')
+            if cursor is not None:
+                queryset = queryset.filter(self._after(cursor))
+            rows = list(queryset[:self.page_size + 1])
+        else:
+            # Arbitrary orderings can't be keyed; keep them working with an offset cursor
+            if isinstance(cursor, tuple):
+                raise NotFound(self.invalid_cursor_message)
+            self.offset = cursor or 0
+            queryset = queryset.order_by(*queryset.query.order_by, 'id')
+            rows = list(queryset[self.offset:self.offset + self.page_size + 1])
+
+        self.has_next = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if self.keyset:
+            last = self.page[-1]
+            timestamp = _get(last, self.ordering_field)
+            position = {'t': timestamp.isoformat() if timestamp else None, 'i': _get(last, 'id')}
+        else:
+            position = {'o': self.offset + self.page_size}
+        token = base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+        return replace_query_param(self.base_url, self.cursor_query_param, token)
+
+    def decode_cursor(self, request):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+        try:
+            position = json.loads(base64.urlsafe_b64decode(token.encode()).decode())
+            if not isinstance(position, dict):
+                raise ValueError
+            if 'o' in position:
+                return _cursor_int(position['o'])
+            timestamp = parse_datetime(position['t'])
+            if timestamp is None:
+                raise ValueError
+            return timestamp, _cursor_int(position['i'])
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def _default_ordering(self, queryset):
+        # Filters may impose their own order (e.g. search rank); keyset only on the default
+        order_by = queryset.query.order_by
+        return str(order_by[0]) if order_by else self.ordering_field
+
+    def _after(self, cursor):
+        if not isinstance(cursor, tuple):
+            raise NotFound(self.invalid_cursor_message)
+        timestamp, pk = cursor
+        op = 'lt' if self.reverse else 'gt'
+        return (
+            Q(**{f'{self.ordering_field}__{op}': timestamp})
+            | Q(**{self.ordering_field: timestamp, f'id__{op}': pk})
+        )
+
+
+def _cursor_int(value):
+    # Offsets and ids we issued: non-negative and within bigint (anything else would reach the database)
+    if not isinstance(value, int) or isinstance(value, bool) or not 0 <= value < 2 ** 63:
+        raise ValueError
+    return value
+
+
+def _get(row, key):
+    # Pages may hold model instances or .values() dicts
+    if isinstance(row, dict):
+        return row.get(key)
+    return getattr(row, key)
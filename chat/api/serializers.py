@@ -1,14 +1,84 @@
+from django.utils import timezone
 from rest_framework import serializers
 from chat.models import ChatMessage, Notification
 
 class ChatMessageSerializer(serializers.ModelSerializer):
     class Meta:
         model = ChatMessage
-        fields = '__all__'
+        exclude = ['search_vector']
+
+    def validate(self, attrs):
+        def value(field):
+            return attrs[field] if field in attrs else getattr(self.instance, field, None)
+        # The userbot would have nothing to send (drafts are empty when the LLM was unavailable)
+        if value('user_approved_reply') and not value('reply_sent') and not (value('reply_message') or value('ai_generated_message')):
+            raise serializers.ValidationError({'reply_message': 'An approved reply needs reply text.'})
+        return attrs
+
+
+class ChatMessageReadSerializer:
+    """
+    Hand-written, read-only counterpart of ChatMessageSerializer for list endpoints.
+
+    Works on `.values()` rows instead of model instances, skipping ModelSerializer's
+    per-field machinery, and supports sparse fieldsets (`?fields=id,message`).
+    Output matches ChatMessageSerializer for the selected fields.
+    """
+    # Output field -> ORM column used in .values()
+    sources = {
+        field.name: field.attname for field in ChatMessage._meta.concrete_fields if not field.generated
+    }
+    datetime_fields = frozenset(
+        field.name for field in ChatMessage._meta.concrete_fields if field.get_internal_type() == 'DateTimeField'
+    )
+
+    def __init__(self, rows, fields=None):
+        self.rows = rows
+        self.fields = fields or tuple(self.sources)
+
+    @classmethod
+    def parse_fields(cls, param):
+        """Validate a comma-separated `?fields=` value; returns a tuple of field names or None for all."""
+        if not param:
+            return None
+        fields = tuple(dict.fromkeys(f.strip() for f in param.split(',') if f.strip()))
+        unknown = [f for f in fields if f not in cls.sources]
+        if unknown:
+            raise serializers.ValidationError({'fields': f"Unknown field(s): {', '.join(unknown)}"})
+        return fields
+
+    @classmethod
+    def values_for(cls, fields):
+        """Columns to fetch; timestamp and id are always included for cursor pagination."""
+        columns = [cls.sources[f] for f in (fields or cls.sources)]
+        for required in ('id', 'timestamp'):
+            if required not in columns:
+                columns.append(required)
+        return columns
+
+    @property
+    def data(self):
+        fields = [(f, self.sources[f], f in self.datetime_fields) for f in self.fields]
+        return [
+            {name: (_format_datetime(row[column]) if is_dt else row[column]) for name, column, is_dt in fields}
+            for row in self.rows
+        ]
+
+
+def _format_datetime(value):
+    # Same rendering as DRF's DateTimeField
+    if value is None:
+        return None
+    if timezone.is_aware(value):
+        value = timezone.localtime(value)
+    value = value.isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
 
 
 class NotificationSerializer(serializers.ModelSerializer):
     class Meta:
         model = Notification
         fields = ['id', 'user', 'body', 'is_read', 'timestamp']
-        read_only_fields = ['id', 'timestamp', 'user']
\ No newline at end of file
+        read_only_fields = ['id', 'timestamp', 'user']
@@ -7,15 +7,24 @@ urlpatterns = [
     path('login/', views.LoginView.as_view(), name='login'),
     path('dataset/', views.DatasetUploadView.as_view(), name='dataset-upload'),
     path('model/', views.ModelUploadView.as_view(), name='model-upload'),
+    path('model/uploads/', views.ModelUploadSessionListView.as_view(), name='model-upload-session-list'),
+    path('model/uploads/<uuid:upload_id>/', views.ModelUploadSessionView.as_view(), name='model-upload-session'),
+    path('model/uploads/<uuid:upload_id>/chunks/<int:index>/', views.ModelUploadChunkView.as_view(), name='model-upload-chunk'),
+    path('model/uploads/<uuid:upload_id>/commit/', views.ModelUploadCommitView.as_view(), name='model-upload-commit'),
     path('model/unzip/', views.ModelUnzipView.as_view(), name='model-unzip'),
     path('agent_status/', views.AgentStatusView.as_view(), name='agent-status'),
     path('telegram/', views.TelegramModelView.as_view(), name='telegram-model'),
     path('userbot/', views.UserbotControlView.as_view(), name='userbot-control'),
+    path('userbot/history/', views.UserbotHistoryImportView.as_view(), name='userbot-history-import'),
     path('messages/', views.ChatMessageListCreateView.as_view(), name='chatmessage-list-create'),
+    path('messages/approve/', views.ChatMessageBulkApproveView.as_view(), name='chatmessage-bulk-approve'),
     path('messages/<int:pk>/', views.ChatMessageDetailView.as_view(), name='chatmessage-detail'),
     path('create_superuser/', views.CreateSuperuserView.as_view(), name='create-superuser'),
     path('logout/', views.LogoutView.as_view(), name='logout'),
     path('profile/', views.ProfileView.as_view(), name='profile'),
-    path('notifications/', views.NotificationViewSet.as_view({'get': 'list', 'post': 'create'}), name='notification-list'),
+    path('notifications/', views.NotificationViewSet.as_view({'get': 'list', 'post': 'create', 'delete': 'delete_before'}), name='notification-list'),
+    path('notifications/unread_count/', views.NotificationViewSet.as_view({'get': 'unread_count'}), name='notification-unread-count'),
+    path('notifications/mark_read/', views.NotificationViewSet.as_view({'post': 'mark_read'}), name='notification-mark-read'),
+    path('events/', views.event_stream, name='event-stream'),
     path('notifications/<int:pk>/', views.NotificationViewSet.as_view({'get': 'retrieve', 'put': 'update', 'patch': 'partial_update', 'delete': 'destroy'}), name='notification-detail'),
 ]
\ No newline at end of file
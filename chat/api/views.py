@@ -1,11 +1,14 @@
-import os
-import shutil
-import zipfile
+import asyncio
+import io
+import json
+import logging
 
 from django.contrib.auth import authenticate
 from django.contrib.auth.models import User
-from django.http import JsonResponse
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from rest_framework import viewsets, generics, filters, status, serializers
 from rest_framework.parsers import MultiPartParser
 from rest_framework.permissions import IsAuthenticated, AllowAny
@@ -13,9 +16,23 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework_simplejwt.tokens import RefreshToken, OutstandingToken, BlacklistedToken
 
-from chat.models import UserProfile, Telegram, ChatMessage, Notification, UserModelFile
-from chat.api.serializers import ChatMessageSerializer, NotificationSerializer
-from agent_dump.userbot_manager import TelegramUserBotManager
+from chat.models import UserProfile, Telegram, TelegramHistoryImport, ChatMessage, Notification, UserModelFile, ModelUpload
+from chat.artifacts import is_extracted, link_user_model
+from chat.cache import get_profile, get_telegram
+from chat.blobstore import (
+    BlobFileResponse, RangeReader, UploadError, commit_upload, create_upload, missing_chunks, open_model_file,
+    parse_range, receive_chunk, write_model_file,
+)
+from chat.dataset import EXPORT_FORMATS, import_rows, iter_upload_rows, stream_export
+from chat.tasks import unzip_model
+from chat.utils import file_blocks, is_asgi, streaming_body
+from chat.api.serializers import ChatMessageSerializer, ChatMessageReadSerializer, NotificationSerializer
+from chat.api.filters import FullTextSearchFilter
+from chat.api.pagination import KeysetCursorPagination
+from chat import userbots
+from chat.userbots import RUNNING_USERBOTS
+
+logger = logging.getLogger(__name__)
 
 
 # Superuser creation endpoint
@@ -57,10 +74,9 @@ class RegisterView(APIView):
             last_name=last_name
         )
         # Automatically create UserProfile for new user
-        UserProfile.objects.create(user=user)
+        profile = UserProfile.objects.create(user=user)
 
         refresh = RefreshToken.for_user(user)
-        profile = UserProfile.objects.get(user=user)
         return Response({
             'refresh': str(refresh),
             'access': str(refresh.access_token),
@@ -92,7 +108,7 @@ class LoginView(APIView):
                 data['lastname'] = user.last_name
                 # Add is_onboarded field
                 try:
-                    profile = UserProfile.objects.get(user=user)
+                    profile = get_profile(user.id)
                     data['is_onboarded'] = profile.is_onboarded
                 except UserProfile.DoesNotExist:
                     data['is_onboarded'] = False
@@ -119,13 +135,9 @@ class LogoutView(APIView):
                 except Exception:
                     pass
         except Exception as e:
-            print(f"Warning: Could not blacklist tokens for {user.username}: {e}")
+            logger.warning("Could not blacklist tokens: %s", e, extra={"user": user.username})
         # Stop userbot if running
-        username = user.username
-        bot = RUNNING_USERBOTS.get(username)
-        if bot:
-            bot.stop()
-            del RUNNING_USERBOTS[username]
+        userbots.stop(user)
         return Response({"status": "logged out"}, status=200)
 
 
@@ -137,7 +149,7 @@ class ProfileView(APIView):
     def get(self, request, format=None):
         user = request.user
         try:
-            profile = UserProfile.objects.get(user=user)
+            profile = get_profile(user.id)
         except UserProfile.DoesNotExist:
             return Response({'error': 'UserProfile not found.'}, status=404)
         agent_running_status = user.username in RUNNING_USERBOTS
@@ -181,30 +193,17 @@ class ProfileView(APIView):
 
     def delete(self, request, format=None):
         user = request.user
-        username = user.username
         # Stop userbot if running
-        bot = RUNNING_USERBOTS.get(username)
-        if bot:
-            bot.stop()
-            del RUNNING_USERBOTS[username]
+        userbots.stop(user)
         user.delete()
         return Response({'status': 'deleted'}, status=200)
     
     
 
-# Utility to get per-user dump path
-def get_user_dump_path(username):
-    base = os.path.join('agent_dump', str(username))
-    os.makedirs(base, exist_ok=True)
-    return base
-
-
-
 class DatasetUploadView(APIView):
     parser_classes = [MultiPartParser]
 
     def get(self, request, format=None):
-        import json
         user = getattr(request, 'user', None)
         username = None
         if user and user.is_authenticated:
@@ -213,38 +212,16 @@ class DatasetUploadView(APIView):
             username = request.query_params.get('username')
         if not username:
             return Response({'error': 'username required'}, status=400)
-        # Export all ChatMessage fields for this user as JSON (not JSONL)
-        from chat.models import ChatMessage
-        messages = ChatMessage.objects.filter(user__username=username)
-        data = []
-        for msg in messages:
-            data.append({
-                'id': msg.id,
-                'user': msg.user.username,
-                'contact': msg.contact.name if msg.contact else None,
-                'timestamp': msg.timestamp.isoformat() if msg.timestamp else None,
-                'message': msg.message,
-                'platform': msg.platform,
-                'emotion': msg.emotion,
-                'sentiment': msg.sentiment,
-                'is_toxic': msg.is_toxic,
-                'telegram_chat_id': msg.telegram_chat_id,
-                'telegram_message_id': msg.telegram_message_id,
-                'is_important': msg.is_important,
-                'is_nsfw': msg.is_nsfw,
-                'user_approved_reply': msg.user_approved_reply,
-                'reply_sent': msg.reply_sent,
-                'score': msg.score,
-                'ai_generated_message': msg.ai_generated_message,
-                'reply_message': msg.reply_message,
-            })
-        response = Response(data, content_type='application/json')
-        response['Content-Disposition'] = 'attachment; filename="dataset.json"'
+        # Export all ChatMessage fields for this user, streamed as a JSON array (default) or NDJSON
+        export_format = request.query_params.get('export_format', 'json').lower()
+        if export_format not in EXPORT_FORMATS:
+            return Response({'error': f"export_format must be one of: {', '.join(EXPORT_FORMATS)}"}, status=400)
+        content_type, filename = EXPORT_FORMATS[export_format]
+        response = StreamingHttpResponse(streaming_body(request, stream_export(username, export_format)), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
         return response
 
     def post(self, request, format=None):
-        import json
-        from agent_dump.pipeline_utils import embed_new_message
         user = getattr(request, 'user', None)
         username = None
         if user and user.is_authenticated:
@@ -256,45 +233,13 @@ class DatasetUploadView(APIView):
         file_obj = request.FILES.get('file')
         if not file_obj:
             return Response({'error': 'No file provided'}, status=400)
-        # Only accept valid JSON array, not JSONL
-        from django.contrib.auth.models import User
-        from chat.models import Contact, ChatMessage
+        # Accepts a JSON array (as exported by GET) or NDJSON, parsed as a stream
         user_obj = User.objects.get(username=username)
-        added = 0
         try:
-            content = file_obj.read().decode('utf-8')
-            rows = json.loads(content)
-            if not isinstance(rows, list):
-                return Response({'error': 'Uploaded file must be a JSON array, not JSONL or object.'}, status=400)
-            for row in rows:
-                # Find or create a contact (fallback to 'Imported')
-                contact, _ = Contact.objects.get_or_create(user=user_obj, name=row.get('contact') or 'Imported', defaults={'platform': row.get('platform', 'imported')})
-                # Avoid duplicate: check for same message and ai_generated_message
-                if not ChatMessage.objects.filter(user=user_obj, message=row.get('message'), ai_generated_message=row.get('ai_generated_message')).exists():
-                    msg = ChatMessage.objects.create(
-                        user=user_obj,
-                        contact=contact,
-                        timestamp=row.get('timestamp'),
-                        message=row.get('message'),
-                        platform=row.get('platform', 'imported'),
-                        emotion=row.get('emotion'),
-                        sentiment=row.get('sentiment'),
-                        is_toxic=row.get('is_toxic', False),
-                        telegram_chat_id=row.get('telegram_chat_id'),
-                        telegram_message_id=row.get('telegram_message_id'),
-                        is_important=row.get('is_important', False),
-                        is_nsfw=row.get('is_nsfw', False),
-                        user_approved_reply=row.get('user_approved_reply', False),
-                        reply_sent=row.get('reply_sent', False),
-                        score=row.get('score'),
-                        ai_generated_message=row.get('ai_generated_message'),
-                        reply_message=row.get('reply_message'),
-                    )
-                    added += 1
-                    # Embed the new message
-                    embed_new_message(msg.id)
+            added = import_rows(user_obj, iter_upload_rows(file_obj.chunks()))
         except Exception as e:
             return Response({'error': f'Failed to import: {str(e)}'}, status=400)
+        # New messages are embedded on background workers, one job per import batch
         return Response({'status': 'imported', 'added': added}, status=201)
 
 
@@ -303,7 +248,7 @@ class ModelUploadView(APIView):
     parser_classes = [MultiPartParser]
 
     def post(self, request, format=None):
-        """Upload model zip and store in DB (overwrites previous for user)."""
+        """Upload model zip and store it in chunked DB storage (overwrites previous for user)."""
         user = getattr(request, 'user', None)
         username = request.data.get('username') if not (user and user.is_authenticated) else user.username
         if not username:
@@ -313,42 +258,133 @@ class ModelUploadView(APIView):
             return Response({'error': 'No file provided'}, status=400)
         from django.contrib.auth.models import User
         user_obj = User.objects.get(username=username)
-        file_bytes = b''.join(chunk for chunk in file_obj.chunks())
-        # Remove previous file for this user (if any)
-        UserModelFile.objects.filter(user=user_obj, filename='dpo_model.zip').delete()
-        UserModelFile.objects.create(user=user_obj, filename='dpo_model.zip', file=file_bytes)
-        return Response({'status': 'uploaded to db'}, status=201)
+        # Streams the upload chunk by chunk; the previous file is replaced in the same transaction
+        model_file = write_model_file(user_obj, 'dpo_model.zip', file_obj.chunks())
+        return Response({'status': 'uploaded to db', 'size': model_file.size, 'sha256': model_file.sha256}, status=201)
 
     def get(self, request, format=None):
-        username = request.query_params.get('username')
-        if not username:
-            return Response({'error': 'username required'}, status=400)
-        from django.contrib.auth.models import User
-        user_obj = User.objects.get(username=username)
-        model_file = UserModelFile.objects.filter(user=user_obj, filename='dpo_model.zip').first()
-        if not model_file:
-            return Response(status=404)
-        data = model_file.file
-        response = Response(data, status=200, content_type='application/zip')
-        response['Content-Disposition'] = f'attachment; filename="dpo_model.zip"'
-        response['Content-Length'] = str(len(data))
+        model_file, error = self._get_model_file(request)
+        if error:
+            return error
+        etag = f'"{model_file.sha256}"'
+        byte_range = None
+        if_range = request.headers.get('If-Range')
+        if not if_range or if_range == etag:
+            try:
+                byte_range = parse_range(request.headers.get('Range'), model_file.size)
+            except ValueError:
+                response = HttpResponse(status=416)
+                response['Content-Range'] = f'bytes */{model_file.size}'
+                return response
+        reader = open_model_file(model_file)
+        if byte_range is None:
+            response = self._file_response(request, reader, 200)
+            response['Content-Length'] = str(model_file.size)
+        else:
+            start, end = byte_range
+            reader.seek(start)
+            response = self._file_response(request, RangeReader(reader, end - start + 1), 206)
+            response['Content-Range'] = f'bytes {start}-{end}/{model_file.size}'
+            response['Content-Length'] = str(end - start + 1)
+        response['Accept-Ranges'] = 'bytes'
+        response['ETag'] = etag
+        return response
+
+    def _file_response(self, request, fileobj, status):
+        if not is_asgi(request):
+            return BlobFileResponse(fileobj, status=status, as_attachment=True, filename='dpo_model.zip', content_type='application/zip')
+        # Under ASGI FileResponse would read the whole blob before sending; stream it block by block instead
+        body = streaming_body(request, file_blocks(fileobj, BlobFileResponse.block_size), batch_size=1)
+        response = StreamingHttpResponse(body, status=status, content_type='application/zip')
+        response['Content-Disposition'] = 'attachment; filename="dpo_model.zip"'
         return response
 
     def head(self, request, format=None):
+        model_file, error = self._get_model_file(request)
+        if error:
+            return error
+        # Size and checksum come from metadata; the blob isn't touched
+        response = Response(status=200)
+        response['Content-Length'] = str(model_file.size)
+        response['Accept-Ranges'] = 'bytes'
+        response['ETag'] = f'"{model_file.sha256}"'
+        return response
+
+    def _get_model_file(self, request):
         username = request.query_params.get('username')
         if not username:
-            return Response({'error': 'username required'}, status=400)
+            return None, Response({'error': 'username required'}, status=400)
         from django.contrib.auth.models import User
         user_obj = User.objects.get(username=username)
-        model_file = UserModelFile.objects.filter(user=user_obj, filename='dpo_model.zip').first()
+        model_file = UserModelFile.objects.filter(user=user_obj, filename='dpo_model.zip').order_by('-uploaded_at').first()
         if not model_file:
-            return Response(status=404)
-        file_size = len(model_file.file)
-        response = Response(status=200)
-        response['Content-Length'] = str(file_size)
-        response['Accept-Ranges'] = 'bytes'
-        return response
-    
+            return None, Response(status=404)
+        return model_file, None
+
+
+# Resumable chunked model uploads: POST (init) -> PUT chunks/<n>/ -> POST commit/
+class ModelUploadSessionListView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, format=None):
+        try:
+            upload = create_upload(
+                request.user,
+                'dpo_model.zip',
+                request.data.get('size'),
+                request.data.get('chunk_size'),
+                request.data.get('chunks'),
+                request.data.get('sha256'),
+            )
+        except UploadError as e:
+            return Response({'error': str(e)}, status=400)
+        # Chunks already stored (earlier versions, other users) don't need to be sent again
+        return Response({'upload_id': str(upload.id), 'chunk_size': upload.chunk_size, 'missing': missing_chunks(upload)}, status=201)
+
+
+class ModelUploadSessionView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, upload_id, format=None):
+        upload = ModelUpload.objects.filter(id=upload_id, user=request.user).first()
+        if not upload:
+            return Response({'error': 'Upload not found.'}, status=404)
+        data = {'upload_id': str(upload.id), 'status': upload.status, 'size': upload.size, 'chunk_size': upload.chunk_size}
+        if upload.status == 'open':
+            data['missing'] = missing_chunks(upload)
+        return Response(data, status=200)
+
+
+class ModelUploadChunkView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def put(self, request, upload_id, index, format=None):
+        upload = ModelUpload.objects.filter(id=upload_id, user=request.user, status='open').first()
+        if not upload:
+            return Response({'error': 'Open upload not found.'}, status=404)
+        # Raw body, read incrementally (bypasses DATA_UPLOAD_MAX_MEMORY_SIZE and the parsers)
+        try:
+            chunk = receive_chunk(upload, index, request.stream or io.BytesIO())
+        except UploadError as e:
+            return Response({'error': str(e)}, status=400)
+        return Response({'index': chunk.index, 'sha256': chunk.sha256}, status=200)
+
+
+class ModelUploadCommitView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, upload_id, format=None):
+        upload = ModelUpload.objects.filter(id=upload_id, user=request.user).first()
+        if not upload:
+            return Response({'error': 'Upload not found.'}, status=404)
+        if upload.status != 'open':
+            return Response({'error': 'Upload already committed.'}, status=409)
+        try:
+            model_file = commit_upload(upload)
+        except UploadError as e:
+            return Response({'error': str(e), 'missing': missing_chunks(upload)}, status=409)
+        return Response({'status': 'committed', 'size': model_file.size, 'sha256': model_file.sha256}, status=201)
+
 
 class ModelUnzipView(APIView):
     def post(self, request, format=None):
@@ -358,20 +394,16 @@ class ModelUnzipView(APIView):
             return Response({'error': 'username required'}, status=400)
         from django.contrib.auth.models import User
         user_obj = User.objects.get(username=username)
-        model_file = UserModelFile.objects.filter(user=user_obj, filename='dpo_model.zip').first()
+        model_file = UserModelFile.objects.filter(user=user_obj, filename='dpo_model.zip').order_by('-uploaded_at').first()
         if not model_file:
             return Response({'error': 'Model zip not found in DB.'}, status=404)
-        dump_dir = get_user_dump_path(username)
-        extract_dir = os.path.join(dump_dir, 'dpo_model')
-        if os.path.isdir(extract_dir):
-            shutil.rmtree(extract_dir)
-        # Write zip to a temp file in memory, then extract
-        import io
-        zip_bytes = io.BytesIO(model_file.file)
-        with zipfile.ZipFile(zip_bytes, 'r') as zip_ref:
-            zip_ref.extractall(extract_dir)
+        if model_file.sha256 and is_extracted(model_file):
+            # This content is already in the artifact cache: just (re)link it
+            return Response({'status': 'extracted', 'extract_dir': link_user_model(model_file, username)}, status=200)
+        # Extraction runs on a job worker (which must share this disk).
         # Note: Extracted files in agent_dump/{username}/dpo_model/ are TEMPORARY and will be lost on redeploy.
-        return Response({'status': 'unzipped'}, status=200)
+        job = unzip_model.enqueue({'user_id': user_obj.id}, user=user_obj)
+        return Response({'status': 'queued', 'job_id': job.id}, status=202)
 
 
 
@@ -418,7 +450,8 @@ class ChatMessageListCreateView(generics.ListCreateAPIView):
     permission_classes = [IsAuthenticated]
     queryset = ChatMessage.objects.all()
     serializer_class = ChatMessageSerializer
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+    pagination_class = KeysetCursorPagination
+    filter_backends = [FullTextSearchFilter, filters.OrderingFilter]
     search_fields = ['message', 'reply_message', 'emotion', 'sentiment', 'platform', 'contact__name', 'user__username']
     ordering_fields = ['timestamp', 'score', 'is_important', 'is_toxic', 'sentiment']
 
@@ -444,6 +477,69 @@ class ChatMessageListCreateView(generics.ListCreateAPIView):
             queryset = queryset.filter(sentiment=sentiment)
         return queryset
 
+    def list(self, request, *args, **kwargs):
+        # Read path bypasses ModelSerializer: fetch plain rows and render them directly
+        fields = ChatMessageReadSerializer.parse_fields(request.query_params.get('fields'))
+        queryset = self.filter_queryset(self.get_queryset())
+        rows = self.paginate_queryset(queryset.values(*ChatMessageReadSerializer.values_for(fields)))
+        return self.get_paginated_response(ChatMessageReadSerializer(rows, fields=fields).data)
+
+# Approve (and optionally edit) many pending replies at once and wake the userbot's sender
+class ChatMessageBulkApproveView(APIView):
+    permission_classes = [IsAuthenticated]
+    max_messages = 1000
+
+    def post(self, request, format=None):
+        items = request.data.get('messages')
+        if not isinstance(items, list) or not items:
+            return Response({'error': 'messages must be a non-empty list.'}, status=400)
+        if len(items) > self.max_messages:
+            return Response({'error': f'At most {self.max_messages} messages per request.'}, status=400)
+        edits = {}
+        for item in items:
+            # Either a bare id or {"id": ..., "reply_message": "edited text"}
+            if isinstance(item, dict):
+                message_id, reply = item.get('id'), item.get('reply_message')
+            else:
+                message_id, reply = item, None
+            if not isinstance(message_id, int) or isinstance(message_id, bool) or not (reply is None or isinstance(reply, str)):
+                return Response({'error': 'Each message must be an id or {"id": int, "reply_message": str}.'}, status=400)
+            edits[message_id] = reply
+
+        from django.db import transaction
+        from chat.events import message_created_or_updated
+        approved, skipped = [], []
+        with transaction.atomic():
+            messages = {
+                m.id: m for m in ChatMessage.objects.select_for_update().filter(user=request.user, id__in=list(edits))
+            }
+            for message_id, reply in edits.items():
+                msg = messages.get(message_id)
+                if msg is None:
+                    skipped.append({'id': message_id, 'reason': 'not found'})
+                    continue
+                if msg.reply_sent:
+                    skipped.append({'id': message_id, 'reason': 'already sent'})
+                    continue
+                reply = reply if reply is not None else (msg.reply_message or msg.ai_generated_message)
+                if not reply:
+                    # No draft to approve (the LLM was unavailable): the user has to write the reply
+                    skipped.append({'id': message_id, 'reason': 'no reply'})
+                    continue
+                msg.user_approved_reply = True
+                msg.reply_message = reply
+                approved.append(msg)
+            ChatMessage.objects.bulk_update(approved, ['user_approved_reply', 'reply_message'])
+            # bulk_update sends no post_save; publish the live events explicitly
+            for msg in approved:
+                message_created_or_updated(ChatMessage, msg, created=False)
+
+        bot = RUNNING_USERBOTS.get(request.user.username)
+        if bot and approved:
+            bot.request_send()
+        return Response({'approved': [m.id for m in approved], 'skipped': skipped}, status=200)
+
+
 # Retrieve, update, or delete a specific message
 class ChatMessageDetailView(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [IsAuthenticated]
@@ -467,8 +563,8 @@ class TelegramModelView(APIView):
         if not username:
             return Response({'error': 'username required'}, status=400)
         try:
-            user_obj = User.objects.get(username=username)
-            telegram = Telegram.objects.get(user=user_obj)
+            user_obj = user if (user and user.is_authenticated) else User.objects.get(username=username)
+            telegram = get_telegram(user_obj.id)
             data = {
                 'username': username,
                 'telegram_api_id': telegram.telegram_api_id,
@@ -502,7 +598,8 @@ class TelegramModelView(APIView):
         telegram.telegram_api_hash = telegram_api_hash
         telegram.telegram_mobile_number = telegram_mobile_number
         telegram.telegram_pin_code = telegram_pin_code
-        telegram.save()
+        # Only the credentials: the userbot writes pin_required / userbot_enabled concurrently
+        telegram.save(update_fields=['telegram_api_id', 'telegram_api_hash', 'telegram_mobile_number', 'telegram_pin_code'])
         # Set is_onboarded True on UserProfile if not already
         try:
             profile = UserProfile.objects.get(user=user_obj)
@@ -525,21 +622,19 @@ class TelegramModelView(APIView):
         except Telegram.DoesNotExist:
             return Response({'error': 'Telegram model not found.'}, status=404)
         # Update only provided fields
-        for field in ['telegram_api_id', 'telegram_api_hash', 'telegram_mobile_number', 'telegram_pin_code', 'pin_required']:
-            if field in request.data:
-                value = request.data.get(field)
-                # Convert pin_required to boolean if needed
-                if field == 'pin_required' and isinstance(value, str):
-                    value = value.lower() == 'true'
-                setattr(telegram, field, value)
-        telegram.save()
+        fields = [f for f in ['telegram_api_id', 'telegram_api_hash', 'telegram_mobile_number', 'telegram_pin_code', 'pin_required'] if f in request.data]
+        for field in fields:
+            value = request.data.get(field)
+            # Convert pin_required to boolean if needed
+            if field == 'pin_required' and isinstance(value, str):
+                value = value.lower() == 'true'
+            setattr(telegram, field, value)
+        if fields:
+            telegram.save(update_fields=fields)
         return Response({'status': 'updated'}, status=200)
     
 
 
-# In-memory store for running userbots: {username: TelegramUserBotManager instance}
-RUNNING_USERBOTS = {}
-
 class UserbotControlView(APIView):
     """
     POST: Start userbot for a user (requires username, model_choice)
@@ -562,27 +657,18 @@ class UserbotControlView(APIView):
             return Response({'error': 'User not found.'}, status=404)
         except Telegram.DoesNotExist:
             return Response({'error': 'Telegram credentials not found.'}, status=404)
-        # Start userbot
-        bot = TelegramUserBotManager(
-            user=user_obj,
-            api_id=telegram.telegram_api_id,
-            api_hash=telegram.telegram_api_hash,
-            session_name=f'userbot_{username}',
-            model_choice=model_choice
-        )
-        bot.start()
-        RUNNING_USERBOTS[username] = bot
+        # Start userbot (and keep it running across restarts until stopped)
+        if not userbots.start(user_obj, telegram, model_choice=model_choice):
+            return Response({'status': 'already running'}, status=200)
         return Response({'status': 'started'}, status=201)
 
     def delete(self, request, format=None):
         username = request.data.get('username')
         if not username:
             return Response({'error': 'username required'}, status=400)
-        bot = RUNNING_USERBOTS.get(username)
-        if not bot:
+        user_obj = User.objects.filter(username=username).first()
+        if user_obj is None or not userbots.stop(user_obj):
             return Response({'status': 'not running'}, status=200)
-        bot.stop()
-        del RUNNING_USERBOTS[username]
         return Response({'status': 'stopped'}, status=200)
 
     def get(self, request, format=None):
@@ -593,6 +679,51 @@ class UserbotControlView(APIView):
         return Response({'running': running}, status=200)
     
 
+class UserbotHistoryImportView(APIView):
+    """
+    POST: Import the user's Telegram chat history through their running userbot (continues an unfinished import)
+    GET: Progress of the latest import
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, format=None):
+        bot = RUNNING_USERBOTS.get(request.user.username)
+        if bot is None:
+            return Response({'error': 'Start the userbot first.'}, status=409)
+        record = TelegramHistoryImport.objects.filter(user=request.user).order_by('-created_at').first()
+        if record is None or record.status == 'done':
+            try:
+                with transaction.atomic():
+                    record = TelegramHistoryImport.objects.create(user=request.user)
+            except IntegrityError:
+                # Another request started one just now
+                record = TelegramHistoryImport.objects.get(user=request.user, status='running')
+        elif record.status == 'failed':
+            # Retry from the checkpoint
+            record.status, record.error, record.finished_at = 'running', None, None
+            record.save(update_fields=['status', 'error', 'finished_at', 'updated_at'])
+        bot.import_history()
+        return Response(self._data(record), status=202)
+
+    def get(self, request, format=None):
+        record = TelegramHistoryImport.objects.filter(user=request.user).order_by('-created_at').first()
+        if record is None:
+            return Response({'error': 'No history import.'}, status=404)
+        return Response(self._data(record), status=200)
+
+    def _data(self, record):
+        return {
+            'import_id': record.id,
+            'status': record.status,
+            'dialogs_done': len(record.completed_dialogs),
+            'messages_fetched': record.messages_fetched,
+            'messages_created': record.messages_created,
+            'error': record.error,
+            'created_at': record.created_at,
+            'finished_at': record.finished_at,
+        }
+
+
 # Notification CRUD API
 class NotificationSerializer(serializers.ModelSerializer):
     class Meta:
@@ -604,12 +735,100 @@ class NotificationViewSet(viewsets.ModelViewSet):
     serializer_class = NotificationSerializer
     permission_classes = [IsAuthenticated]
 
+    pagination_class = KeysetCursorPagination
+
     def get_queryset(self):
         return Notification.objects.filter(user=self.request.user).order_by('-timestamp')
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
+    def unread_count(self, request, *args, **kwargs):
+        # Served from the partial notification_unread_idx index
+        return Response({'unread': self._unread(request.user)}, status=200)
+
+    def mark_read(self, request, *args, **kwargs):
+        """Mark notifications read: the given ids, those up to `before`, or all of them."""
+        queryset = Notification.objects.filter(user=request.user, is_read=False)
+        ids = request.data.get('ids')
+        if ids is not None:
+            if not isinstance(ids, list) or not all(isinstance(i, int) for i in ids):
+                return Response({'error': 'ids must be a list of integers.'}, status=400)
+            queryset = queryset.filter(id__in=ids)
+        if request.data.get('before'):
+            before = parse_datetime(str(request.data['before']))
+            if before is None:
+                return Response({'error': 'before must be an ISO 8601 timestamp.'}, status=400)
+            queryset = queryset.filter(timestamp__lte=before)
+        updated = queryset.update(is_read=True)
+        return self._bulk_response(request.user, {'updated': updated})
+
+    def delete_before(self, request, *args, **kwargs):
+        before = parse_datetime(request.query_params.get('before', ''))
+        if before is None:
+            return Response({'error': 'before query parameter (ISO 8601 timestamp) required.'}, status=400)
+        # Nothing cascades from notifications, so this is a single DELETE
+        deleted = Notification.objects.filter(user=request.user, timestamp__lt=before).delete()[0]
+        return self._bulk_response(request.user, {'deleted': deleted})
+
+    def _unread(self, user):
+        return Notification.objects.filter(user=user, is_read=False).count()
+
+    def _bulk_response(self, user, data):
+        # Bulk queries send no post_save; tell open event streams the new badge count
+        from chat.events import publish
+        data['unread'] = self._unread(user)
+        publish(user.id, 'notification.unread_count', {'unread': data['unread']})
+        return Response(data, status=200)
+
+
+# Server-Sent Events stream of the user's message and notification events.
+# A plain async view (DRF views are sync): served without tying up a worker under ASGI.
+EVENT_STREAM_KEEPALIVE = 15
+
+
+def _authenticate_stream(request):
+    from rest_framework.exceptions import AuthenticationFailed
+    from rest_framework_simplejwt.authentication import JWTAuthentication
+    from rest_framework_simplejwt.exceptions import TokenError
+    # EventSource can't send headers, so the access token may also come as ?token=
+    header = request.headers.get('Authorization', '')
+    raw = header.split(' ', 1)[1] if header.startswith('Bearer ') else request.GET.get('token')
+    if not raw:
+        return None
+    auth = JWTAuthentication()
+    try:
+        return auth.get_user(auth.get_validated_token(raw))
+    except (AuthenticationFailed, TokenError):
+        return None
+
+
+async def event_stream(request):
+    from asgiref.sync import sync_to_async
+    from chat.events import listener
+    user = await sync_to_async(_authenticate_stream)(request)
+    if user is None:
+        return JsonResponse({'error': 'Authentication credentials were not provided or are invalid.'}, status=401)
+    subscription = listener.subscribe(user.id)
+
+    async def events():
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                try:
+                    event = await subscription.get(EVENT_STREAM_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ': keepalive\n\n'
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event['data'])}\n\n"
+        finally:
+            listener.unsubscribe(subscription)
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
 
 # API Endpoints Info View
 class APIEndpointsInfoView(APIView):
@@ -688,7 +907,7 @@ class APIEndpointsInfoView(APIView):
             {
                 "path": "/api/dataset/",
                 "methods": ["POST", "GET"],
-                "description": "Upload or download the per-user SFT dataset (JSON, not JSONL). POST accepts a JSON file, GET returns all chat messages for the user as JSON.",
+                "description": "Upload or download the per-user SFT dataset. POST accepts a JSON array or NDJSON file (new messages are embedded by background jobs, listed at /api/jobs/), GET streams all chat messages for the user as a JSON array, or as NDJSON with ?export_format=ndjson.",
                 "sample_request": {
                     "file": "<file> (multipart/form-data)",
                     "username": "alice"  # if not authenticated
@@ -698,21 +917,107 @@ class APIEndpointsInfoView(APIView):
             {
                 "path": "/api/model/",
                 "methods": ["POST", "GET", "HEAD"],
-                "description": "Upload, download, or check the DPO model zip file for a user. POST uploads a zip to the DB, GET downloads it, HEAD returns Content-Length.",
+                "description": "Upload, download, or check the DPO model zip file for a user. POST uploads a zip to the DB, GET downloads it (supports Range / If-Range for resumable downloads), HEAD returns Content-Length and ETag (sha256).",
                 "sample_request": {
                     "file": "<file> (multipart/form-data)",
                     "username": "alice"  # if not authenticated
                 },
-                "sample_response": {"status": "uploaded to db"}
+                "sample_response": {"status": "uploaded to db", "size": 104857600, "sha256": "<hex>"}
+            },
+            {
+                "path": "/api/analytics/",
+                "methods": ["GET"],
+                "description": "Emotion/sentiment/toxicity trends for the authenticated user from pre-aggregated daily rollups. Query params: from, to (YYYY-MM-DD, default last 30 days, max 366), group_by (day or contact), contact (name).",
+                "sample_request": "/api/analytics/?group_by=day&from=2025-09-01&to=2025-09-30",
+                "sample_response": {
+                    "from": "2025-09-01", "to": "2025-09-30", "group_by": "day",
+                    "totals": {"messages": 42, "classified": 40, "toxic": 1, "important": 5, "nsfw": 0, "replies_sent": 30, "average_score": 87.5, "emotions": {"joy": 20, "anger": 2, "sadness": 5, "fear": 1, "surprise": 3, "neutral": 9}, "sentiments": {"positive": 25, "neutral": 10, "negative": 5}},
+                    "results": [{"day": "2025-09-01", "messages": 3, "...": "..."}]
+                }
+            },
+            {
+                "path": "/api/notifications/unread_count/",
+                "methods": ["GET"],
+                "description": "Number of unread notifications of the authenticated user (for the badge).",
+                "sample_request": {},
+                "sample_response": {"unread": 3}
+            },
+            {
+                "path": "/api/notifications/mark_read/",
+                "methods": ["POST"],
+                "description": "Mark notifications read in one request: the listed ids, all up to a timestamp, or (empty body) all of them.",
+                "sample_request": {"ids": [5, 6, 7]},
+                "sample_response": {"updated": 3, "unread": 0}
+            },
+            {
+                "path": "/api/notifications/?before=<timestamp>",
+                "methods": ["DELETE"],
+                "description": "Delete the authenticated user's notifications older than the given ISO 8601 timestamp.",
+                "sample_request": "/api/notifications/?before=2025-09-01T00:00:00Z",
+                "sample_response": {"deleted": 120, "unread": 2}
+            },
+            {
+                "path": "/api/messages/approve/",
+                "methods": ["POST"],
+                "description": "Approve up to 1000 pending replies in one request, optionally replacing the reply text. Approved replies are sent by the running userbot right away. Messages that don't exist, were already sent or have no reply text (no draft and none given) are reported in skipped.",
+                "sample_request": {"messages": [{"id": 41, "reply_message": "Sure, see you at 8!"}, 42, 43]},
+                "sample_response": {"approved": [41, 42], "skipped": [{"id": 43, "reason": "already sent"}]}
+            },
+            {
+                "path": "/api/events/",
+                "methods": ["GET"],
+                "description": "Server-Sent Events stream of the authenticated user's events: message.created, message.updated (drafts, classification, sent replies), notification.created, notification.updated. Pass the access token as a Bearer header or ?token= (EventSource). Oversized messages arrive with truncated: true and should be refetched.",
+                "sample_request": "/api/events/?token=<access>",
+                "sample_response": "event: message.created\ndata: {\"id\": 42, \"contact_id\": 3, \"contact\": \"Bob\", \"message\": \"Hi!\", \"reply_sent\": false, ...}"
+            },
+            {
+                "path": "/api/model/uploads/",
+                "methods": ["POST"],
+                "description": "Start a resumable chunked DPO model upload. Declare the total size, chunk_size, the sha256 of every chunk and optionally the sha256 of the whole file (checked on commit); the response lists the chunk indexes the server doesn't already have.",
+                "sample_request": {
+                    "size": 20971520,
+                    "chunk_size": 8388608,
+                    "chunks": ["<sha256 of chunk 0>", "<sha256 of chunk 1>", "<sha256 of chunk 2>"],
+                    "sha256": "<sha256 of the whole file>"
+                },
+                "sample_response": {"upload_id": "<uuid>", "chunk_size": 8388608, "missing": [0, 2]}
+            },
+            {
+                "path": "/api/model/uploads/<upload_id>/",
+                "methods": ["GET"],
+                "description": "Upload session status, including the chunks still missing (to resume after an interruption).",
+                "sample_request": {},
+                "sample_response": {"upload_id": "<uuid>", "status": "open", "size": 20971520, "chunk_size": 8388608, "missing": [2]}
+            },
+            {
+                "path": "/api/model/uploads/<upload_id>/chunks/<n>/",
+                "methods": ["PUT"],
+                "description": "Upload chunk n as the raw request body (application/octet-stream). Verified against the declared size and sha256.",
+                "sample_request": "<chunk bytes>",
+                "sample_response": {"index": 2, "sha256": "<sha256>"}
+            },
+            {
+                "path": "/api/model/uploads/<upload_id>/commit/",
+                "methods": ["POST"],
+                "description": "Assemble the uploaded chunks into the user's DPO model zip, replacing the previous version. The returned sha256 (also the download ETag) is the SHA-256 of the whole file; 409 if it differs from the declared one.",
+                "sample_request": {},
+                "sample_response": {"status": "committed", "size": 20971520, "sha256": "<sha256>"}
             },
             {
                 "path": "/api/model/unzip/",
                 "methods": ["POST"],
-                "description": "Unzip the uploaded DPO model for a user (extracts to a temp dir, not persistent).",
+                "description": "Extract the uploaded DPO model for a user into agent_dump/<username>/dpo_model/ (temporary, not persistent). Returns 200 immediately when this model version is already in the extraction cache; otherwise queues a job (202) - poll /api/jobs/<job_id>/ for completion.",
                 "sample_request": {
                     "username": "alice"
                 },
-                "sample_response": {"status": "unzipped"}
+                "sample_response": {"status": "queued", "job_id": 12}
+            },
+            {
+                "path": "/api/jobs/<id>/",
+                "methods": ["GET"],
+                "description": "Status of a background job (dataset embedding, model unzip, ...) owned by the authenticated user.",
+                "sample_request": {},
+                "sample_response": {"id": 12, "task": "chat.tasks.unzip_model", "status": "succeeded", "attempts": 1, "result": {}, "last_error": None}
             },
             {
                 "path": "/api/agent-training-status/",
@@ -752,17 +1057,27 @@ class APIEndpointsInfoView(APIView):
                 },
                 "sample_response": {"status": "started"}
             },
+            {
+                "path": "/api/userbot/history/",
+                "methods": ["POST", "GET"],
+                "description": "Import the user's Telegram chat history through their running userbot (incoming messages paired with the user's replies, then classified and embedded in batches), or get the import's progress. POST continues an unfinished import.",
+                "sample_response": {"import_id": 1, "status": "running", "dialogs_done": 3, "messages_fetched": 1500, "messages_created": 420}
+            },
             {
                 "path": "/api/messages/",
                 "methods": ["GET", "POST"],
-                "description": "List, filter, search, or create chat messages. Supports filtering by user, contact, replied, reply_sent, user_approved_reply, sentiment.",
+                "description": "List, filter, search, or create chat messages. Supports filtering by user, contact, replied, reply_sent, user_approved_reply, sentiment. GET is cursor-paginated on (timestamp, id): follow `next` to get the following page. `fields` limits the returned columns.",
                 "sample_request": {
                     "user": "alice",  # filter by username (GET)
                     "contact": "Bob",  # filter by contact name (GET)
                     "replied": "true",  # filter by replied status (GET)
-                    "sentiment": "positive"  # filter by sentiment (GET)
+                    "sentiment": "positive",  # filter by sentiment (GET)
+                    "page_size": 50,  # rows per page, max 500 (GET)
+                    "fields": "id,message,reply_message,timestamp"  # sparse fieldset (GET)
                 },
-                "sample_response": [
+                "sample_response": {
+                    "next": "/api/messages/?cursor=<opaque>",
+                    "results": [
                     {
                         "id": 1,
                         "user": 1,
@@ -778,7 +1093,8 @@ class APIEndpointsInfoView(APIView):
                         "emotion": "happy",
                         "platform": "telegram"
                     }
-                ]
+                    ]
+                }
             },
             {
                 "path": "/api/messages/<id>/",
@@ -806,7 +1122,7 @@ class APIEndpointsInfoView(APIView):
             {
                 "path": "/api/notifications/",
                 "methods": ["GET", "POST"],
-                "description": "List or create notifications for the authenticated user. GET returns all notifications, POST creates a new notification.",
+                "description": "List or create notifications for the authenticated user. GET returns notifications newest first, paginated ({next, results}; follow next, page_size up to 500), POST creates a new notification.",
                 "sample_request": {
                     "body": "You have a new message!"
                 },
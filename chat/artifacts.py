@@ -0,0 +1,179 @@
+"""
+On-disk cache of extracted DPO model zips, keyed by the zip's SHA-256.
+
+Each stored UserModelFile is extracted at most once, into
+MODEL_ARTIFACT_CACHE_DIR/<sha256>/; users (or versions) that share a zip share
+the directory. Members are streamed from the chunk store straight to disk, one
+at a time. Extraction is recorded by a marker file, whose mtime doubles as the
+last-used time for LRU eviction under MODEL_ARTIFACT_CACHE_BYTES.
+
+agent_dump/<username>/dpo_model is a symlink to the user's current entry, so
+re-running unzip for an unchanged model only re-points (or keeps) the link.
+Entries that some user's link points to are never evicted.
+"""
+
+import logging
+import os
+import shutil
+import threading
+import zipfile
+
+from django.conf import settings
+
+from chat.blobstore import file_sha256, open_model_file
+from chat.utils import USER_DUMP_ROOT, get_user_dump_path
+
+logger = logging.getLogger(__name__)
+
+COMPLETE_MARKER = '.complete'
+_COPY_BUFFER = 1024 * 1024
+
+
+def cache_root():
+    root = str(settings.MODEL_ARTIFACT_CACHE_DIR)
+    os.makedirs(root, exist_ok=True)
+    return root
+
+
+def artifact_dir(model_file):
+    return os.path.join(cache_root(), _content_key(model_file))
+
+
+def is_extracted(model_file):
+    return os.path.exists(os.path.join(artifact_dir(model_file), COMPLETE_MARKER))
+
+
+def ensure_extracted(model_file):
+    """Extract every member of the model zip (once per content hash) and return the directory."""
+    target = artifact_dir(model_file)
+    marker = os.path.join(target, COMPLETE_MARKER)
+    if os.path.exists(marker):
+        _touch(marker)
+        return target
+    os.makedirs(target, exist_ok=True)
+    with open_model_file(model_file) as fileobj, zipfile.ZipFile(fileobj) as archive:
+        for info in archive.infolist():
+            _extract_member(archive, info, target)
+    with open(marker, 'w') as f:
+        f.write(model_file.sha256)
+    logger.info("Model artifact extracted", extra={"sha256": model_file.sha256, "size": model_file.size})
+    evict(keep=target)
+    return target
+
+
+def link_user_model(model_file, username):
+    """Point agent_dump/<username>/dpo_model at the extracted artifact."""
+    target = ensure_extracted(model_file)
+    link = os.path.join(get_user_dump_path(username), 'dpo_model')
+    if os.path.islink(link) and os.readlink(link) == target:
+        return link
+    if os.path.isdir(link) and not os.path.islink(link):
+        # Directory left by the old extract-in-place unzip
+        shutil.rmtree(link)
+    tmp = _temp_name(link, 'tmp')
+    if os.path.lexists(tmp):
+        os.remove(tmp)
+    os.symlink(target, tmp)
+    os.replace(tmp, link)
+    return link
+
+
+def evict(budget=None, keep=None):
+    """
+    Remove least recently used artifacts until the cache fits in `budget` bytes,
+    skipping `keep` and entries a user's dpo_model link points to. Returns bytes freed.
+    """
+    if budget is None:
+        budget = settings.MODEL_ARTIFACT_CACHE_BYTES
+    root = cache_root()
+    protected = _linked_targets()
+    if keep is not None:
+        protected.add(os.path.realpath(keep))
+    entries = []
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        if not os.path.isdir(path) or os.path.islink(path):
+            continue
+        marker = os.path.join(path, COMPLETE_MARKER)
+        last_used = os.path.getmtime(marker if os.path.exists(marker) else path)
+        entries.append((last_used, path, _disk_usage(path)))
+    total = sum(size for _, _, size in entries)
+    freed = 0
+    for _, path, size in sorted(entries):
+        if total <= budget:
+            break
+        if os.path.realpath(path) in protected:
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+        freed += size
+        logger.info("Model artifact evicted", extra={"path": path, "size": size})
+    return freed
+
+
+def _linked_targets():
+    """Resolved targets of every agent_dump/<username>/dpo_model link."""
+    targets = set()
+    try:
+        names = os.listdir(USER_DUMP_ROOT)
+    except FileNotFoundError:
+        return targets
+    for name in names:
+        link = os.path.join(USER_DUMP_ROOT, name, 'dpo_model')
+        if os.path.islink(link):
+            targets.add(os.path.realpath(link))
+    return targets
+
+
+def _content_key(model_file):
+    if not model_file.sha256:
+        # Files stored before hashes were recorded: hash once and remember it
+        model_file.sha256 = file_sha256(model_file)
+        model_file.save(update_fields=['sha256'])
+    return model_file.sha256
+
+
+def _member_path(target, name):
+    path = os.path.realpath(os.path.join(target, name))
+    if os.path.commonpath([path, os.path.realpath(target)]) != os.path.realpath(target):
+        raise ValueError(f'Unsafe path in model zip: {name}')
+    return path
+
+
+def _extract_member(archive, info, target):
+    path = _member_path(target, info.filename)
+    if info.is_dir():
+        os.makedirs(path, exist_ok=True)
+        return path
+    if os.path.exists(path) and os.path.getsize(path) == info.file_size:
+        return path
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Write to a temp name and rename, so readers never see a half-written member
+    tmp = _temp_name(path, 'part')
+    with archive.open(info) as src, open(tmp, 'wb') as dst:
+        shutil.copyfileobj(src, dst, _COPY_BUFFER)
+    os.replace(tmp, path)
+    return path
+
+
+def _temp_name(path, suffix):
+    # Unique per thread: two requests in one process may extract or link the same model
+    return f'{path}.{os.getpid()}.{threading.get_ident()}.{suffix}'
+
+
+def _touch(path):
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        pass
+
+
+def _disk_usage(path):
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, filename))
+            except OSError:
+                pass
+    return total
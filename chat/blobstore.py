@@ -0,0 +1,353 @@
+"""
+Chunked, content-addressed storage for large per-user artifacts (DPO model zips).
+
+A file is split into fixed-size chunks stored once per SHA-256 in BlobChunk and
+referenced, in order, from UserModelFileChunk. Reads go through BlobReader, a
+seekable file object that fetches one chunk at a time, so uploads, downloads,
+byte ranges and zip extraction never hold the whole artifact in memory.
+
+Large files can also be uploaded through a resumable session (ModelUpload):
+the client declares the SHA-256 of every chunk (and optionally of the whole
+file), is told which chunks the server doesn't already hold (from any earlier
+version or any user), PUTs only those, then commits. Committing links the
+chunks into a UserModelFile and records the whole-file SHA-256, the same digest
+write_model_file stores, checked against the declared one if given.
+"""
+
+import hashlib
+import io
+import re
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.http import FileResponse
+from django.utils import timezone
+
+from chat.models import BlobChunk, ModelUpload, ModelUploadChunk, UserModelFile, UserModelFileChunk
+
+
+CHUNK_SIZE = 4 * 1024 * 1024
+MIN_UPLOAD_CHUNK_SIZE = 256 * 1024
+MAX_UPLOAD_CHUNK_SIZE = 64 * 1024 * 1024
+UPLOAD_EXPIRY = timedelta(days=7)
+_SHA256_RE = re.compile(r'^[0-9a-f]{64}$')
+
+
+class UploadError(ValueError):
+    """Invalid upload request; the message is safe to return to the client."""
+
+
+def _rechunk(chunks, size):
+    """Regroup arbitrary byte chunks (e.g. from UploadedFile.chunks()) into `size`-byte pieces."""
+    buf = bytearray()
+    for chunk in chunks:
+        buf += chunk
+        while len(buf) >= size:
+            yield bytes(buf[:size])
+            del buf[:size]
+    if buf:
+        yield bytes(buf)
+
+
+def store_chunk(data):
+    """
+    Store one chunk (deduplicated by content) and return its SHA-256 hex digest.
+    The chunk row stays locked until the caller's transaction ends, so
+    delete_orphan_chunks can't remove it before the caller's references are
+    committed.
+    """
+    digest = hashlib.sha256(data).hexdigest()
+    locked = BlobChunk.objects.select_for_update().filter(pk=digest)
+    with transaction.atomic():
+        if not locked.exists():
+            BlobChunk.objects.bulk_create([BlobChunk(sha256=digest, size=len(data), data=data)], ignore_conflicts=True)
+            # Inserted concurrently by someone else (ignored conflict): lock theirs
+            locked.exists()
+    return digest
+
+
+@transaction.atomic
+def write_model_file(user, filename, chunks, chunk_size=CHUNK_SIZE):
+    """
+    Create a UserModelFile from an iterable of byte chunks, replacing any previous
+    file with the same name for the user. Returns the new UserModelFile.
+    """
+    whole = hashlib.sha256()
+    model_file = UserModelFile.objects.create(user=user, filename=filename, size=0)
+    refs = []
+    offset = 0
+    for index, data in enumerate(_rechunk(chunks, chunk_size)):
+        whole.update(data)
+        refs.append(UserModelFileChunk(model_file=model_file, index=index, offset=offset, size=len(data), chunk_id=store_chunk(data)))
+        offset += len(data)
+    UserModelFileChunk.objects.bulk_create(refs)
+    model_file.size = offset
+    model_file.sha256 = whole.hexdigest()
+    model_file.save(update_fields=['size', 'sha256'])
+    replace_model_file(model_file)
+    return model_file
+
+
+def replace_model_file(model_file):
+    """Delete older files with the same (user, filename) and drop their chunks that nobody references any more."""
+    older = UserModelFile.objects.filter(user=model_file.user_id, filename=model_file.filename).exclude(pk=model_file.pk)
+    candidates = set(UserModelFileChunk.objects.filter(model_file__in=older).values_list('chunk_id', flat=True))
+    older.delete()
+    delete_orphan_chunks(candidates)
+
+
+def delete_orphan_chunks(candidates=None):
+    """
+    Delete chunks not used by any file or pending upload session, among the
+    `candidates` digests (chunks that just lost a reference), or among all
+    chunks if None (a full sweep over BlobChunk; maintenance only).
+    """
+    chunks = BlobChunk.objects.all()
+    if candidates is not None:
+        if not candidates:
+            return 0
+        chunks = chunks.filter(pk__in=list(candidates))
+    referenced = UserModelFileChunk.objects.filter(chunk=OuterRef('pk'))
+    pending = ModelUploadChunk.objects.filter(sha256=OuterRef('pk'), upload__status='open')
+    with transaction.atomic():
+        # Chunks locked by a writer (store_chunk) are about to be referenced: skip them.
+        # References are checked after taking the locks, in a new statement that sees
+        # every writer that has committed meanwhile.
+        unlocked = list(chunks.select_for_update(skip_locked=True).values_list('pk', flat=True))
+        if not unlocked:
+            return 0
+        return BlobChunk.objects.filter(pk__in=unlocked).filter(~Exists(referenced), ~Exists(pending)).delete()[0]
+
+
+# --- Resumable uploads ---
+
+def create_upload(user, filename, size, chunk_size, chunk_hashes, sha256=None):
+    """Open an upload session after validating the declared layout (and whole-file sha256, if given)."""
+    if not isinstance(size, int) or size < 0:
+        raise UploadError('size must be a non-negative integer.')
+    if not isinstance(chunk_size, int) or not MIN_UPLOAD_CHUNK_SIZE <= chunk_size <= MAX_UPLOAD_CHUNK_SIZE:
+        raise UploadError(f'chunk_size must be between {MIN_UPLOAD_CHUNK_SIZE} and {MAX_UPLOAD_CHUNK_SIZE} bytes.')
+    expected = -(-size // chunk_size)
+    if not isinstance(chunk_hashes, list) or len(chunk_hashes) != expected:
+        raise UploadError(f'chunks must list {expected} sha256 hashes for this size and chunk_size.')
+    hashes = [str(h).lower() for h in chunk_hashes]
+    if not all(_SHA256_RE.match(h) for h in hashes):
+        raise UploadError('chunks must be hex-encoded sha256 digests.')
+    if sha256 is not None:
+        sha256 = str(sha256).lower()
+        if not _SHA256_RE.match(sha256):
+            raise UploadError('sha256 must be a hex-encoded sha256 digest.')
+    expire_uploads()
+    with transaction.atomic():
+        upload = ModelUpload.objects.create(user=user, filename=filename, size=size, chunk_size=chunk_size, sha256=sha256)
+        ModelUploadChunk.objects.bulk_create(
+            ModelUploadChunk(upload=upload, index=i, sha256=h, size=min(chunk_size, size - i * chunk_size))
+            for i, h in enumerate(hashes)
+        )
+    return upload
+
+
+def missing_chunks(upload):
+    """Indexes of declared chunks whose content the server doesn't hold yet."""
+    stored = BlobChunk.objects.filter(pk=OuterRef('sha256'))
+    return list(upload.chunks.filter(~Exists(stored)).order_by('index').values_list('index', flat=True))
+
+
+def receive_chunk(upload, index, stream, read_size=1024 * 1024):
+    """Read one chunk from a request stream, verify its size and hash, and store it."""
+    declared = upload.chunks.filter(index=index).first()
+    if declared is None:
+        raise UploadError(f'No chunk {index} in this upload.')
+    hasher = hashlib.sha256()
+    buf = bytearray()
+    while len(buf) <= declared.size:
+        piece = stream.read(read_size)
+        if not piece:
+            break
+        buf += piece
+        hasher.update(piece)
+    if len(buf) != declared.size:
+        raise UploadError(f'Chunk {index} must be {declared.size} bytes.')
+    if hasher.hexdigest() != declared.sha256:
+        raise UploadError(f'Chunk {index} does not match its declared sha256.')
+    store_chunk(bytes(buf))
+    return declared
+
+
+def file_sha256(model_file):
+    """SHA-256 hex digest of a stored file's content, read one chunk at a time."""
+    whole = hashlib.sha256()
+    with open_model_file(model_file) as reader:
+        for block in iter(lambda: reader.read(CHUNK_SIZE), b''):
+            whole.update(block)
+    return whole.hexdigest()
+
+
+@transaction.atomic
+def commit_upload(upload):
+    """
+    Assemble a UserModelFile from a fully received upload, replacing the previous
+    version. Committing an upload that is already committed returns its file.
+    Raises UploadError if the assembled file doesn't match the declared sha256.
+    """
+    # Concurrent commits of the same upload wait here, then see it committed
+    upload = ModelUpload.objects.select_for_update().get(pk=upload.pk)
+    if upload.status == 'committed':
+        if upload.model_file_id is None:
+            raise UploadError('Upload already committed.')
+        return upload.model_file
+    missing = missing_chunks(upload)
+    if missing:
+        raise UploadError(f'Missing chunks: {missing}')
+    chunks = list(upload.chunks.order_by('index'))
+    model_file = UserModelFile.objects.create(user=upload.user, filename=upload.filename, size=upload.size)
+    UserModelFileChunk.objects.bulk_create(
+        UserModelFileChunk(model_file=model_file, index=c.index, offset=c.index * upload.chunk_size, size=c.size, chunk_id=c.sha256)
+        for c in chunks
+    )
+    # Download ETag and artifact cache key: the same whole-file digest write_model_file records
+    model_file.sha256 = file_sha256(model_file)
+    if upload.sha256 and model_file.sha256 != upload.sha256:
+        raise UploadError('The assembled file does not match the declared sha256.')
+    model_file.save(update_fields=['sha256'])
+    upload.status = 'committed'
+    upload.model_file = model_file
+    upload.committed_at = timezone.now()
+    upload.save(update_fields=['status', 'model_file', 'committed_at'])
+    replace_model_file(model_file)
+    return model_file
+
+
+def expire_uploads(max_age=UPLOAD_EXPIRY):
+    """Drop abandoned upload sessions and the chunks only they were waiting on."""
+    expired = ModelUpload.objects.filter(status='open', created_at__lt=timezone.now() - max_age)
+    candidates = set(ModelUploadChunk.objects.filter(upload__in=expired).values_list('sha256', flat=True))
+    with transaction.atomic():
+        deleted = expired.delete()[0]
+        delete_orphan_chunks(candidates)
+    return deleted
+
+
+class BlobReader(io.RawIOBase):
+    """Seekable, read-only file object over a UserModelFile's chunks."""
+
+    def __init__(self, model_file):
+        self.model_file = model_file
+        self.size = model_file.size
+        self._chunks = list(
+            model_file.chunks.order_by('index').values_list('offset', 'size', 'chunk_id')
+        )
+        self._pos = 0
+        self._cached = (None, b'')  # (chunk index, data)
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = self.size + offset
+        else:
+            raise ValueError(f'invalid whence ({whence})')
+        if pos < 0:
+            raise ValueError('negative seek position')
+        self._pos = pos
+        return pos
+
+    def readinto(self, buffer):
+        if self._pos >= self.size:
+            return 0
+        index = self._chunk_index(self._pos)
+        start, size, digest = self._chunks[index]
+        data = self._chunk_data(index, digest)
+        skip = self._pos - start
+        n = min(len(buffer), size - skip)
+        buffer[:n] = data[skip:skip + n]
+        self._pos += n
+        return n
+
+    def _chunk_index(self, pos):
+        lo, hi = 0, len(self._chunks) - 1
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if self._chunks[mid][0] <= pos:
+                lo = mid
+            else:
+                hi = mid - 1
+        return lo
+
+    def _chunk_data(self, index, digest):
+        if self._cached[0] != index:
+            data = BlobChunk.objects.filter(pk=digest).values_list('data', flat=True).get()
+            self._cached = (index, bytes(data))
+        return self._cached[1]
+
+
+def open_model_file(model_file, buffer_size=CHUNK_SIZE):
+    """Buffered, seekable reader for a stored model file (usable with zipfile, FileResponse, ...)."""
+    return io.BufferedReader(BlobReader(model_file), buffer_size=buffer_size)
+
+
+class BlobFileResponse(FileResponse):
+    # Larger blocks than FileResponse's 4 KiB default; reads come from a chunk-sized buffer anyway
+    block_size = 512 * 1024
+
+
+class RangeReader:
+    """Limit reads from a positioned file object to `length` bytes (for 206 responses)."""
+
+    def __init__(self, fileobj, length):
+        self.fileobj = fileobj
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.fileobj.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.fileobj.close()
+
+
+def parse_range(header, size):
+    """
+    Parse a single `Range: bytes=...` header against a file size.
+    Returns (start, end) inclusive, None to serve the whole file, or raises ValueError if unsatisfiable.
+    """
+    if not header or not header.startswith('bytes='):
+        return None
+    spec = header[len('bytes='):].strip()
+    if ',' in spec:
+        # Multiple ranges aren't supported; serving the full body is allowed
+        return None
+    first, sep, last = spec.partition('-')
+    if not sep:
+        return None
+    try:
+        if first == '':
+            suffix = int(last)
+            if suffix <= 0:
+                raise ValueError
+            start, end = max(size - suffix, 0), size - 1
+        else:
+            start = int(first)
+            end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size or start > end:
+        raise ValueError('unsatisfiable range')
+    return start, min(end, size - 1)
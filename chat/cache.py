@@ -0,0 +1,114 @@
+"""
+Read-through cache for per-user settings rows (UserProfile, Telegram).
+
+These rows are read on every incoming message, profile request and PIN poll,
+but change a few times a month. Lookups go through a process-local dict and,
+when SETTINGS_CACHE_ALIAS names a Django cache shared between processes (e.g.
+Redis), through that cache before the database. post_save/post_delete signals
+drop both layers, so a write in this process is visible immediately; other
+processes see it as soon as their local entry expires (SETTINGS_CACHE_LOCAL_TTL,
+a few seconds, with or without a shared cache: agent_auto_reply and the
+Telegram row are read by the process running the user's bot, which is usually
+not the one that served the change).
+
+Shared entries are stored under the row's current generation, which every
+invalidation replaces. A reader that loaded the row before a concurrent write
+therefore stores it under a generation nobody reads any more, instead of
+putting the stale row back for SETTINGS_CACHE_TTL.
+
+Callers get a copy of the cached instance and may modify and save it.
+"""
+
+import copy
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+
+from chat.models import Telegram, UserProfile
+
+# Sentinel cached for users without a row, so misses are cached too
+_MISSING = 'missing'
+
+_local = {}
+_lock = threading.Lock()
+
+
+def get_profile(user_id, max_age=None):
+    """UserProfile for a user (raises UserProfile.DoesNotExist like .get())."""
+    return _get(UserProfile, user_id, max_age)
+
+
+def get_telegram(user_id, max_age=None):
+    """Telegram credentials for a user (raises Telegram.DoesNotExist like .get())."""
+    return _get(Telegram, user_id, max_age)
+
+
+def invalidate(model, user_id):
+    key = _key(model, user_id)
+    with _lock:
+        _local.pop(key, None)
+    shared = _shared_cache()
+    if shared is not None:
+        # Readers still holding the old generation write where nobody looks
+        shared.set(_generation_key(key), uuid.uuid4().hex, None)
+
+
+def clear():
+    """Drop every process-local entry (tests, admin shell)."""
+    with _lock:
+        _local.clear()
+
+
+def _get(model, user_id, max_age):
+    key = _key(model, user_id)
+    shared = _shared_cache()
+    local_ttl = settings.SETTINGS_CACHE_LOCAL_TTL
+    if max_age is not None:
+        local_ttl = min(local_ttl, max_age)
+    now = time.monotonic()
+    with _lock:
+        entry = _local.get(key)
+    if entry is not None and now - entry[0] < local_ttl:
+        value = entry[1]
+    else:
+        value = None
+        if shared is not None:
+            # Generation read before the database, so a write in between retires what we store
+            shared_key = f'{key}:{shared.get(_generation_key(key), 0)}'
+            value = shared.get(shared_key)
+        if value is None:
+            value = model.objects.filter(user_id=user_id).first() or _MISSING
+            if shared is not None:
+                shared.set(shared_key, value, settings.SETTINGS_CACHE_TTL)
+        with _lock:
+            _local[key] = (now, value)
+    if value == _MISSING:
+        raise model.DoesNotExist(f'{model.__name__} matching query does not exist.')
+    return copy.copy(value)
+
+
+def _key(model, user_id):
+    return f'user-settings:{model._meta.label_lower}:{user_id}'
+
+
+def _generation_key(key):
+    return f'{key}:generation'
+
+
+def _shared_cache():
+    alias = settings.SETTINGS_CACHE_ALIAS
+    return caches[alias] if alias else None
+
+
+def _invalidate_instance(sender, instance, **kwargs):
+    invalidate(sender, instance.user_id)
+
+
+def connect_signals():
+    from django.db.models.signals import post_delete, post_save
+    for model in (UserProfile, Telegram):
+        post_save.connect(_invalidate_instance, sender=model, dispatch_uid=f'settings-cache-save-{model.__name__}')
+        post_delete.connect(_invalidate_instance, sender=model, dispatch_uid=f'settings-cache-delete-{model.__name__}')
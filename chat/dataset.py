@@ -0,0 +1,233 @@
+"""
+Per-user SFT dataset export/import (the /api/dataset/ payloads).
+"""
+
+import codecs
+import hashlib
+import json
+
+from django.db import transaction
+
+from chat.models import ChatMessage, Contact
+
+
+# Exported key -> ORM lookup; user and contact are resolved through joins, not per row
+EXPORT_COLUMNS = {
+    'id': 'id',
+    'user': 'user__username',
+    'contact': 'contact__name',
+    'timestamp': 'timestamp',
+    'message': 'message',
+    'platform': 'platform',
+    'emotion': 'emotion',
+    'sentiment': 'sentiment',
+    'is_toxic': 'is_toxic',
+    'telegram_chat_id': 'telegram_chat_id',
+    'telegram_message_id': 'telegram_message_id',
+    'is_important': 'is_important',
+    'is_nsfw': 'is_nsfw',
+    'user_approved_reply': 'user_approved_reply',
+    'reply_sent': 'reply_sent',
+    'score': 'score',
+    'ai_generated_message': 'ai_generated_message',
+    'reply_message': 'reply_message',
+}
+
+EXPORT_FORMATS = {
+    'json': ('application/json', 'dataset.json'),
+    'ndjson': ('application/x-ndjson', 'dataset.jsonl'),
+}
+
+EXPORT_CHUNK_SIZE = 2000
+# Coalesce encoded rows into blocks of roughly this many characters before yielding
+EXPORT_BUFFER_SIZE = 64 * 1024
+
+
+def export_rows(username, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield export dicts for a user's messages, streamed from a server-side cursor."""
+    lookups = list(EXPORT_COLUMNS.values())
+    queryset = (
+        ChatMessage.objects.filter(user__username=username)
+        .order_by('id')
+        .values_list(*lookups)
+        .iterator(chunk_size=chunk_size)
+    )
+    keys = list(EXPORT_COLUMNS)
+    for values in queryset:
+        row = dict(zip(keys, values))
+        if row['timestamp'] is not None:
+            row['timestamp'] = row['timestamp'].isoformat()
+        yield row
+
+
+def encode_ndjson(rows):
+    """One JSON object per line."""
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False) + '\n'
+
+
+def encode_json_array(rows):
+    """A single JSON array, written incrementally."""
+    yield '['
+    separator = ''
+    for row in rows:
+        yield separator + json.dumps(row, ensure_ascii=False)
+        separator = ','
+    yield ']'
+
+
+def buffered(chunks, size=EXPORT_BUFFER_SIZE):
+    """Join small chunks so the server writes fewer, larger blocks."""
+    buf = []
+    buf_len = 0
+    for chunk in chunks:
+        buf.append(chunk)
+        buf_len += len(chunk)
+        if buf_len >= size:
+            yield ''.join(buf)
+            buf = []
+            buf_len = 0
+    if buf:
+        yield ''.join(buf)
+
+
+def stream_export(username, export_format='json', chunk_size=EXPORT_CHUNK_SIZE):
+    """Return an iterator of encoded text blocks for the requested export format."""
+    rows = export_rows(username, chunk_size=chunk_size)
+    encode = encode_ndjson if export_format == 'ndjson' else encode_json_array
+    return buffered(encode(rows))
+
+
+# --- Import ---
+
+IMPORT_BATCH_SIZE = 500
+IMPORT_DEFAULT_CONTACT = 'Imported'
+IMPORT_DEFAULT_PLATFORM = 'imported'
+
+
+def iter_upload_rows(chunks):
+    """
+    Incrementally parse an uploaded dataset from byte chunks.
+
+    Accepts a JSON array of objects (the export format) or NDJSON; only the row
+    currently being decoded is held in memory, not the whole document.
+    """
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder('utf-8')()
+    buf = ''
+    array = None
+    done = False
+    chunks = iter(chunks)
+    eof = False
+    while not done:
+        try:
+            buf += text.decode(next(chunks))
+        except StopIteration:
+            buf += text.decode(b'', final=True)
+            eof = True
+        pos = 0
+        while True:
+            while pos < len(buf) and (buf[pos].isspace() or (array and buf[pos] == ',')):
+                pos += 1
+            if pos >= len(buf):
+                break
+            if array is None:
+                if buf[pos] == '\ufeff':
+                    pos += 1
+                    continue
+                array = buf[pos] == '['
+                if array:
+                    pos += 1
+                continue
+            if array and buf[pos] == ']':
+                done = True
+                break
+            try:
+                row, end = decoder.raw_decode(buf, pos)
+            except ValueError:
+                if eof:
+                    raise ValueError(f'Invalid JSON near character {pos}')
+                break
+            if not isinstance(row, dict):
+                raise ValueError('Each dataset row must be a JSON object.')
+            yield row
+            pos = end
+        buf = buf[pos:]
+        if eof:
+            if array and not done:
+                raise ValueError('Unterminated JSON array.')
+            break
+
+
+def _dedup_key(message, ai_generated_message):
+    # Same identity as the old per-row exists() check: (message, ai_generated_message)
+    raw = json.dumps([message, ai_generated_message], ensure_ascii=False)
+    return hashlib.blake2b(raw.encode('utf-8'), digest_size=16).digest()
+
+
+def import_rows(user, rows, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Insert dataset rows for a user, skipping ones whose (message, ai_generated_message)
+    already exist. Contacts are resolved once per name and rows are written with
+    bulk_create in batches; each batch queues its own embedding job, so memory
+    and job payloads stay bounded by batch_size. Returns the number of rows created.
+    """
+    from analytics.rollups import record_created
+    from chat.tasks import embed_messages
+
+    contacts = {}
+    for contact in Contact.objects.filter(user=user).order_by('id'):
+        contacts.setdefault(contact.name, contact)
+    seen = {
+        _dedup_key(message, ai)
+        for message, ai in ChatMessage.objects.filter(user=user)
+        .values_list('message', 'ai_generated_message')
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    }
+
+    def flush(batch):
+        created = ChatMessage.objects.bulk_create(batch)
+        # bulk_create sends no post_save: add the new rows to the analytics rollups here
+        record_created(created)
+        embed_messages.enqueue({'user_id': user.id, 'message_ids': [m.id for m in created]}, user=user)
+        return len(created)
+
+    added = 0
+    batch = []
+    with transaction.atomic():
+        for row in rows:
+            key = _dedup_key(row.get('message'), row.get('ai_generated_message'))
+            if key in seen:
+                continue
+            seen.add(key)
+            name = row.get('contact') or IMPORT_DEFAULT_CONTACT
+            contact = contacts.get(name)
+            if contact is None:
+                contact = contacts[name] = Contact.objects.create(
+                    user=user, name=name, platform=row.get('platform', IMPORT_DEFAULT_PLATFORM)
+                )
+            batch.append(ChatMessage(
+                user=user,
+                contact=contact,
+                timestamp=row.get('timestamp'),
+                message=row.get('message'),
+                platform=row.get('platform', IMPORT_DEFAULT_PLATFORM),
+                emotion=row.get('emotion'),
+                sentiment=row.get('sentiment'),
+                is_toxic=row.get('is_toxic', False),
+                telegram_chat_id=row.get('telegram_chat_id'),
+                telegram_message_id=row.get('telegram_message_id'),
+                is_important=row.get('is_important', False),
+                is_nsfw=row.get('is_nsfw', False),
+                user_approved_reply=row.get('user_approved_reply', False),
+                reply_sent=row.get('reply_sent', False),
+                score=row.get('score'),
+                ai_generated_message=row.get('ai_generated_message'),
+                reply_message=row.get('reply_message'),
+            ))
+            if len(batch) >= batch_size:
+                added += flush(batch)
+                batch = []
+        if batch:
+            added += flush(batch)
+    return added
@@ -0,0 +1,159 @@
+"""
+Per-user real-time events (new/updated messages and notifications).
+
+Model signals publish events with Postgres NOTIFY once the writing transaction
+commits, so events raised in any process (web, userbot threads, job workers)
+reach every web process. Each web process runs one listener thread on a
+dedicated connection and fans events out to its subscribers, i.e. the open
+/api/events/ streams of that user.
+"""
+
+import asyncio
+import json
+import logging
+import select
+import threading
+import time
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections, transaction
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'emotuna_events'
+# NOTIFY payloads must stay under 8000 bytes
+MAX_PAYLOAD = 7500
+SUBSCRIBER_QUEUE_SIZE = 1000
+
+MESSAGE_FIELDS = (
+    'id', 'contact_id', 'timestamp', 'message', 'platform', 'emotion', 'sentiment', 'is_toxic',
+    'is_important', 'is_nsfw', 'user_approved_reply', 'reply_sent', 'score',
+    'ai_generated_message', 'reply_message',
+)
+MESSAGE_TEXT_FIELDS = ('message', 'ai_generated_message', 'reply_message')
+NOTIFICATION_FIELDS = ('id', 'body', 'is_read', 'timestamp')
+
+
+def publish(user_id, event_type, data):
+    """Send an event to the user's open streams after the current transaction commits."""
+    payload = json.dumps({'user': user_id, 'type': event_type, 'data': data}, cls=DjangoJSONEncoder)
+    if len(payload.encode('utf-8')) > MAX_PAYLOAD:
+        # Too big for NOTIFY: send the ids only, the client refetches the object
+        data = {k: v for k, v in data.items() if k not in MESSAGE_TEXT_FIELDS and k != 'body'}
+        data['truncated'] = True
+        payload = json.dumps({'user': user_id, 'type': event_type, 'data': data}, cls=DjangoJSONEncoder)
+    transaction.on_commit(lambda: _notify(payload))
+
+
+def _notify(payload):
+    try:
+        with connections['default'].cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [CHANNEL, payload])
+    except Exception:
+        logger.exception("Failed to publish event")
+
+
+def message_created_or_updated(sender, instance, created, **kwargs):
+    data = {field: getattr(instance, field) for field in MESSAGE_FIELDS}
+    if sender.contact.is_cached(instance) and instance.contact is not None:
+        data['contact'] = instance.contact.name
+    publish(instance.user_id, 'message.created' if created else 'message.updated', data)
+
+
+def notification_created_or_updated(sender, instance, created, **kwargs):
+    data = {field: getattr(instance, field) for field in NOTIFICATION_FIELDS}
+    publish(instance.user_id, 'notification.created' if created else 'notification.updated', data)
+
+
+def connect_signals():
+    from django.db.models.signals import post_save
+    from chat.models import ChatMessage, Notification
+    post_save.connect(message_created_or_updated, sender=ChatMessage, dispatch_uid='events-chatmessage')
+    post_save.connect(notification_created_or_updated, sender=Notification, dispatch_uid='events-notification')
+
+
+class Subscription:
+    """An asyncio queue of events for one user, fed from the listener thread."""
+
+    def __init__(self, user_id, loop=None):
+        self.user_id = user_id
+        self.loop = loop or asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+    def deliver(self, event):
+        self.loop.call_soon_threadsafe(self._put, event)
+
+    def _put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            logger.warning("Event stream too slow, dropping event", extra={"user": self.user_id, "sample": 100})
+
+    async def get(self, timeout):
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+
+class EventListener:
+    """LISTENs on the events channel in a daemon thread and dispatches to subscriptions."""
+
+    def __init__(self):
+        self._subscriptions = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def subscribe(self, user_id):
+        subscription = Subscription(user_id)
+        with self._lock:
+            self._subscriptions.setdefault(user_id, set()).add(subscription)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='event-listener', daemon=True)
+                self._thread.start()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.user_id]
+
+    def dispatch(self, payload):
+        try:
+            event = json.loads(payload)
+        except ValueError:
+            return
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(event.get('user'), ()))
+        for subscription in subscriptions:
+            subscription.deliver(event)
+
+    def _run(self):
+        backoff = 1
+        while True:
+            try:
+                self._listen()
+            except Exception:
+                logger.exception("Event listener connection lost, reconnecting")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+
+    def _listen(self):
+        wrapper = connections['default']
+        conn = wrapper.get_new_connection(wrapper.get_connection_params())
+        try:
+            conn.autocommit = True
+            with conn.cursor() as cursor:
+                cursor.execute(f'LISTEN {CHANNEL}')
+            logger.info("Event listener started")
+            while True:
+                if select.select([conn], [], [], 30) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    self.dispatch(conn.notifies.pop(0).payload)
+        finally:
+            conn.close()
+
+
+listener = EventListener()
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.6 on 2026-10-19 16:16
+
+import django.contrib.postgres.indexes
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['user', 'timestamp', 'id'], name='chatmsg_user_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(condition=models.Q(('reply_sent', False)), fields=['user', 'user_approved_reply', 'platform'], name='chatmsg_pending_reply_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=django.contrib.postgres.indexes.HashIndex(fields=['message'], name='chatmsg_message_hash_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='contact',
+            index=models.Index(fields=['user', 'name', 'platform'], name='contact_user_name_platform_idx'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.6 on 2026-10-19 16:18
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.conf import settings
+from django.db import migrations, models
+
+
+# pg_trgm is optional: when the extension can be installed, a trigram GIN index lets
+# the fuzzy contact-name match (ILIKE '%term%') use an index; otherwise it is skipped.
+CREATE_CONTACT_TRGM_INDEX = '''
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm') THEN
+        CREATE EXTENSION IF NOT EXISTS pg_trgm;
+        CREATE INDEX IF NOT EXISTS contact_name_trgm_idx ON chat_contact USING gin (name gin_trgm_ops);
+    END IF;
+EXCEPTION WHEN insufficient_privilege THEN
+    RAISE NOTICE 'pg_trgm not installed, skipping contact_name_trgm_idx';
+END
+$$;
+'''
+
+DROP_CONTACT_TRGM_INDEX = 'DROP INDEX IF EXISTS contact_name_trgm_idx;'
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0002_query_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatmessage',
+            name='search_vector',
+            field=models.GeneratedField(db_persist=True, expression=django.contrib.postgres.search.CombinedSearchVector(django.contrib.postgres.search.SearchVector('message', config='english', weight='A'), '||', django.contrib.postgres.search.SearchVector('reply_message', config='english', weight='B'), django.contrib.postgres.search.SearchConfig('english')), output_field=django.contrib.postgres.search.SearchVectorField()),
+        ),
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='chatmsg_search_vector_idx'),
+        ),
+        migrations.RunSQL(CREATE_CONTACT_TRGM_INDEX, DROP_CONTACT_TRGM_INDEX),
+    ]
@@ -0,0 +1,81 @@
+# Generated by Django 5.2.6 on 2026-10-19 16:24
+
+import hashlib
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+CHUNK_SIZE = 4 * 1024 * 1024
+
+
+def chunk_existing_files(apps, schema_editor):
+    """Move inline UserModelFile.file blobs into content-addressed chunks, one slice at a time."""
+    UserModelFile = apps.get_model('chat', 'UserModelFile')
+    BlobChunk = apps.get_model('chat', 'BlobChunk')
+    UserModelFileChunk = apps.get_model('chat', 'UserModelFileChunk')
+    connection = schema_editor.connection
+    table = connection.ops.quote_name(UserModelFile._meta.db_table)
+    for model_file_id in UserModelFile.objects.values_list('id', flat=True):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT octet_length(file) FROM {table} WHERE id = %s', [model_file_id])
+            size = cursor.fetchone()[0] or 0
+        whole = hashlib.sha256()
+        for index, offset in enumerate(range(0, size, CHUNK_SIZE)):
+            with connection.cursor() as cursor:
+                # substring() is 1-based
+                cursor.execute(f'SELECT substring(file from %s for %s) FROM {table} WHERE id = %s', [offset + 1, CHUNK_SIZE, model_file_id])
+                data = bytes(cursor.fetchone()[0])
+            whole.update(data)
+            digest = hashlib.sha256(data).hexdigest()
+            BlobChunk.objects.get_or_create(sha256=digest, defaults={'size': len(data), 'data': data})
+            UserModelFileChunk.objects.create(model_file_id=model_file_id, index=index, offset=offset, size=len(data), chunk_id=digest)
+        UserModelFile.objects.filter(id=model_file_id).update(size=size, sha256=whole.hexdigest())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0003_message_search_vector'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BlobChunk',
+            fields=[
+                ('sha256', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('size', models.PositiveIntegerField()),
+                ('data', models.BinaryField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='usermodelfile',
+            name='sha256',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='usermodelfile',
+            name='size',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='UserModelFileChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.PositiveIntegerField()),
+                ('offset', models.BigIntegerField()),
+                ('size', models.PositiveIntegerField()),
+                ('chunk', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='chat.blobchunk')),
+                ('model_file', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='chat.usermodelfile')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('model_file', 'index'), name='modelfilechunk_file_index_uniq')],
+            },
+        ),
+        migrations.RunPython(chunk_existing_files, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='usermodelfile',
+            name='file',
+        ),
+    ]
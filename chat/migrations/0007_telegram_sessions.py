@@ -0,0 +1,46 @@
+# Generated by Django 5.2.6 on 2026-10-19 16:56
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0006_notification_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TelegramSession',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('dc_id', models.IntegerField(default=0)),
+                ('server_address', models.CharField(blank=True, max_length=255, null=True)),
+                ('port', models.IntegerField(blank=True, null=True)),
+                ('auth_key', models.BinaryField(blank=True, null=True)),
+                ('takeout_id', models.BigIntegerField(blank=True, null=True)),
+                ('update_states', models.JSONField(blank=True, default=dict)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='telegram_sessions', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TelegramSessionEntity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entity_id', models.BigIntegerField()),
+                ('access_hash', models.BigIntegerField()),
+                ('username', models.CharField(blank=True, max_length=255, null=True)),
+                ('phone', models.CharField(blank=True, max_length=32, null=True)),
+                ('name', models.TextField(blank=True, null=True)),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='entities', to='chat.telegramsession')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('session', 'entity_id'), name='tgsessionentity_session_id_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-19 16:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0007_telegram_sessions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='telegram',
+            name='userbot_enabled',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='telegram',
+            name='userbot_model',
+            field=models.CharField(default='kimi', max_length=32),
+        ),
+    ]
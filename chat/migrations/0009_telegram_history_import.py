@@ -0,0 +1,37 @@
+# Generated by Django 5.2.6 on 2026-10-19 17:03
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0008_userbot_desired_state'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TelegramHistoryImport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='running', max_length=20)),
+                ('completed_dialogs', models.JSONField(blank=True, default=list)),
+                ('dialog_id', models.BigIntegerField(blank=True, null=True)),
+                ('offset_id', models.BigIntegerField(default=0)),
+                ('dialog_fetched', models.PositiveIntegerField(default=0)),
+                ('messages_fetched', models.PositiveIntegerField(default=0)),
+                ('messages_created', models.PositiveIntegerField(default=0)),
+                ('error', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='telegram_history_imports', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(condition=models.Q(('status', 'running')), fields=('user',), name='tghistory_one_running_per_user')],
+            },
+        ),
+    ]
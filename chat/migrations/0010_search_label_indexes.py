@@ -0,0 +1,27 @@
+# Generated by Django 5.2.6 on 2026-10-19 17:24
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0009_telegram_history_import'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['emotion', 'user'], name='chatmsg_emotion_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['sentiment', 'user'], name='chatmsg_sentiment_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['platform', 'user'], name='chatmsg_platform_user_idx'),
+        ),
+    ]
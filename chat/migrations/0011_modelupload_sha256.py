@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-19 17:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0010_search_label_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='modelupload',
+            name='sha256',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.6 on 2026-10-19 17:43
+
+import django.db.models.functions.text
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0011_modelupload_sha256'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='chatmessage',
+            name='chatmsg_emotion_user_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='chatmessage',
+            name='chatmsg_sentiment_user_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='chatmessage',
+            name='chatmsg_platform_user_idx',
+        ),
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(django.db.models.functions.text.Lower('emotion'), models.F('user'), name='chatmsg_lower_emotion_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(django.db.models.functions.text.Lower('sentiment'), models.F('user'), name='chatmsg_lower_sentiment_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(django.db.models.functions.text.Lower('platform'), models.F('user'), name='chatmsg_lower_platform_idx'),
+        ),
+    ]
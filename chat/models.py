@@ -1,6 +1,12 @@
 
+import uuid
+
 from django.db import models
+from django.db.models import Q
+from django.db.models.functions import Lower
 from django.contrib.auth.models import User
+from django.contrib.postgres.indexes import GinIndex, HashIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 
 class UserProfile(models.Model):
 	user = models.OneToOneField(User, on_delete=models.CASCADE)
@@ -32,6 +38,12 @@ class Contact(models.Model):
 	telegram_user_id = models.BigIntegerField(blank=True, null=True)
 	telegram_username = models.CharField(max_length=100, blank=True, null=True)
 
+	class Meta:
+		indexes = [
+			# get_or_create lookups from the userbot handler and dataset import
+			models.Index(fields=['user', 'name', 'platform'], name='contact_user_name_platform_idx'),
+		]
+
 	def __str__(self):
 		return f"{self.name} ({self.relationship_type})"
 
@@ -55,6 +67,40 @@ class ChatMessage(models.Model):
 	score = models.IntegerField(blank=True, null=True)
 	ai_generated_message = models.TextField(blank=True, null=True)
 	reply_message = models.TextField(blank=True, null=True) 
+	# Full-text search document, maintained by Postgres (message weighted above reply)
+	search_vector = models.GeneratedField(
+		expression=SearchVector('message', weight='A', config='english') + SearchVector('reply_message', weight='B', config='english'),
+		output_field=SearchVectorField(),
+		db_persist=True,
+	)
+
+	class Meta:
+		indexes = [
+			GinIndex(fields=['search_vector'], name='chatmsg_search_vector_idx'),
+			# Message list (ordered by timestamp, keyset-paginated on (timestamp, id))
+			models.Index(fields=['user', 'timestamp', 'id'], name='chatmsg_user_ts_idx'),
+			# Userbot poller: only unsent rows are ever polled, so keep the index small
+			models.Index(
+				fields=['user', 'user_approved_reply', 'platform'],
+				condition=Q(reply_sent=False),
+				name='chatmsg_pending_reply_idx',
+			),
+			# Import dedup on full message text (hash index: no btree row-size limit)
+			HashIndex(fields=['message'], name='chatmsg_message_hash_idx'),
+			# ?search= label branches (FullTextSearchFilter, case-insensitive), so the whole OR is bitmap index scans
+			models.Index(Lower('emotion'), 'user', name='chatmsg_lower_emotion_idx'),
+			models.Index(Lower('sentiment'), 'user', name='chatmsg_lower_sentiment_idx'),
+			models.Index(Lower('platform'), 'user', name='chatmsg_lower_platform_idx'),
+		]
+
+	@classmethod
+	def from_db(cls, db, field_names, values):
+		from analytics.rollups import TRACKED_FIELDS
+		instance = super().from_db(db, field_names, values)
+		# Rollup inputs as loaded, so save handlers (analytics rollups) can compute what changed.
+		# Only those few columns: message text and search_vector would double every queryset's memory.
+		instance._loaded_values = {name: value for name, value in zip(field_names, values) if name in TRACKED_FIELDS}
+		return instance
 
 	def __str__(self):
 		return f"{self.contact.name} -> {self.user.username}: {self.message[:30]}..."
@@ -69,11 +115,82 @@ class Telegram(models.Model):
 	telegram_mobile_number = models.CharField(max_length=32)
 	telegram_pin_code = models.CharField(max_length=6, null=True, blank=True, default=None)  # optional 2FA pin
 	pin_required = models.BooleanField(default=False)
+	# Desired userbot state, so a restarted process can resume it (chat.userbots.resume_all)
+	userbot_enabled = models.BooleanField(default=False)
+	userbot_model = models.CharField(max_length=32, default='kimi')
 
 	def __str__(self):
 		return f"{self.user.username} Telegram ({self.telegram_mobile_number})"
 	
 
+# Telethon session (DC, auth key, update state) for a userbot, see agent_dump.telegram_session
+class TelegramSession(models.Model):
+	name = models.CharField(max_length=255, unique=True)
+	user = models.ForeignKey(User, on_delete=models.CASCADE, blank=True, null=True, related_name='telegram_sessions')
+	dc_id = models.IntegerField(default=0)
+	server_address = models.CharField(max_length=255, blank=True, null=True)
+	port = models.IntegerField(blank=True, null=True)
+	auth_key = models.BinaryField(blank=True, null=True)
+	takeout_id = models.BigIntegerField(blank=True, null=True)
+	# {entity_id: [pts, qts, date, seq]}, 0 being the account's own state
+	update_states = models.JSONField(default=dict, blank=True)
+	updated_at = models.DateTimeField(auto_now=True)
+
+	def __str__(self):
+		return f"{self.name} (DC {self.dc_id})"
+
+
+# Peer access hashes known to a Telethon session, so peers resolve without an API call
+class TelegramSessionEntity(models.Model):
+	session = models.ForeignKey(TelegramSession, on_delete=models.CASCADE, related_name='entities')
+	entity_id = models.BigIntegerField()
+	access_hash = models.BigIntegerField()
+	username = models.CharField(max_length=255, blank=True, null=True)
+	phone = models.CharField(max_length=32, blank=True, null=True)
+	name = models.TextField(blank=True, null=True)
+
+	class Meta:
+		constraints = [
+			models.UniqueConstraint(fields=['session', 'entity_id'], name='tgsessionentity_session_id_uniq'),
+		]
+
+	def __str__(self):
+		return f"{self.session_id}: {self.entity_id} ({self.username or self.name})"
+
+
+# Resumable import of a user's Telegram chat history, see agent_dump.history_import
+class TelegramHistoryImport(models.Model):
+	user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='telegram_history_imports')
+	status = models.CharField(
+		max_length=20,
+		choices=[
+			("running", "Running"),
+			("done", "Done"),
+			("failed", "Failed")
+		],
+		default="running"
+	)
+	# Checkpoint: dialogs finished, and how far (newest to oldest) the current one got
+	completed_dialogs = models.JSONField(default=list, blank=True)
+	dialog_id = models.BigIntegerField(blank=True, null=True)
+	offset_id = models.BigIntegerField(default=0)
+	dialog_fetched = models.PositiveIntegerField(default=0)
+	messages_fetched = models.PositiveIntegerField(default=0)
+	messages_created = models.PositiveIntegerField(default=0)
+	error = models.TextField(blank=True, null=True)
+	created_at = models.DateTimeField(auto_now_add=True)
+	updated_at = models.DateTimeField(auto_now=True)
+	finished_at = models.DateTimeField(blank=True, null=True)
+
+	class Meta:
+		constraints = [
+			models.UniqueConstraint(fields=['user'], condition=Q(status='running'), name='tghistory_one_running_per_user'),
+		]
+
+	def __str__(self):
+		return f"{self.user.username} history import {self.id} ({self.status})"
+
+
 # Notification model
 class Notification(models.Model):
 	user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notifications')
@@ -81,16 +198,94 @@ class Notification(models.Model):
 	is_read = models.BooleanField(default=False)
 	timestamp = models.DateTimeField(auto_now_add=True)
 
+	class Meta:
+		indexes = [
+			# Keyset-paginated list (newest first) and delete-before-timestamp
+			models.Index(fields=['user', 'timestamp', 'id'], name='notification_user_ts_idx'),
+			# Unread badge: count(*) over this user's unread rows only
+			models.Index(fields=['user'], condition=Q(is_read=False), name='notification_unread_idx'),
+		]
+
 	def __str__(self):
 		return f"Notification for {self.user.username}: {self.body[:30]}..."
 	
 
-# User DPO-Model file uploads
+# User DPO-Model file uploads (content stored in chunks, see chat.blobstore)
 class UserModelFile(models.Model):
 	user = models.ForeignKey(User, on_delete=models.CASCADE)
 	filename = models.CharField(max_length=255)
-	file = models.BinaryField()
+	size = models.BigIntegerField(default=0)
+	sha256 = models.CharField(max_length=64, blank=True, null=True)
 	uploaded_at = models.DateTimeField(auto_now_add=True)
 
 	def __str__(self):
 		return f"{self.user.username} - {self.filename} ({self.uploaded_at})"
+
+
+# Content-addressed chunk of an uploaded artifact, shared by every file that contains it
+class BlobChunk(models.Model):
+	sha256 = models.CharField(max_length=64, primary_key=True)
+	size = models.PositiveIntegerField()
+	data = models.BinaryField()
+	created_at = models.DateTimeField(auto_now_add=True)
+
+	def __str__(self):
+		return f"{self.sha256[:12]} ({self.size} bytes)"
+
+
+# Ordered list of chunks making up a UserModelFile
+class UserModelFileChunk(models.Model):
+	model_file = models.ForeignKey(UserModelFile, on_delete=models.CASCADE, related_name='chunks')
+	index = models.PositiveIntegerField()
+	offset = models.BigIntegerField()
+	size = models.PositiveIntegerField()
+	chunk = models.ForeignKey(BlobChunk, on_delete=models.PROTECT, related_name='+')
+
+	class Meta:
+		constraints = [
+			models.UniqueConstraint(fields=['model_file', 'index'], name='modelfilechunk_file_index_uniq'),
+		]
+
+	def __str__(self):
+		return f"{self.model_file_id}[{self.index}] -> {self.chunk_id[:12]}"
+
+
+# Resumable chunked upload session for a UserModelFile (init -> PUT chunks -> commit)
+class ModelUpload(models.Model):
+	id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+	user = models.ForeignKey(User, on_delete=models.CASCADE)
+	filename = models.CharField(max_length=255)
+	size = models.BigIntegerField()
+	chunk_size = models.PositiveIntegerField()
+	# Whole-file digest declared by the client, checked on commit
+	sha256 = models.CharField(max_length=64, blank=True, null=True)
+	status = models.CharField(
+		max_length=20,
+		choices=[
+			("open", "Open"),
+			("committed", "Committed")
+		],
+		default="open"
+	)
+	model_file = models.ForeignKey(UserModelFile, on_delete=models.SET_NULL, blank=True, null=True, related_name='+')
+	created_at = models.DateTimeField(auto_now_add=True)
+	committed_at = models.DateTimeField(blank=True, null=True)
+
+	def __str__(self):
+		return f"{self.user.username} - {self.filename} upload {self.id} ({self.status})"
+
+
+# Declared chunk of an upload session; the bytes live in BlobChunk once received
+class ModelUploadChunk(models.Model):
+	upload = models.ForeignKey(ModelUpload, on_delete=models.CASCADE, related_name='chunks')
+	index = models.PositiveIntegerField()
+	sha256 = models.CharField(max_length=64, db_index=True)
+	size = models.PositiveIntegerField()
+
+	class Meta:
+		constraints = [
+			models.UniqueConstraint(fields=['upload', 'index'], name='modeluploadchunk_upload_index_uniq'),
+		]
+
+	def __str__(self):
+		return f"{self.upload_id}[{self.index}] {self.sha256[:12]}"
@@ -0,0 +1,55 @@
+"""
+Background tasks for the chat pipeline, executed by the jobs app workers.
+
+Heavy modules (sklearn, TiDB, HF clients) are imported inside the task bodies so
+enqueueing from a web worker stays cheap.
+"""
+
+from jobs.queue import task
+
+
+@task()
+def embed_messages(user_id, message_ids):
+    """Embed a batch of a user's messages in one vectorized pass."""
+    from agent_dump.pipeline_utils import embed_messages as _embed_messages
+    _embed_messages(message_ids, user_id)
+    return {'embedded': len(message_ids)}
+
+
+@task()
+def classify_message(message_id):
+    from agent_dump.pipeline_utils import classify_new_message
+    classify_new_message(message_id)
+
+
+@task()
+def classify_messages(message_ids):
+    """Classify a batch of messages with batched inference requests (history ingestion)."""
+    from agent_dump.pipeline_utils import classify_messages as _classify_messages
+    return {'classified': _classify_messages(message_ids)}
+
+
+@task()
+def embed_message(message_id):
+    from agent_dump.pipeline_utils import embed_new_message
+    embed_new_message(message_id)
+
+
+@task()
+def classify_and_embed_message(message_id):
+    """Feedback pipeline after a reply is sent."""
+    from agent_dump.pipeline_utils import classify_new_message, embed_new_message
+    classify_new_message(message_id)
+    embed_new_message(message_id)
+
+
+@task(max_attempts=3)
+def unzip_model(user_id):
+    """Make agent_dump/<username>/dpo_model/ point at the extracted DPO model (cached by content hash)."""
+    from chat.artifacts import link_user_model
+    from chat.models import UserModelFile
+    model_file = UserModelFile.objects.select_related('user').filter(user_id=user_id, filename='dpo_model.zip').order_by('-uploaded_at').first()
+    if not model_file:
+        raise LookupError('Model zip not found in DB.')
+    extract_dir = link_user_model(model_file, model_file.user.username)
+    return {'extract_dir': extract_dir, 'sha256': model_file.sha256}
@@ -1,3 +1,979 @@
-from django.test import TestCase
+import asyncio
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+from datetime import timedelta
+from unittest import mock
+from urllib.parse import urlencode
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test import AsyncClient, TestCase, TransactionTestCase, modify_settings, override_settings
+from django.utils import timezone
+
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from chat import artifacts, blobstore, cache, events
+from chat.blobstore import MIN_UPLOAD_CHUNK_SIZE, write_model_file
+from chat.models import (
+    BlobChunk, ChatMessage, Contact, ModelUpload, Notification, Telegram, UserModelFile, UserModelFileChunk, UserProfile,
+)
+from emotuna.profiling import QueryBudgetMixin, fingerprint
+
+
+class QueryPlanTests(TestCase):
+    """
+    Check that the hot queries can be served by the indexes from 0002_query_indexes.
+    Sequential scans are disabled so the planner picks an index whenever one applies,
+    which keeps the assertions stable on a small seeded database.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [User.objects.create_user(username=f'user{i}', password='x') for i in range(4)]
+        now = timezone.now()
+        messages = []
+        for user in cls.users:
+            contacts = Contact.objects.bulk_create(
+                Contact(user=user, name=f'contact{c}', platform='Telegram') for c in range(20)
+            )
+            for n in range(2000):
+                messages.append(ChatMessage(
+                    user=user,
+                    contact=contacts[n % len(contacts)],
+                    timestamp=now - timedelta(minutes=n),
+                    message=f'message {n} from {user.username}',
+                    platform='Telegram',
+                    ai_generated_message=f'reply {n}',
+                    user_approved_reply=n % 3 == 0,
+                    # Only a small backlog of unsent replies, like a real account
+                    reply_sent=n % 50 != 0,
+                ))
+        ChatMessage.objects.bulk_create(messages, batch_size=1000)
+
+    def setUp(self):
+        if connection.vendor != 'postgresql':
+            self.skipTest('query plan checks require PostgreSQL')
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE chat_chatmessage')
+            cursor.execute('ANALYZE chat_contact')
+            cursor.execute('SET enable_seqscan = off')
+
+    def tearDown(self):
+        with connection.cursor() as cursor:
+            cursor.execute('RESET enable_seqscan')
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan, msg=plan)
+
+    def test_userbot_poller_uses_partial_pending_index(self):
+        user = self.users[0]
+        for approved in (True, False):
+            qs = ChatMessage.objects.filter(user=user, user_approved_reply=approved, reply_sent=False, platform='Telegram')
+            self.assertUsesIndex(qs, 'chatmsg_pending_reply_idx')
+
+    def test_message_list_uses_user_timestamp_index(self):
+        qs = ChatMessage.objects.filter(user=self.users[1]).order_by('timestamp', 'id')[:50]
+        self.assertUsesIndex(qs, 'chatmsg_user_ts_idx')
+
+    def test_import_dedup_uses_message_hash_index(self):
+        user = self.users[2]
+        qs = ChatMessage.objects.filter(user=user, message='message 7 from user2', ai_generated_message='reply 7')
+        self.assertUsesIndex(qs, 'chatmsg_message_hash_idx')
+
+    def test_contact_lookup_uses_composite_index(self):
+        qs = Contact.objects.filter(user=self.users[3], name='contact5', platform='Telegram')
+        self.assertUsesIndex(qs, 'contact_user_name_platform_idx')
+
+    def test_search_uses_indexes_for_every_branch(self):
+        from rest_framework.request import Request
+        from rest_framework.test import APIRequestFactory
+        from chat.api.filters import FullTextSearchFilter
+
+        request = Request(APIRequestFactory().get('/api/messages/', {'search': 'contact5'}))
+        request.user = self.users[0]
+        # Without the user filter (whose index would serve any predicate) the OR can
+        # only avoid a sequential scan if each branch is an index condition
+        qs = FullTextSearchFilter().filter_queryset(request, ChatMessage.objects.all(), view=None)
+        plan = qs.explain()
+        self.assertIn('BitmapOr', plan, msg=plan)
+        self.assertIn('chatmsg_search_vector_idx', plan, msg=plan)
+        self.assertIn('chatmsg_lower_platform_idx', plan, msg=plan)
+        self.assertNotIn('Seq Scan on chat_chatmessage', plan, msg=plan)
+
+    def test_search_matches_labels_in_any_case(self):
+        from rest_framework.request import Request
+        from rest_framework.test import APIRequestFactory
+        from chat.api.filters import FullTextSearchFilter
+
+        user = self.users[0]
+        contact = Contact.objects.filter(user=user).first()
+        stored = ChatMessage.objects.create(user=user, contact=contact, timestamp=timezone.now(), message='hi', platform='WhatsApp')
+        for term in ('whatsapp', 'WHATSAPP'):
+            request = Request(APIRequestFactory().get('/api/messages/', {'search': term}))
+            request.user = user
+            qs = FullTextSearchFilter().filter_queryset(request, ChatMessage.objects.filter(user=user), view=None)
+            self.assertEqual(list(qs.values_list('id', flat=True)), [stored.id])
+
+
+class ResumableModelUploadTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='uploader', password='x')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        size = MIN_UPLOAD_CHUNK_SIZE
+        self.data = os.urandom(2 * size + 100)
+        self.parts = [self.data[i:i + size] for i in range(0, len(self.data), size)]
+        self.hashes = [hashlib.sha256(p).hexdigest() for p in self.parts]
+
+    def start(self, **extra):
+        response = self.client.post('/api/model/uploads/', {
+            'size': len(self.data), 'chunk_size': MIN_UPLOAD_CHUNK_SIZE, 'chunks': self.hashes, **extra,
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        return response.json()
+
+    def put_chunk(self, upload_id, index, data):
+        return self.client.put(f'/api/model/uploads/{upload_id}/chunks/{index}/', data=data, content_type='application/octet-stream')
+
+    def test_resume_and_commit(self):
+        upload = self.start()
+        self.assertEqual(upload['missing'], [0, 1, 2])
+        self.assertEqual(self.put_chunk(upload['upload_id'], 0, self.parts[0]).status_code, 200)
+        # Interrupted: commit is refused and the status lists what is left
+        self.assertEqual(self.client.post(f"/api/model/uploads/{upload['upload_id']}/commit/").status_code, 409)
+        status = self.client.get(f"/api/model/uploads/{upload['upload_id']}/").json()
+        self.assertEqual(status['missing'], [1, 2])
+        for index in status['missing']:
+            self.put_chunk(upload['upload_id'], index, self.parts[index])
+        response = self.client.post(f"/api/model/uploads/{upload['upload_id']}/commit/")
+        self.assertEqual(response.status_code, 201)
+        # The whole-file digest, whatever the upload path or chunk size
+        self.assertEqual(response.json()['sha256'], hashlib.sha256(self.data).hexdigest())
+        self.assertEqual(write_model_file(User.objects.create_user(username='other'), 'dpo_model.zip', [self.data]).sha256, response.json()['sha256'])
+        model_file = UserModelFile.objects.get(user=self.user)
+        self.assertEqual(model_file.size, len(self.data))
+        with blobstore.open_model_file(model_file) as reader:
+            self.assertEqual(reader.read(), self.data)
+        # A second (e.g. concurrent, retried) commit returns the same file instead of another copy
+        self.assertEqual(blobstore.commit_upload(ModelUpload.objects.get(pk=upload['upload_id'])), model_file)
+        self.assertEqual(UserModelFile.objects.filter(user=self.user).count(), 1)
+
+    def test_commit_checks_declared_file_digest(self):
+        upload = self.start(sha256=hashlib.sha256(b'something else').hexdigest())
+        for index, part in enumerate(self.parts):
+            self.put_chunk(upload['upload_id'], index, part)
+        response = self.client.post(f"/api/model/uploads/{upload['upload_id']}/commit/")
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(UserModelFile.objects.filter(user=self.user).exists())
+        upload = self.start(sha256=hashlib.sha256(self.data).hexdigest())
+        self.assertEqual(self.client.post(f"/api/model/uploads/{upload['upload_id']}/commit/").status_code, 201)
+
+    def test_rejects_corrupt_chunk(self):
+        upload = self.start()
+        response = self.put_chunk(upload['upload_id'], 1, self.parts[0])
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(BlobChunk.objects.filter(pk=self.hashes[0]).exists())
+
+    def test_replacing_a_file_collects_only_its_own_chunks(self):
+        def digest(data):
+            return hashlib.sha256(data).hexdigest()
+        stray = blobstore.store_chunk(b'unreferenced')
+        write_model_file(self.user, 'dpo_model.zip', [b'aaaabbbb'], chunk_size=4)
+        write_model_file(self.user, 'dpo_model.zip', [b'aaaacccc'], chunk_size=4)
+        stored = set(BlobChunk.objects.values_list('sha256', flat=True))
+        self.assertEqual(stored & {digest(b'aaaa'), digest(b'bbbb'), digest(b'cccc')}, {digest(b'aaaa'), digest(b'cccc')})
+        # Not a chunk of the replaced file: left for a full sweep
+        self.assertIn(stray, stored)
+        self.assertEqual(blobstore.delete_orphan_chunks(), 1)
+
+    def test_known_chunks_are_not_requested_again(self):
+        upload = self.start()
+        for index, part in enumerate(self.parts):
+            self.put_chunk(upload['upload_id'], index, part)
+        self.client.post(f"/api/model/uploads/{upload['upload_id']}/commit/")
+        # New version differing only in the last chunk
+        self.parts[-1] = os.urandom(len(self.parts[-1]))
+        self.hashes[-1] = hashlib.sha256(self.parts[-1]).hexdigest()
+        self.data = b''.join(self.parts)
+        self.assertEqual(self.start()['missing'], [2])
+
+
+class ChunkCollectionRaceTests(TransactionTestCase):
+    # Writer and collector need separate connections and committed rows
+
+    def test_chunk_being_reused_is_not_collected(self):
+        user = User.objects.create_user(username='writer', password='x')
+        orphan = blobstore.store_chunk(b'reused')
+        stored, resume = threading.Event(), threading.Event()
+        errors = []
+
+        def writer():
+            try:
+                with transaction.atomic():
+                    model_file = UserModelFile.objects.create(user=user, filename='dpo_model.zip', size=6)
+                    digest = blobstore.store_chunk(b'reused')
+                    stored.set()
+                    resume.wait(10)
+                    UserModelFileChunk.objects.create(model_file=model_file, index=0, offset=0, size=6, chunk_id=digest)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                stored.set()
+                connection.close()
+
+        thread = threading.Thread(target=writer)
+        thread.start()
+        stored.wait(10)
+        # Still unreferenced, but the writer is about to reference it
+        self.assertEqual(blobstore.delete_orphan_chunks({orphan}), 0)
+        resume.set()
+        thread.join(10)
+        self.assertEqual(errors, [])
+        self.assertTrue(BlobChunk.objects.filter(pk=orphan).exists())
+        self.assertEqual(blobstore.delete_orphan_chunks({orphan}), 0)
+
+
+@override_settings(MODEL_ARTIFACT_CACHE_BYTES=10 ** 9)
+class ModelArtifactCacheTests(TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir, ignore_errors=True)
+        self.settings_override = override_settings(MODEL_ARTIFACT_CACHE_DIR=self.cache_dir)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        self.user = User.objects.create_user(username='artifact', password='x')
+
+    def store_zip(self, members):
+        buf = io.BytesIO()
+        with zipfile.ZipFile(buf, 'w') as archive:
+            for name, data in members.items():
+                archive.writestr(name, data)
+        return write_model_file(self.user, 'dpo_model.zip', [buf.getvalue()])
+
+    def test_extracts_once_per_content_hash(self):
+        model_file = self.store_zip({'config.json': b'{}', 'weights/model.bin': b'x' * 1000})
+        target = artifacts.ensure_extracted(model_file)
+        with open(os.path.join(target, 'weights', 'model.bin'), 'rb') as f:
+            self.assertEqual(f.read(), b'x' * 1000)
+        with mock.patch('chat.artifacts.open_model_file') as opener:
+            self.assertEqual(artifacts.ensure_extracted(model_file), target)
+            opener.assert_not_called()
+
+    def test_lru_eviction_keeps_recent_entries(self):
+        old = artifacts.ensure_extracted(self.store_zip({'m.bin': b'1' * 5000}))
+        os.utime(os.path.join(old, artifacts.COMPLETE_MARKER), (0, 0))
+        new = artifacts.ensure_extracted(self.store_zip({'m.bin': b'2' * 5000}))
+        artifacts.evict(budget=6000)
+        self.assertFalse(os.path.exists(old))
+        self.assertTrue(os.path.exists(new))
+
+    def test_eviction_skips_entries_users_link_to(self):
+        linked = artifacts.ensure_extracted(self.store_zip({'m.bin': b'1' * 5000}))
+        os.utime(os.path.join(linked, artifacts.COMPLETE_MARKER), (0, 0))
+        unlinked = artifacts.ensure_extracted(self.store_zip({'m.bin': b'2' * 5000}))
+        os.utime(os.path.join(unlinked, artifacts.COMPLETE_MARKER), (1, 1))
+        dump_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, dump_root, ignore_errors=True)
+        os.makedirs(os.path.join(dump_root, 'alice'))
+        os.symlink(linked, os.path.join(dump_root, 'alice', 'dpo_model'))
+        with mock.patch('chat.artifacts.USER_DUMP_ROOT', dump_root):
+            artifacts.evict(budget=0)
+        self.assertTrue(os.path.exists(linked))
+        self.assertFalse(os.path.exists(unlinked))
+
+    def test_eviction_finds_links_from_any_working_directory(self):
+        from chat.utils import USER_DUMP_ROOT
+
+        self.addCleanup(shutil.rmtree, os.path.join(USER_DUMP_ROOT, self.user.username), ignore_errors=True)
+        link = artifacts.link_user_model(self.store_zip({'m.bin': b'1' * 5000}), self.user.username)
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(self.cache_dir)
+        artifacts.evict(budget=0)
+        self.assertTrue(os.path.exists(os.path.join(link, 'm.bin')))
+
+
+class SettingsCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = User.objects.create_user(username='cached', password='x')
+        UserProfile.objects.create(user=self.user)
+
+    def test_profile_is_read_once_until_saved(self):
+        with self.assertNumQueries(1):
+            cache.get_profile(self.user.id)
+            profile = cache.get_profile(self.user.id)
+        profile.agent_auto_reply = True
+        profile.save()
+        with self.assertNumQueries(1):
+            self.assertTrue(cache.get_profile(self.user.id).agent_auto_reply)
+
+    def test_missing_rows_are_cached_and_raise(self):
+        with self.assertNumQueries(1):
+            for _ in range(2):
+                with self.assertRaises(Telegram.DoesNotExist):
+                    cache.get_telegram(self.user.id)
+        Telegram.objects.create(user=self.user, telegram_api_id='1', telegram_api_hash='h', telegram_mobile_number='+1')
+        self.assertEqual(cache.get_telegram(self.user.id).telegram_api_id, '1')
+
+    @override_settings(SETTINGS_CACHE_ALIAS=None, SETTINGS_CACHE_LOCAL_TTL=2)
+    def test_changes_from_other_processes_show_up_quickly_without_redis(self):
+        self.assertFalse(cache.get_profile(self.user.id).agent_auto_reply)
+        # Written by another process: no invalidation reaches this one
+        UserProfile.objects.filter(user=self.user).update(agent_auto_reply=True)
+        later = time.monotonic() + 3
+        with mock.patch('chat.cache.time.monotonic', return_value=later):
+            self.assertTrue(cache.get_profile(self.user.id).agent_auto_reply)
+
+    @override_settings(
+        CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+                'settings': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'settings-tests'}},
+        SETTINGS_CACHE_ALIAS='settings',
+    )
+    def test_reader_racing_a_write_does_not_cache_the_old_row(self):
+        from django.core.cache import caches
+        self.addCleanup(caches['settings'].clear)
+        filter_profiles = UserProfile.objects.filter
+
+        def read_then_concurrent_write(**kwargs):
+            stale = filter_profiles(**kwargs).first()
+            # Written (and invalidated) after this reader loaded the row
+            profile = UserProfile.objects.get(user=self.user)
+            profile.agent_auto_reply = True
+            profile.save()
+            return mock.Mock(first=lambda: stale)
+
+        with mock.patch.object(UserProfile.objects, 'filter', side_effect=read_then_concurrent_write):
+            self.assertFalse(cache.get_profile(self.user.id).agent_auto_reply)
+        # Another process: nothing local, shared entry only
+        cache.clear()
+        self.assertTrue(cache.get_profile(self.user.id).agent_auto_reply)
+
+    def test_callers_get_independent_copies(self):
+        cache.get_profile(self.user.id).is_onboarded = True
+        self.assertFalse(cache.get_profile(self.user.id).is_onboarded)
+
+
+class EventPublishTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='events', password='x')
+        self.contact = Contact.objects.create(user=self.user, name='Bob', platform='Telegram')
+
+    def published(self, action):
+        with mock.patch('chat.events._notify') as notify, self.captureOnCommitCallbacks(execute=True):
+            action()
+        return [json.loads(call.args[0]) for call in notify.call_args_list]
+
+    def test_message_and_notification_saves_are_published_after_commit(self):
+        def action():
+            msg = ChatMessage.objects.create(user=self.user, contact=self.contact, message='hi', timestamp=timezone.now(), platform='Telegram')
+            msg.emotion = 'joy'
+            msg.save()
+            Notification.objects.create(user=self.user, body='ping')
+        sent = self.published(action)
+        self.assertEqual([e['type'] for e in sent], ['message.created', 'message.updated', 'notification.created'])
+        self.assertEqual(sent[0]['user'], self.user.id)
+        self.assertEqual(sent[0]['data']['contact'], 'Bob')
+        self.assertEqual(sent[1]['data']['emotion'], 'joy')
+
+    def test_oversized_payloads_drop_text(self):
+        sent = self.published(lambda: ChatMessage.objects.create(
+            user=self.user, contact=self.contact, message='x' * 10000, timestamp=timezone.now(), platform='Telegram'
+        ))
+        self.assertTrue(sent[0]['data']['truncated'])
+        self.assertNotIn('message', sent[0]['data'])
+
+    def test_dispatch_only_reaches_the_users_subscriptions(self):
+        listener = events.EventListener()
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        mine, other = events.Subscription(1, loop), events.Subscription(2, loop)
+        listener._subscriptions = {1: {mine}, 2: {other}}
+        listener.dispatch(json.dumps({'user': 1, 'type': 'notification.created', 'data': {}}))
+        loop.run_until_complete(asyncio.sleep(0))
+        self.assertEqual(mine.queue.qsize(), 1)
+        self.assertEqual(other.queue.qsize(), 0)
+
+
+class BulkApproveTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='approver', password='x')
+        contact = Contact.objects.create(user=self.user, name='Bob', platform='Telegram')
+        self.messages = ChatMessage.objects.bulk_create(
+            ChatMessage(user=self.user, contact=contact, message=f'm{n}', ai_generated_message=f'draft{n}', timestamp=timezone.now(), platform='Telegram')
+            for n in range(3)
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_approves_with_optional_edits_in_one_request(self):
+        sent = self.messages[2]
+        sent.reply_sent = True
+        sent.save()
+        stranger = User.objects.create_user(username='other', password='x')
+        other = ChatMessage.objects.create(
+            user=stranger, contact=Contact.objects.create(user=stranger, name='Eve', platform='Telegram'),
+            message='x', timestamp=timezone.now(), platform='Telegram',
+        )
+        with self.assertNumQueries(4):
+            response = self.client.post('/api/messages/approve/', {
+                'messages': [{'id': self.messages[0].id, 'reply_message': 'edited'}, self.messages[1].id, sent.id, other.id],
+            }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['approved'], [self.messages[0].id, self.messages[1].id])
+        self.assertEqual([s['reason'] for s in response.json()['skipped']], ['already sent', 'not found'])
+        replies = dict(ChatMessage.objects.filter(user_approved_reply=True).values_list('id', 'reply_message'))
+        self.assertEqual(replies, {self.messages[0].id: 'edited', self.messages[1].id: 'draft1'})
+
+    def test_rejects_malformed_items(self):
+        response = self.client.post('/api/messages/approve/', {'messages': [{'id': 'x'}]}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class NotificationBulkTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='notified', password='x')
+        self.notifications = Notification.objects.bulk_create(Notification(user=self.user, body=f'n{n}') for n in range(5))
+        Notification.objects.create(user=User.objects.create_user(username='someone', password='x'), body='not mine')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_unread_count_and_mark_read(self):
+        self.assertEqual(self.client.get('/api/notifications/unread_count/').json(), {'unread': 5})
+        ids = [n.id for n in self.notifications[:2]]
+        response = self.client.post('/api/notifications/mark_read/', {'ids': ids}, format='json')
+        self.assertEqual(response.json(), {'updated': 2, 'unread': 3})
+        response = self.client.post('/api/notifications/mark_read/', {}, format='json')
+        self.assertEqual(response.json(), {'updated': 3, 'unread': 0})
+        self.assertEqual(Notification.objects.filter(is_read=False).count(), 1)
+
+    def test_delete_before(self):
+        cutoff = timezone.now()
+        Notification.objects.filter(id=self.notifications[0].id).update(timestamp=cutoff + timedelta(minutes=1))
+        response = self.client.delete('/api/notifications/?' + urlencode({'before': cutoff.isoformat()}))
+        self.assertEqual(response.json(), {'deleted': 4, 'unread': 1})
+
+    def test_list_is_cursor_paginated(self):
+        page = self.client.get('/api/notifications/', {'page_size': 3}).json()
+        self.assertEqual([n['body'] for n in page['results']], ['n4', 'n3', 'n2'])
+        page = self.client.get(page['next']).json()
+        self.assertEqual([n['body'] for n in page['results']], ['n1', 'n0'])
+        self.assertIsNone(page['next'])
+
+    def test_malformed_cursors_are_rejected(self):
+        import base64
+        from rest_framework.exceptions import NotFound
+        from rest_framework.request import Request
+        from rest_framework.test import APIRequestFactory
+        from chat.api.pagination import KeysetCursorPagination
+
+        def token(position):
+            return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+        now = timezone.now().isoformat()
+        for cursor in ('not base64!', token([1]), token('o'), token({'o': -5}), token({'o': '3'}), token({'o': 1.5}),
+                       token({'o': True}), token({'t': now, 'i': -1}), token({'t': now, 'i': 2 ** 63}),
+                       token({'t': None, 'i': 1}), token({'t': 'yesterday', 'i': 1})):
+            for ordering in ('body', 'timestamp'):
+                request = Request(APIRequestFactory().get('/api/notifications/', {'cursor': cursor, 'ordering': ordering}))
+                with self.subTest(cursor=cursor, ordering=ordering), self.assertRaises(NotFound):
+                    KeysetCursorPagination().paginate_queryset(Notification.objects.all(), request)
+        # Over the API: 404, not a 500
+        response = self.client.get('/api/notifications/', {'cursor': token({'o': -5}), 'ordering': 'body'})
+        self.assertEqual(response.status_code, 404)
+
+
+class SQLProfilingTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser(username='owner', password='x')
+        contacts = Contact.objects.bulk_create(Contact(user=cls.user, name=f'c{i}', platform='Telegram') for i in range(10))
+        now = timezone.now()
+        ChatMessage.objects.bulk_create(
+            ChatMessage(user=cls.user, contact=contacts[i % 10], message=f'hello {i}', timestamp=now - timedelta(minutes=i))
+            for i in range(60)
+        )
+
+    def test_fingerprint_ignores_parameters(self):
+        self.assertEqual(
+            fingerprint("SELECT * FROM t WHERE id = 12 AND name = 'bob'"),
+            fingerprint("SELECT * FROM t WHERE id = 7 AND name = 'o''neil'"),
+        )
+        self.assertEqual(fingerprint('SELECT 1 FROM t WHERE id IN (%s, %s, %s)'), 'SELECT ? FROM t WHERE id IN (...)')
+
+    @override_settings(SQL_PROFILING=True, SQL_PROFILING_MAX_QUERIES=1)
+    @modify_settings(MIDDLEWARE={'prepend': 'emotuna.profiling.SQLProfilingMiddleware'})
+    def test_middleware_headers_and_slow_log(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        with self.assertLogs('emotuna.profiling', 'WARNING') as logs:
+            response = client.get('/api/messages/')
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(int(response['X-DB-Queries']), 0)
+        self.assertIn('X-DB-Time-Ms', response)
+        self.assertEqual(response['X-DB-Duplicate-Queries'], '0')
+        self.assertEqual(logs.records[0].path, '/api/messages/')
+
+    def test_message_list_budget(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        with self.assertQueryBudget(3, max_duplicates=0):
+            response = client.get('/api/messages/', {'page_size': 50})
+        self.assertEqual(len(response.data['results']), 50)
+
+    def test_dataset_export_budget(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        with self.assertQueryBudget(3, max_duplicates=0):
+            response = client.get('/api/dataset/')
+            rows = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(len(rows), 60)
+        self.assertEqual(rows[0]['user'], 'owner')
+
+    def test_dataset_import_queues_one_embedding_job_per_batch(self):
+        from chat.dataset import import_rows
+        from jobs.models import Job
+
+        rows = [{'contact': 'c1', 'message': f'imported {i}', 'timestamp': timezone.now().isoformat()} for i in range(5)]
+        # One duplicate of an existing message is skipped
+        rows.append({'contact': 'c1', 'message': 'hello 0'})
+        self.assertEqual(import_rows(self.user, rows, batch_size=2), 5)
+        jobs = Job.objects.filter(task='chat.tasks.embed_messages').order_by('id')
+        self.assertEqual([len(job.payload['message_ids']) for job in jobs], [2, 2, 1])
+
+    def test_admin_changelists_do_not_query_per_row(self):
+        self.client.force_login(self.user)
+        for url in ('/admin/chat/chatmessage/', '/admin/chat/contact/'):
+            with self.subTest(url=url), self.assertQueryBudget(10, max_duplicates=1):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+
+
+class StartupImportTests(TestCase):
+    def test_web_startup_does_not_import_agent_dependencies(self):
+        # Fresh interpreter: this test process has already imported everything
+        from benchmarks.startup import probe
+        self.assertEqual(probe()['heavy'], [])
+
+
+class AsyncStreamingTests(TestCase):
+    """Under ASGI, export and download bodies must be async iterators (sync ones are buffered whole)."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='streamer', password='x')
+        contact = Contact.objects.create(user=self.user, name='bob', platform='Telegram')
+        ChatMessage.objects.bulk_create(
+            ChatMessage(user=self.user, contact=contact, message=f'm{i}', timestamp=timezone.now()) for i in range(25)
+        )
+        self.data = os.urandom(3 * MIN_UPLOAD_CHUNK_SIZE + 123)
+        write_model_file(self.user, 'dpo_model.zip', [self.data], chunk_size=MIN_UPLOAD_CHUNK_SIZE)
+        self.client = AsyncClient()
+        self.auth = {'Authorization': f'Bearer {AccessToken.for_user(self.user)}'}
+
+    async def _body(self, response):
+        self.assertTrue(response.is_async)
+        return b''.join([chunk async for chunk in response.streaming_content])
+
+    async def test_dataset_export(self):
+        response = await self.client.get('/api/dataset/', {'export_format': 'ndjson'}, headers=self.auth)
+        self.assertEqual(response.status_code, 200)
+        lines = (await self._body(response)).decode().splitlines()
+        self.assertEqual(len(lines), 25)
+        self.assertEqual(json.loads(lines[0])['contact'], 'bob')
+
+    async def test_model_download_full_and_range(self):
+        response = await self.client.get('/api/model/', {'username': 'streamer'}, headers=self.auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Length'], str(len(self.data)))
+        self.assertIn('dpo_model.zip', response['Content-Disposition'])
+        self.assertEqual(await self._body(response), self.data)
+
+        start = MIN_UPLOAD_CHUNK_SIZE - 10
+        response = await self.client.get('/api/model/', {'username': 'streamer'}, headers={**self.auth, 'Range': f'bytes={start}-{start + 99}'})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(await self._body(response), self.data[start:start + 100])
+
+
+
+class TelegramSessionTests(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='tg', password='x')
+
+    def test_round_trip_and_write_back(self):
+        from asgiref.sync import async_to_sync
+        from telethon.crypto import AuthKey
+        from telethon.tl.types import User as TLUser
+        from telethon.tl.types.updates import State
+        from agent_dump.telegram_session import DatabaseSession
+
+        session = DatabaseSession.load('userbot_tg', user=self.user)
+        session.set_dc(2, '149.154.167.51', 443)
+        session.auth_key = AuthKey(data=b'k' * 256)
+        session.process_entities([TLUser(id=42, access_hash=777, username='Bob', first_name='Bob')])
+        session.set_update_state(0, State(pts=10, qts=1, date=timezone.now(), seq=3, unread_count=0))
+        # Lookups are served from memory; nothing is written until save()
+        with self.assertQueryBudget(0):
+            self.assertEqual(session.get_input_entity('bob').access_hash, 777)
+        # One UPDATE, one upsert (plus the savepoint pair inside a TestCase)
+        with self.assertQueryBudget(4):
+            async_to_sync(session.save)()
+        with self.assertQueryBudget(0):
+            async_to_sync(session.save)()
+
+        restored = DatabaseSession.load('userbot_tg')
+        self.assertEqual((restored.dc_id, restored.server_address, restored.port), (2, '149.154.167.51', 443))
+        self.assertEqual(restored.auth_key.key, b'k' * 256)
+        self.assertEqual(restored.get_input_entity(42).access_hash, 777)
+        self.assertEqual(restored.get_update_state(0).pts, 10)
+
+        async_to_sync(restored.delete)()
+        self.assertFalse(self.user.telegram_sessions.exists())
+
+
+class UserbotResumeTests(TestCase):
+    def setUp(self):
+        from chat import userbots
+        self.userbots = userbots
+        self.addCleanup(userbots.RUNNING_USERBOTS.clear)
+        self.addCleanup(userbots.close_lock_connection)
+        self.manager = mock.Mock()
+        patcher = mock.patch('chat.userbots.manager_class', return_value=self.manager)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = User.objects.create_user(username='resume', password='x')
+        Telegram.objects.create(user=self.user, telegram_api_id='1', telegram_api_hash='h', telegram_mobile_number='+1')
+
+    def test_start_and_stop_persist_desired_state(self):
+        # Persisted before the bot thread starts (and reads its Telegram row)
+        self.manager.return_value.start.side_effect = lambda: self.assertTrue(Telegram.objects.get(user=self.user).userbot_enabled)
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.assertEqual(client.post('/api/userbot/', {'username': 'resume', 'model_choice': 'dpo'}, format='json').status_code, 201)
+        telegram = Telegram.objects.get(user=self.user)
+        self.assertEqual((telegram.userbot_enabled, telegram.userbot_model), (True, 'dpo'))
+        self.assertEqual(client.delete('/api/userbot/', {'username': 'resume'}, format='json').json(), {'status': 'stopped'})
+        self.assertFalse(Telegram.objects.get(user=self.user).userbot_enabled)
+
+    def test_resume_all_is_staggered_and_catches_up(self):
+        other = User.objects.create_user(username='idle', password='x')
+        Telegram.objects.create(user=other, telegram_api_id='1', telegram_api_hash='h', telegram_mobile_number='+2')
+        Telegram.objects.filter(user=self.user).update(userbot_enabled=True, userbot_model='dpo')
+        with mock.patch('chat.userbots.time.sleep') as sleep:
+            self.assertEqual(self.userbots.resume_all(rate=4), 1)
+            # Already running: nothing to do the second time
+            self.assertEqual(self.userbots.resume_all(rate=4), 0)
+        self.assertEqual(list(self.userbots.RUNNING_USERBOTS), ['resume'])
+        kwargs = self.manager.call_args.kwargs
+        self.assertEqual((kwargs['model_choice'], kwargs['catch_up']), ('dpo', True))
+        self.manager.return_value.start.assert_called_once()
+        self.assertTrue(0 < sleep.call_args.args[0] <= 1.5 / 4)
+
+    def test_bot_held_by_another_process_is_not_started_twice(self):
+        telegram = Telegram.objects.get(user=self.user)
+        Telegram.objects.filter(pk=telegram.pk).update(userbot_enabled=True)
+        # Another process running this bot holds its advisory lock
+        other = connection.get_new_connection(connection.get_connection_params())
+        other.autocommit = True
+        self.addCleanup(other.close)
+        with other.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_lock(%s, %s)', [self.userbots.ADVISORY_LOCK_CLASS, telegram.pk])
+        with mock.patch('chat.userbots.time.sleep'):
+            self.assertEqual(self.userbots.resume_all(rate=4), 0)
+            self.assertFalse(self.userbots.start(self.user, telegram))
+            # Released (that process stopped or exited): taken over on the next pass
+            with other.cursor() as cursor:
+                cursor.execute('SELECT pg_advisory_unlock_all()')
+            self.assertEqual(self.userbots.resume_all(rate=4), 1)
+            # Disabled through another process: stopped here on the next pass
+            Telegram.objects.filter(pk=telegram.pk).update(userbot_enabled=False)
+            self.assertEqual(self.userbots.resume_all(rate=4), 0)
+        self.assertEqual(self.userbots.RUNNING_USERBOTS, {})
+        self.manager.return_value.stop.assert_called_once()
+
+
+class UserbotCatchUpTests(TestCase):
+    def test_handles_only_missed_incoming_messages_oldest_first(self):
+        from asgiref.sync import async_to_sync
+        from types import SimpleNamespace
+        from agent_dump.userbot_manager import TelegramUserBotManager
+
+        user = User.objects.create_user(username='catchup', password='x')
+        contact = Contact.objects.create(user=user, name='bob', platform='Telegram')
+        ChatMessage.objects.create(user=user, contact=contact, message='seen', timestamp=timezone.now(), platform='Telegram', telegram_chat_id=100, telegram_message_id=5)
+        now = timezone.now()
+        history = [
+            SimpleNamespace(id=i, out=out, date=now - timedelta(minutes=10 - i), chat_id=100, raw_text=f'm{i}', get_sender=mock.AsyncMock())
+            for i, out in [(4, False), (6, False), (7, True), (8, False)]
+        ]
+
+        class Client:
+            async def iter_dialogs(self):
+                # An old pinned chat (e.g. Saved Messages) comes first and must not end the scan
+                yield SimpleNamespace(id=300, entity='me', is_user=True, unread_count=0, date=now - timedelta(days=30), pinned=True)
+                yield SimpleNamespace(id=100, entity='bob', is_user=True, unread_count=3, date=now, pinned=False)
+                yield SimpleNamespace(id=-200, entity='group', is_user=False, unread_count=9, date=now, pinned=False)
+                yield SimpleNamespace(id=400, entity='old', is_user=True, unread_count=5, date=now - timedelta(days=30), pinned=False)
+
+            async def iter_messages(self, entity, limit, min_id):
+                for message in sorted(history, key=lambda m: -m.id)[:limit]:
+                    if message.id > min_id:
+                        yield message
+
+        bot = TelegramUserBotManager(user, 1, 'h', 'userbot_catchup', catch_up=True)
+        bot.client, bot.running = Client(), True
+        with mock.patch.object(bot, '_handle_incoming', mock.AsyncMock()) as handle:
+            self.assertEqual(async_to_sync(bot._catch_up)(), 2)
+        self.assertEqual([c.args[3] for c in handle.call_args_list], [6, 8])
+
+
+class ConversationContextTests(TestCase):
+    def test_buffer_is_seeded_once_and_kept_current(self):
+        from asgiref.sync import async_to_sync
+        from types import SimpleNamespace
+        from agent_dump.userbot_manager import TelegramUserBotManager
+
+        user = User.objects.create_user(username='context', password='x')
+        UserProfile.objects.create(user=user, agent_auto_reply=True)
+        contact = Contact.objects.create(user=user, name='bob', platform='Telegram', telegram_user_id=100)
+        ChatMessage.objects.create(user=user, contact=contact, message='hi', reply_message='hey', reply_sent=True, timestamp=timezone.now() - timedelta(hours=1), platform='Telegram')
+        bot = TelegramUserBotManager(user, 1, 'h', 'userbot_context')
+        bot.client = SimpleNamespace(send_message=mock.AsyncMock())
+        histories = []
+        bot.generate = lambda message, username, history: histories.append(history) or f're: {message}'
+        sender = SimpleNamespace(id=100, username='bob')
+
+        with mock.patch('agent_dump.pipeline_utils.classify_new_message'), \
+                mock.patch.object(bot.context, 'load', wraps=bot.context.load) as load:
+            async_to_sync(bot._handle_incoming)(sender, 'how are you?', 100, 1)
+            async_to_sync(bot._handle_incoming)(sender, 'still there?', 100, 2)
+        load.assert_called_once_with(contact.id)
+        self.assertEqual(histories, [
+            [('contact', 'hi'), ('user', 'hey')],
+            [('contact', 'hi'), ('user', 'hey'), ('contact', 'how are you?'), ('user', 're: how are you?')],
+        ])
+
+    def test_ring_buffer_is_bounded_and_evicted_when_idle(self):
+        from agent_dump.conversation_context import ConversationBuffers
+
+        buffers = ConversationBuffers(None, turns=2, idle=60)
+        buffers.seed(1, [('contact', 'a')])
+        buffers.append(1, 'user', 'b')
+        buffers.append(1, 'contact', 'c')
+        # Not buffered: nothing to update
+        buffers.append(2, 'contact', 'x')
+        self.assertEqual(buffers.get(1), [('user', 'b'), ('contact', 'c')])
+        self.assertIsNone(buffers.get(2))
+        with mock.patch('agent_dump.conversation_context.time.monotonic', return_value=buffers._last_sweep + 120):
+            self.assertIsNone(buffers.get(1))
+        self.assertEqual(len(buffers), 0)
+
+
+class ReplyDeadlineTests(TestCase):
+    def test_slow_llm_times_out_without_retries(self):
+        from openai import OpenAI
+        from agent_dump import agent_workflow
+        from benchmarks.fakes import FakeOpenAIServer
+
+        with FakeOpenAIServer(latency=1) as server:
+            with mock.patch.object(agent_workflow, '_client', OpenAI(api_key='x', base_url=f'{server.url}/v1')):
+                with self.assertRaises(agent_workflow.LLMUnavailable):
+                    agent_workflow.call_kimi_api('hi', timeout=0.2)
+            self.assertEqual(server.requests, 1)
+
+    @override_settings(REPLY_FALLBACK_MIN_SIMILARITY=0.8)
+    def test_falls_back_to_a_close_past_reply_or_none(self):
+        from agent_dump import agent_workflow
+
+        unavailable = mock.patch.object(agent_workflow, 'call_kimi_api', side_effect=agent_workflow.LLMUnavailable('timeout'))
+        for similar, expected in [
+            ([(0.95, 'see you at 8?', None), (0.9, 'see you at 7?', 'yes!')], 'yes!'),
+            ([(0.5, 'what time?', 'at 7')], None),
+        ]:
+            with unavailable, mock.patch.object(agent_workflow, 'find_similar_messages', return_value=similar), \
+                    self.assertLogs('agent_dump.agent_workflow', 'WARNING'):
+                self.assertEqual(agent_workflow.agent_generate_reply('see you at 7?', 'alice'), expected)
+
+    def test_fallback_never_reuses_another_users_reply(self):
+        from agent_dump import agent_workflow
+        from benchmarks.fakes import use_sqlite_vector_store
+
+        alice = User.objects.create_user(username='alice', password='x')
+        bob = User.objects.create_user(username='bob', password='x')
+        mine = ChatMessage.objects.create(
+            user=alice, contact=Contact.objects.create(user=alice, name='c'),
+            message='what is the weather', reply_message='sunny', timestamp=timezone.now(), platform='Telegram',
+        )
+        # The only close neighbour is someone else's private reply
+        theirs = ChatMessage.objects.create(
+            user=bob, contact=Contact.objects.create(user=bob, name='c'),
+            message='see you at 7?', reply_message='yes, my place', timestamp=timezone.now(), platform='Telegram',
+        )
+        with tempfile.TemporaryDirectory() as tmp, use_sqlite_vector_store(os.path.join(tmp, 'vectors.db')):
+            agent_workflow.refresh_vectorizer_corpus()
+            db = agent_workflow.TiDBVectorDB()
+            db.create_table()
+            for msg in (mine, theirs):
+                embedding = agent_workflow.get_embedding(msg.message).astype('float32')
+                db.insert_embedding(str(msg.id), msg.user_id, msg.message, embedding, msg.reply_message)
+            db.close()
+            self.assertEqual([reply for _, _, reply in agent_workflow.find_similar_messages('see you at 7?', 'alice')], ['sunny'])
+            with mock.patch.object(agent_workflow, 'call_kimi_api', side_effect=agent_workflow.LLMUnavailable('timeout')), \
+                    self.assertLogs('agent_dump.agent_workflow', 'WARNING'):
+                self.assertIsNone(agent_workflow.agent_generate_reply('see you at 7?', 'alice'))
+            self.assertEqual(agent_workflow.find_similar_messages('see you at 7?', 'bob')[0][2], 'yes, my place')
+
+    def test_missing_reply_is_left_pending(self):
+        from asgiref.sync import async_to_sync
+        from types import SimpleNamespace
+        from agent_dump.userbot_manager import TelegramUserBotManager
+
+        user = User.objects.create_user(username='deadline', password='x')
+        UserProfile.objects.create(user=user, agent_auto_reply=True)
+        bot = TelegramUserBotManager(user, 1, 'h', 'userbot_deadline')
+        bot.client = SimpleNamespace(send_message=mock.AsyncMock())
+        bot.generate = lambda message, username, history: None
+        with mock.patch('agent_dump.pipeline_utils.classify_new_message'):
+            async_to_sync(bot._handle_incoming)(SimpleNamespace(id=100, username='bob'), 'you there?', 100, 1)
+        bot.client.send_message.assert_not_called()
+        msg = ChatMessage.objects.get(user=user)
+        self.assertEqual((msg.ai_generated_message, msg.user_approved_reply, msg.reply_sent), (None, False, False))
+
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.post('/api/messages/approve/', {'messages': [msg.id]}, format='json')
+        self.assertEqual(response.json(), {'approved': [], 'skipped': [{'id': msg.id, 'reason': 'no reply'}]})
+        response = client.patch(f'/api/messages/{msg.id}/', {'user_approved_reply': True}, format='json')
+        self.assertEqual(response.status_code, 400)
+        response = client.patch(f'/api/messages/{msg.id}/', {'user_approved_reply': True, 'reply_message': 'yes'}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+
+class TelegramHistoryImportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='history', password='x')
+        day = timezone.now() - timedelta(days=1)
+
+        def msg(id, out, text):
+            from types import SimpleNamespace
+            return SimpleNamespace(id=id, out=out, date=day + timedelta(minutes=id), raw_text=text)
+        # Chat 100, oldest first: two turns split across pages, a double reply, an unanswered tail
+        self.history = {
+            100: [msg(1, False, 'hi'), msg(2, False, 'there'), msg(3, True, 'hey'), msg(4, False, 'lunch?'),
+                  msg(5, True, 'sure'), msg(6, True, 'at 1'), msg(7, False, 'ok'), msg(8, True, 'cool'),
+                  msg(9, False, 'late'), msg(10, False, 'sorry')],
+            200: [msg(1, False, 'yo'), msg(2, True, 'yo!')],
+        }
+
+    def telegram_client(self, fail_on_call=None):
+        from types import SimpleNamespace
+        history, calls = self.history, []
+
+        class Client:
+            async def iter_dialogs(self):
+                yield SimpleNamespace(id=100, is_user=True, entity=SimpleNamespace(id=100, username='alice', bot=False))
+                yield SimpleNamespace(id=300, is_user=True, entity=SimpleNamespace(id=300, username='somebot', bot=True))
+                yield SimpleNamespace(id=-5, is_user=False, entity=SimpleNamespace(id=5, username=None))
+                yield SimpleNamespace(id=200, is_user=True, entity=SimpleNamespace(id=200, username=None, first_name='Bob'))
+
+            async def iter_messages(self, entity, limit, offset_id):
+                calls.append(offset_id)
+                if len(calls) == fail_on_call:
+                    raise ConnectionError('dropped')
+                newest_first = [m for m in reversed(history[entity.id]) if not offset_id or m.id < offset_id]
+                for message in newest_first[:limit]:
+                    yield message
+        return Client()
+
+    def run_import(self, record, client):
+        from types import SimpleNamespace
+        from asgiref.sync import async_to_sync
+        from agent_dump.history_import import HistoryImporter
+        bot = SimpleNamespace(client=client, user=self.user, running=True)
+        async_to_sync(HistoryImporter(bot, record).run)()
+
+    def test_pair_turns_holds_back_the_oldest_turn(self):
+        from agent_dump.history_import import pair_turns
+        page = self.history[100][4:8]  # 5 out, 6 out, 7 in, 8 out
+        turns, resume_id = pair_turns(page)
+        self.assertEqual([([m.id for m in t.incoming], [m.id for m in t.outgoing]) for t in turns], [([7], [8])])
+        self.assertEqual(resume_id, 7)
+        self.assertEqual(len(pair_turns(page, hold_back=False)[0]), 2)
+
+    @override_settings(TELEGRAM_HISTORY_PAGE_SIZE=4)
+    def test_resumes_from_checkpoint_without_duplicates(self):
+        from jobs.models import Job
+        from chat.models import TelegramHistoryImport
+        contact = Contact.objects.create(user=self.user, name='Bob', platform='Telegram')
+        # Already stored by the live handler
+        ChatMessage.objects.create(user=self.user, contact=contact, message='yo', timestamp=timezone.now(), telegram_chat_id=200, telegram_message_id=1)
+        record = TelegramHistoryImport.objects.create(user=self.user)
+
+        self.run_import(record, self.telegram_client(fail_on_call=3))
+        record.refresh_from_db()
+        self.assertEqual((record.status, record.dialog_id, record.offset_id, record.messages_created), ('failed', 100, 7, 2))
+
+        TelegramHistoryImport.objects.filter(pk=record.pk).update(status='running', error=None)
+        record.refresh_from_db()
+        self.run_import(record, self.telegram_client())
+        record.refresh_from_db()
+        self.assertEqual(record.status, 'done')
+        self.assertEqual(record.completed_dialogs, [100, 200])
+        self.assertEqual(record.messages_fetched, 12)
+        pairs = list(ChatMessage.objects.filter(user=self.user, telegram_chat_id=100).order_by('telegram_message_id').values_list('message', 'reply_message', 'reply_sent'))
+        self.assertEqual(pairs, [('hi\nthere', 'hey', True), ('lunch?', 'sure\nat 1', True), ('ok', 'cool', True), ('late\nsorry', None, True)])
+        self.assertEqual(ChatMessage.objects.filter(user=self.user, telegram_chat_id=200).count(), 1)
+        self.assertEqual(Job.objects.filter(task='chat.tasks.classify_messages').count(), 4)
+        self.assertEqual(Job.objects.filter(task='chat.tasks.embed_messages').count(), 4)
+
+    def test_endpoint_requires_running_userbot(self):
+        from chat.userbots import RUNNING_USERBOTS
+        self.addCleanup(RUNNING_USERBOTS.clear)
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.assertEqual(client.post('/api/userbot/history/').status_code, 409)
+        RUNNING_USERBOTS['history'] = bot = mock.Mock()
+        response = client.post('/api/userbot/history/')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(client.post('/api/userbot/history/').json()['import_id'], response.json()['import_id'])
+        bot.import_history.assert_called()
+        self.assertEqual(client.get('/api/userbot/history/').json()['status'], 'running')
+
+
+@mock.patch.dict(os.environ, {'HF_API_KEY': 'test'})
+class BatchClassificationTests(TestCase):
+    def test_one_request_per_model_per_batch(self):
+        from agent_dump import pipeline_utils
+        from analytics.models import ContactDailyStats
+        from analytics.rollups import record_created
+        user = User.objects.create_user(username='batch', password='x')
+        contact = Contact.objects.create(user=user, name='bob', platform='Telegram')
+        messages = ChatMessage.objects.bulk_create(
+            ChatMessage(user=user, contact=contact, message=f'text {i}', timestamp=timezone.now()) for i in range(5)
+        )
+        record_created(messages)
+
+        def post(url, json, **kwargs):
+            n = len(json['inputs'])
+            if 'bart' in url:
+                body = [{'labels': ['joy', 'important'], 'scores': [0.9, 0.1]}] * n
+            elif 'sentiment' in url:
+                body = [[{'label': 'positive', 'score': 0.9}]] * n
+            else:
+                body = [[{'label': 'toxic', 'score': 0.1}]] * n
+            return mock.Mock(json=mock.Mock(return_value=body), raise_for_status=mock.Mock())
+
+        with mock.patch.object(pipeline_utils.requests, 'post', side_effect=post) as requests_post:
+            self.assertEqual(pipeline_utils.classify_messages([m.id for m in messages]), 5)
+        self.assertEqual(requests_post.call_count, 3)
+        self.assertEqual(set(ChatMessage.objects.filter(user=user).values_list('emotion', 'sentiment')), {('joy', 'positive')})
+        stats = ContactDailyStats.objects.get(user=user, contact=contact)
+        self.assertEqual((stats.messages, stats.emotion_joy, stats.sentiment_positive), (5, 5, 5))
@@ -0,0 +1,207 @@
+"""
+Web-side facade for the Telegram userbots.
+
+agent_dump.userbot_manager pulls in Telethon and, through the reply pipeline,
+scikit-learn, numpy, the OpenAI client and requests. The API only needs them
+once a userbot is actually started, so they are imported here on first use
+rather than when the URLconf loads; StartupImportTests keeps it that way.
+
+Bots run in the web process and are tracked in RUNNING_USERBOTS. Whether a
+user wants their bot running is also stored on their Telegram row
+(userbot_enabled), so after a restart resume_all() starts those bots again,
+a few connects per second, and each catches up on the messages it missed.
+
+Several processes may import this (gunicorn workers, two releases during a
+rolling deploy), but a Telegram session must only be connected once. A process
+runs a bot only while it holds a Postgres advisory lock on that user's
+Telegram row, taken on a connection of its own that stays open for the life
+of the process (and releases everything if the process dies). resume_all()
+is repeated every USERBOT_RESUME_INTERVAL seconds, so bots freed by an
+exiting process are picked up, and bots disabled through another process
+are stopped here.
+"""
+
+import logging
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection, connections
+
+from chat import cache
+from chat.models import Telegram
+
+logger = logging.getLogger(__name__)
+
+# Bots running in this process: {username: TelegramUserBotManager}
+RUNNING_USERBOTS = {}
+_lock = threading.Lock()
+
+# First key of the two-int advisory locks; the second is the Telegram row id
+ADVISORY_LOCK_CLASS = 0x7562  # 'ub'
+_lock_connection = None
+# {username: telegram_id} of the advisory locks held by this process
+_locked = {}
+
+
+def manager_class():
+    from agent_dump.userbot_manager import TelegramUserBotManager
+    return TelegramUserBotManager
+
+
+def _advisory_cursor():
+    global _lock_connection
+    if _lock_connection is None or _lock_connection.closed:
+        # Not Django's per-thread connection: that one is closed after requests and jobs
+        database = connections['default']
+        _lock_connection = database.get_new_connection(database.get_connection_params())
+        _lock_connection.autocommit = True
+        _locked.clear()
+    return _lock_connection.cursor()
+
+
+def _try_lock(username, telegram_id):
+    """Take the advisory lock for a bot (call with _lock held). False if another process runs it."""
+    if _locked.get(username) == telegram_id:
+        return True
+    with _advisory_cursor() as cursor:
+        cursor.execute('SELECT pg_try_advisory_lock(%s, %s)', [ADVISORY_LOCK_CLASS, telegram_id])
+        acquired = cursor.fetchone()[0]
+    if acquired:
+        _locked[username] = telegram_id
+    return acquired
+
+
+def _unlock(username):
+    """Release a bot's advisory lock (call with _lock held)."""
+    telegram_id = _locked.pop(username, None)
+    if telegram_id is None or _lock_connection is None or _lock_connection.closed:
+        return
+    with _advisory_cursor() as cursor:
+        cursor.execute('SELECT pg_advisory_unlock(%s, %s)', [ADVISORY_LOCK_CLASS, telegram_id])
+
+
+def close_lock_connection():
+    """Drop the advisory lock connection, releasing every lock this process holds."""
+    global _lock_connection
+    with _lock:
+        if _lock_connection is not None and not _lock_connection.closed:
+            _lock_connection.close()
+        _lock_connection = None
+        _locked.clear()
+
+
+def create(user, telegram, model_choice='kimi', catch_up=False):
+    """An unstarted TelegramUserBotManager for the user's Telegram credentials."""
+    return manager_class()(
+        user=user,
+        api_id=telegram.telegram_api_id,
+        api_hash=telegram.telegram_api_hash,
+        session_name=f'userbot_{user.username}',
+        model_choice=model_choice,
+        catch_up=catch_up,
+    )
+
+
+def _set_enabled(user_id, enabled, model_choice=None):
+    fields = {'userbot_enabled': enabled}
+    if model_choice is not None:
+        fields['userbot_model'] = model_choice
+    Telegram.objects.filter(user_id=user_id).update(**fields)
+    # update() sends no post_save
+    cache.invalidate(Telegram, user_id)
+
+
+def start(user, telegram, model_choice='kimi'):
+    """Start the user's bot and remember that it should run. False if it was already running."""
+    with _lock:
+        if user.username in RUNNING_USERBOTS or not _try_lock(user.username, telegram.id):
+            return False
+        # Left enabled by a previous process: pick up what arrived in between
+        bot = create(user, telegram, model_choice=model_choice, catch_up=telegram.userbot_enabled)
+        RUNNING_USERBOTS[user.username] = bot
+    # Before the bot thread reads its Telegram row, so nothing it saves can predate it
+    _set_enabled(user.id, True, model_choice)
+    bot.start()
+    return True
+
+
+def stop(user):
+    """Stop the user's bot and remember that it should not run. False if it was not running."""
+    with _lock:
+        bot = RUNNING_USERBOTS.pop(user.username, None)
+    if bot is not None:
+        bot.stop()
+        with _lock:
+            _unlock(user.username)
+    _set_enabled(user.id, False)
+    return bot is not None
+
+
+def _stop_disabled():
+    """Stop bots in this process that were disabled through another one."""
+    with _lock:
+        running = {telegram_id: username for username, telegram_id in _locked.items() if username in RUNNING_USERBOTS}
+    if not running:
+        return
+    disabled = Telegram.objects.filter(id__in=list(running), userbot_enabled=False).values_list('id', flat=True)
+    for telegram_id in disabled:
+        username = running[telegram_id]
+        with _lock:
+            bot = RUNNING_USERBOTS.pop(username, None)
+        if bot is not None:
+            bot.stop()
+            with _lock:
+                _unlock(username)
+            logger.info("Stopped userbot disabled elsewhere", extra={"user": username})
+
+
+def resume_all(rate=None):
+    """
+    Start every enabled bot that isn't running in this or another process,
+    with catch-up. Starts are spread out to at most `rate` per second (with
+    jitter), so a restart doesn't reconnect hundreds of Telegram clients at once.
+    """
+    rate = rate or settings.USERBOT_RESUME_RATE
+    _stop_disabled()
+    pending = Telegram.objects.filter(userbot_enabled=True).select_related('user').order_by('id')
+    resumed = 0
+    for telegram in list(pending):
+        user = telegram.user
+        with _lock:
+            if user.username in RUNNING_USERBOTS or not _try_lock(user.username, telegram.id):
+                continue
+            bot = create(user, telegram, model_choice=telegram.userbot_model, catch_up=True)
+            RUNNING_USERBOTS[user.username] = bot
+        try:
+            bot.start()
+        except Exception:
+            logger.exception("Failed to resume userbot", extra={"user": user.username})
+            with _lock:
+                RUNNING_USERBOTS.pop(user.username, None)
+                _unlock(user.username)
+            continue
+        resumed += 1
+        time.sleep(random.uniform(0.5, 1.5) / rate)
+    if resumed:
+        logger.info("Resumed userbots", extra={"count": resumed})
+    return resumed
+
+
+def start_resume_thread(interval=None):
+    """Run resume_all() now and then every `interval` seconds in the background (called once when the ASGI app loads)."""
+    interval = interval or settings.USERBOT_RESUME_INTERVAL
+
+    def _run():
+        while True:
+            try:
+                resume_all()
+            except Exception:
+                logger.exception("Userbot resume failed")
+            finally:
+                connection.close()
+            time.sleep(interval)
+    thread = threading.Thread(target=_run, name='userbot-resume', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,63 @@
+import itertools
+import os
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+
+# Utility to get per-user dump path
+# Per-user working directories (agent_dump/<username>/), under BASE_DIR whatever the working directory
+USER_DUMP_ROOT = os.path.join(settings.BASE_DIR, 'agent_dump')
+
+
+def get_user_dump_path(username):
+    base = os.path.join(USER_DUMP_ROOT, str(username))
+    os.makedirs(base, exist_ok=True)
+    return base
+
+
+def is_asgi(request):
+    """True when the request is served by the ASGI handler (uvicorn), for a Django or DRF request."""
+    from django.core.handlers.asgi import ASGIRequest
+    return isinstance(getattr(request, '_request', request), ASGIRequest)
+
+
+async def iterate_in_thread(iterable, batch_size=8):
+    """
+    Consume a blocking iterator (ORM cursor, blob reads) from async code.
+    Items are pulled `batch_size` at a time on the request's sync thread, so the
+    event loop is only held while sending, not while the database is read.
+    """
+    iterator = iter(iterable)
+    next_batch = sync_to_async(lambda: list(itertools.islice(iterator, batch_size)))
+    try:
+        while True:
+            batch = await next_batch()
+            if not batch:
+                break
+            for item in batch:
+                yield item
+    finally:
+        close = getattr(iterator, 'close', None)
+        if close is not None:
+            await sync_to_async(close)()
+
+
+def streaming_body(request, iterable, batch_size=8):
+    """
+    Body for a StreamingHttpResponse. Under ASGI a sync iterator would be
+    buffered in full before sending, so it is wrapped as an async one there.
+    """
+    return iterate_in_thread(iterable, batch_size) if is_asgi(request) else iterable
+
+
+def file_blocks(fileobj, block_size):
+    """Yield a file object's contents in blocks, closing it at the end."""
+    try:
+        while True:
+            block = fileobj.read(block_size)
+            if not block:
+                break
+            yield block
+    finally:
+        fileobj.close()
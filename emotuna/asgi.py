@@ -14,3 +14,10 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'emotuna.settings')
 
 application = get_asgi_application()
+
+# Restart the userbots that were running before this process started
+from django.conf import settings
+
+if settings.USERBOT_AUTORESUME:
+    from chat import userbots
+    userbots.start_resume_thread()
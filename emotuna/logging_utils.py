@@ -0,0 +1,153 @@
+"""
+Logging helpers for emotuna.
+
+Provides a structured (JSON) formatter, a sampling filter for high-frequency
+records and a non-blocking handler that moves formatting and stream writes off
+the calling thread (important for the userbot event loops).
+"""
+
+import atexit
+import itertools
+import json
+import logging
+import logging.handlers
+import multiprocessing.util
+import os
+import queue
+import sys
+import threading
+from datetime import datetime, timezone
+
+
+# Attributes present on every LogRecord; anything else came in through `extra=`
+_RESERVED_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'sample'}
+
+
+class StructuredFormatter(logging.Formatter):
+    """Render records as one JSON object per line, including `extra=` fields (user, message_id, ...)."""
+
+    def format(self, record):
+        payload = {
+            'ts': datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS and not key.startswith('_'):
+                payload[key] = value
+        if record.exc_info:
+            payload['exc'] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Let through one in N records that were logged with `extra={'sample': N}`.
+    Records without a `sample` attribute are never dropped. Counters are kept
+    per (logger, message template) so unrelated high-frequency lines don't
+    starve each other.
+    """
+
+    def __init__(self, name=''):
+        super().__init__(name)
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        every = getattr(record, 'sample', None)
+        if not every or every <= 1:
+            return True
+        key = (record.name, record.msg)
+        with self._lock:
+            counter = self._counters.get(key)
+            if counter is None:
+                counter = self._counters[key] = itertools.count()
+            n = next(counter)
+        if n % every:
+            return False
+        record.sampled = every
+        return True
+
+
+class NonBlockingStreamHandler(logging.handlers.QueueHandler):
+    """
+    Enqueue records and let a background QueueListener format and write them,
+    so logging from an asyncio loop never blocks on stdout.
+
+    The listener thread belongs to one process. Children forked after logging
+    is configured (manage.py run_workers) inherit the handler but not the
+    thread, so the queue and listener are (re)created lazily per pid.
+    """
+
+    def __init__(self, stream=None, maxsize=10000):
+        self._maxsize = maxsize
+        self._target = logging.StreamHandler(stream or sys.stderr)
+        self._pid = None
+        self._listener = None
+        self._start_lock = threading.Lock()
+        super().__init__(queue.Queue(maxsize=maxsize))
+        self._ensure_listener()
+        if hasattr(os, 'register_at_fork'):
+            # A thread may have held the lock at fork time
+            os.register_at_fork(after_in_child=self._reset_start_lock)
+
+    def _reset_start_lock(self):
+        self._start_lock = threading.Lock()
+
+    def _ensure_listener(self):
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._start_lock:
+            if self._pid == pid:
+                return
+            # The inherited queue may hold the parent's records and lock state
+            self.queue = queue.Queue(maxsize=self._maxsize)
+            self._listener = logging.handlers.QueueListener(self.queue, self._target, respect_handler_level=False)
+            self._listener.start()
+            self._pid = pid
+            atexit.register(self._stop_listener, self._listener)
+            # multiprocessing children leave through os._exit and skip atexit
+            multiprocessing.util.Finalize(None, self._stop_listener, args=(self._listener,), exitpriority=10)
+
+    @staticmethod
+    def _stop_listener(listener):
+        # QueueListener.stop() fails when called twice
+        if listener._thread is not None:
+            listener.stop()
+
+    def close(self):
+        # Drain what this process queued before the handler goes away
+        if self._pid == os.getpid():
+            self._stop_listener(self._listener)
+        super().close()
+
+    def setFormatter(self, fmt):
+        # Formatting happens in the listener thread
+        self._target.setFormatter(fmt)
+
+    def prepare(self, record):
+        # Resolve the message now (args may be mutated later) but defer formatting
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        self._ensure_listener()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # Drop rather than block the caller
+            pass
+
+
+def parse_log_levels(spec, default='INFO'):
+    """Parse a 'module=LEVEL,other=LEVEL' string into a dictConfig `loggers` mapping."""
+    loggers = {}
+    for item in (spec or '').split(','):
+        if '=' not in item:
+            continue
+        name, level = item.split('=', 1)
+        loggers[name.strip()] = {'level': level.strip().upper() or default}
+    return loggers
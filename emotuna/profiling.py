@@ -0,0 +1,162 @@
+"""
+Opt-in SQL profiling for requests and pipeline stages.
+
+With SQL_PROFILING enabled, SQLProfilingMiddleware records the number of
+queries, total database time and repeated query shapes (N+1 patterns) of
+every request. It returns them in X-DB-* response headers and logs requests
+over SQL_PROFILING_SLOW_MS / SQL_PROFILING_MAX_QUERIES. profiled() and
+profiled_sync_to_async() do the same for a unit of work outside a request
+(userbot handler stages, jobs). When profiling is off they return the
+function unchanged.
+
+Queries are captured with connection.execute_wrapper, so only queries issued
+in the calling thread are counted. The body of a streaming response is
+produced after the middleware returns and is not included.
+
+QueryBudgetMixin adds assertQueryBudget() to test cases to keep endpoints
+within a fixed number of queries.
+"""
+
+import functools
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_LISTS = re.compile(r'\((?:\s*(?:%s|\?)\s*,)+\s*(?:%s|\?)\s*\)')
+
+
+def fingerprint(sql):
+    """Normalize a statement so calls differing only in parameters compare equal."""
+    sql = _LITERALS.sub('?', sql)
+    sql = _LISTS.sub('(...)', sql)
+    return ' '.join(sql.split())
+
+
+class QueryProfile:
+    """Execute wrapper accumulating query count, time and fingerprints."""
+
+    def __init__(self, label=None):
+        self.label = label
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.count += 1
+            self.duration += elapsed
+            self.fingerprints[fingerprint(sql)] += 1
+            self.queries.append((sql, elapsed))
+
+    @property
+    def duplicates(self):
+        """{fingerprint: count} of query shapes run more than once, most repeated first."""
+        return {sql: n for sql, n in self.fingerprints.most_common() if n > 1}
+
+    @property
+    def repeated(self):
+        """Number of queries that repeated an earlier query shape."""
+        return sum(n - 1 for n in self.fingerprints.values())
+
+    @property
+    def duration_ms(self):
+        return round(self.duration * 1000, 2)
+
+    def summary(self, top=5):
+        return {
+            'queries': self.count,
+            'db_ms': self.duration_ms,
+            'duplicates': self.repeated,
+            'top_duplicates': [{'sql': sql[:300], 'count': n} for sql, n in list(self.duplicates.items())[:top]],
+        }
+
+    def is_slow(self):
+        slow_ms = getattr(settings, 'SQL_PROFILING_SLOW_MS', 500)
+        max_queries = getattr(settings, 'SQL_PROFILING_MAX_QUERIES', 50)
+        return self.duration_ms >= slow_ms or self.count >= max_queries
+
+
+@contextmanager
+def profile_queries(label=None):
+    """Record the queries run by this thread on any database inside the block."""
+    profile = QueryProfile(label)
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(profile))
+        yield profile
+
+
+def enabled():
+    return getattr(settings, 'SQL_PROFILING', False)
+
+
+def log_if_slow(profile, **extra):
+    if profile.is_slow():
+        logger.warning("Slow database usage", extra={'stage': profile.label, **extra, **profile.summary()})
+
+
+def profiled(func, label=None):
+    """Wrap a sync callable to profile (and log, if slow) its queries when SQL_PROFILING is on."""
+    if not enabled():
+        return func
+    label = label or getattr(func, '__qualname__', repr(func))
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with profile_queries(label) as profile:
+            try:
+                return func(*args, **kwargs)
+            finally:
+                log_if_slow(profile)
+    return wrapper
+
+
+def profiled_sync_to_async(func, label=None, thread_sensitive=True):
+    """sync_to_async that profiles the wrapped call in the thread it runs on."""
+    return sync_to_async(profiled(func, label), thread_sensitive=thread_sensitive)
+
+
+class SQLProfilingMiddleware:
+    """Per-request query count, DB time and duplicate queries (installed only when SQL_PROFILING is set)."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not enabled():
+            return self.get_response(request)
+        with profile_queries(request.path) as profile:
+            response = self.get_response(request)
+        response['X-DB-Queries'] = str(profile.count)
+        response['X-DB-Time-Ms'] = str(profile.duration_ms)
+        response['X-DB-Duplicate-Queries'] = str(profile.repeated)
+        log_if_slow(profile, method=request.method, path=request.path, status=response.status_code)
+        return response
+
+
+class QueryBudgetMixin:
+    """TestCase mixin: `with self.assertQueryBudget(5): self.client.get(...)`."""
+
+    @contextmanager
+    def assertQueryBudget(self, max_queries, max_duplicates=None):
+        with profile_queries() as profile:
+            yield profile
+        details = '\n'.join(f'{n}x {sql}' for sql, n in profile.fingerprints.most_common())
+        if profile.count > max_queries:
+            self.fail(f'{profile.count} queries executed, budget is {max_queries}:\n{details}')
+        if max_duplicates is not None and profile.repeated > max_duplicates:
+            self.fail(f'{profile.repeated} repeated queries, budget is {max_duplicates}:\n{details}')
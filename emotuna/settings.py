@@ -45,8 +45,11 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'chat',
+    'jobs',
+    'analytics',
     'corsheaders',
 ]
 
@@ -74,6 +77,16 @@ MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
 ]
 
+# SQL profiling (emotuna.profiling): X-DB-* headers per request and a warning for
+# requests or pipeline stages over either threshold. Off by default; the
+# middleware is only installed when enabled, first so other middleware's queries count.
+SQL_PROFILING = os.environ.get('SQL_PROFILING', '0') == '1'
+SQL_PROFILING_SLOW_MS = int(os.environ.get('SQL_PROFILING_SLOW_MS', '500'))
+SQL_PROFILING_MAX_QUERIES = int(os.environ.get('SQL_PROFILING_MAX_QUERIES', '50'))
+
+if SQL_PROFILING:
+    MIDDLEWARE.insert(0, 'emotuna.profiling.SQLProfilingMiddleware')
+
 ROOT_URLCONF = 'emotuna.urls'
 
 TEMPLATES = [
@@ -149,6 +162,94 @@ USE_TZ = True
 STATIC_URL = 'static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
+
+# Logging
+# Structured JSON lines written from a background thread. Per-module levels can
+# be overridden with LOG_LEVELS, e.g. "agent_dump.userbot_manager=DEBUG,chat=WARNING".
+
+from emotuna.logging_utils import parse_log_levels
+
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'structured': {
+            '()': 'emotuna.logging_utils.StructuredFormatter',
+        },
+    },
+    'filters': {
+        'sampling': {
+            '()': 'emotuna.logging_utils.SamplingFilter',
+        },
+    },
+    'handlers': {
+        'console': {
+            '()': 'emotuna.logging_utils.NonBlockingStreamHandler',
+            'stream': 'ext://sys.stdout',
+            'formatter': 'structured',
+            'filters': ['sampling'],
+        },
+    },
+    'root': {
+        'handlers': ['console'],
+        'level': LOG_LEVEL,
+    },
+    'loggers': {
+        # Replace Django's default console handler so records aren't emitted twice
+        'django': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+        'agent_dump': {'level': LOG_LEVEL},
+        'chat': {'level': LOG_LEVEL},
+        'telethon': {'level': 'WARNING'},
+        **parse_log_levels(os.environ.get('LOG_LEVELS')),
+    },
+}
+
+# Background jobs
+# Run queued tasks inline instead of on `manage.py run_workers` (development only)
+JOBS_EAGER = os.environ.get('JOBS_EAGER', '0') == '1'
+
+# Extracted DPO model zips, shared across users by content hash and evicted LRU above the budget
+MODEL_ARTIFACT_CACHE_DIR = os.environ.get('MODEL_ARTIFACT_CACHE_DIR', str(BASE_DIR / 'agent_dump' / '.artifact_cache'))
+MODEL_ARTIFACT_CACHE_BYTES = int(os.environ.get('MODEL_ARTIFACT_CACHE_BYTES', str(5 * 1024 ** 3)))
+
+# Per-user settings cache (chat.cache). Set REDIS_URL to share entries between processes.
+# Process-local entries live SETTINGS_CACHE_LOCAL_TTL seconds (the delay before another process,
+# e.g. the one running a user's bot, sees a change); shared entries SETTINGS_CACHE_TTL.
+SETTINGS_CACHE_TTL = int(os.environ.get('SETTINGS_CACHE_TTL', '300'))
+SETTINGS_CACHE_LOCAL_TTL = int(os.environ.get('SETTINGS_CACHE_LOCAL_TTL', '2'))
+SETTINGS_CACHE_ALIAS = None
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+    SETTINGS_CACHE_ALIAS = 'default'
+
+# Userbots left running are started again when the ASGI app loads (chat.userbots.resume_all),
+# at most USERBOT_RESUME_RATE client connects per second
+USERBOT_AUTORESUME = os.environ.get('USERBOT_AUTORESUME', '1') == '1'
+USERBOT_RESUME_RATE = float(os.environ.get('USERBOT_RESUME_RATE', '2'))
+# Processes hand bots over through advisory locks; every this many seconds each process
+# starts enabled bots nobody holds and stops its bots that were disabled elsewhere
+USERBOT_RESUME_INTERVAL = float(os.environ.get('USERBOT_RESUME_INTERVAL', '60'))
+# Unread private messages received while a bot was down are processed on resume if younger than this
+USERBOT_CATCHUP_MAX_AGE = int(os.environ.get('USERBOT_CATCHUP_MAX_AGE', str(24 * 3600)))
+USERBOT_CATCHUP_PER_CHAT = int(os.environ.get('USERBOT_CATCHUP_PER_CHAT', '20'))
+# History import (POST /api/userbot/history/): messages fetched per page and at most per private chat
+TELEGRAM_HISTORY_PAGE_SIZE = int(os.environ.get('TELEGRAM_HISTORY_PAGE_SIZE', '500'))
+TELEGRAM_HISTORY_MAX_PER_DIALOG = int(os.environ.get('TELEGRAM_HISTORY_MAX_PER_DIALOG', '5000'))
+# Recent lines per contact kept in memory by each userbot for the reply prompt, dropped after this many idle seconds
+CONVERSATION_CONTEXT_TURNS = int(os.environ.get('CONVERSATION_CONTEXT_TURNS', '10'))
+CONVERSATION_CONTEXT_IDLE = int(os.environ.get('CONVERSATION_CONTEXT_IDLE', '1800'))
+# Seconds a reply may take (retrieval + LLM). After that the nearest past reply is reused if at least
+# this cosine-similar, otherwise the message is left for the user to answer
+LLM_REPLY_DEADLINE = float(os.environ.get('LLM_REPLY_DEADLINE', '8'))
+REPLY_FALLBACK_MIN_SIMILARITY = float(os.environ.get('REPLY_FALLBACK_MIN_SIMILARITY', '0.8'))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
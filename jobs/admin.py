@@ -0,0 +1,10 @@
+from django.contrib import admin
+from .models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+	list_display = ('id', 'task', 'status', 'attempts', 'max_attempts', 'run_at', 'locked_by', 'user', 'created_at', 'finished_at')
+	search_fields = ('task', 'user__username', 'locked_by')
+	list_filter = ('status', 'task')
+	list_select_related = ('user',)
@@ -0,0 +1,7 @@
+from django.urls import path
+from jobs.api import views
+
+urlpatterns = [
+    path('', views.JobListView.as_view(), name='job-list'),
+    path('<int:pk>/', views.JobStatusView.as_view(), name='job-status'),
+]
@@ -0,0 +1,42 @@
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from jobs.models import Job
+
+
+def job_to_dict(job):
+    return {
+        'id': job.id,
+        'task': job.task,
+        'status': job.status,
+        'attempts': job.attempts,
+        'max_attempts': job.max_attempts,
+        'run_at': job.run_at,
+        'created_at': job.created_at,
+        'finished_at': job.finished_at,
+        'result': job.result,
+        'last_error': job.last_error.strip().splitlines()[-1] if job.last_error else None,
+    }
+
+
+# Job status for the authenticated user's background work
+class JobStatusView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk, format=None):
+        job = Job.objects.filter(pk=pk, user=request.user).first()
+        if not job:
+            return Response({'error': 'Job not found.'}, status=404)
+        return Response(job_to_dict(job), status=200)
+
+
+class JobListView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, format=None):
+        jobs = Job.objects.filter(user=request.user).order_by('-id')
+        status = request.query_params.get('status')
+        if status:
+            jobs = jobs.filter(status=status)
+        return Response([job_to_dict(job) for job in jobs[:100]], status=200)
@@ -0,0 +1,42 @@
+import multiprocessing
+import signal
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from jobs.worker import POLL_INTERVAL, run_worker
+
+
+class Command(BaseCommand):
+    help = 'Run background job workers (a pool of processes polling the jobs table).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=2, help='Number of worker processes.')
+        parser.add_argument('--task', action='append', dest='tasks', help='Only run these task names (repeatable).')
+        parser.add_argument('--poll-interval', type=float, default=POLL_INTERVAL, help='Seconds to sleep when the queue is empty.')
+        parser.add_argument('--burst', action='store_true', help='Exit once the queue is empty.')
+
+    def handle(self, *args, **options):
+        processes = max(1, options['processes'])
+        kwargs = {'tasks': options['tasks'], 'poll_interval': options['poll_interval'], 'burst': options['burst']}
+        if processes == 1:
+            run_worker(0, **kwargs)
+            return
+        # Don't let children inherit the parent's DB connections
+        connections.close_all()
+        pool = [
+            multiprocessing.Process(target=run_worker, args=(i,), kwargs=kwargs, name=f'job-worker-{i}')
+            for i in range(processes)
+        ]
+        for proc in pool:
+            proc.start()
+        self.stdout.write(f'Started {processes} job workers')
+
+        def _forward(signum, frame):
+            for proc in pool:
+                if proc.is_alive():
+                    proc.terminate()
+        signal.signal(signal.SIGTERM, _forward)
+        signal.signal(signal.SIGINT, _forward)
+        for proc in pool:
+            proc.join()
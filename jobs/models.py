@@ -0,0 +1,47 @@
+
+from django.db import models
+from django.db.models import Q
+from django.contrib.auth.models import User
+from django.utils import timezone
+
+
+# Background job, claimed by `manage.py run_workers` with SELECT ... FOR UPDATE SKIP LOCKED
+class Job(models.Model):
+	QUEUED = 'queued'
+	RUNNING = 'running'
+	SUCCEEDED = 'succeeded'
+	FAILED = 'failed'
+
+	user = models.ForeignKey(User, on_delete=models.CASCADE, blank=True, null=True, related_name='jobs')
+	task = models.CharField(max_length=200)  # dotted path of a @task function
+	payload = models.JSONField(default=dict, blank=True)
+	status = models.CharField(
+		max_length=20,
+		choices=[
+			(QUEUED, "Queued"),
+			(RUNNING, "Running"),
+			(SUCCEEDED, "Succeeded"),
+			(FAILED, "Failed")
+		],
+		default=QUEUED
+	)
+	attempts = models.PositiveIntegerField(default=0)
+	max_attempts = models.PositiveIntegerField(default=5)
+	run_at = models.DateTimeField(default=timezone.now)  # not claimed before this (retry backoff)
+	locked_at = models.DateTimeField(blank=True, null=True)  # last heartbeat of the running worker
+	locked_by = models.CharField(max_length=100, blank=True, null=True)
+	result = models.JSONField(blank=True, null=True)
+	last_error = models.TextField(blank=True, null=True)
+	created_at = models.DateTimeField(auto_now_add=True)
+	finished_at = models.DateTimeField(blank=True, null=True)
+
+	class Meta:
+		indexes = [
+			# Claim query: only queued rows, oldest due first
+			models.Index(fields=['run_at', 'id'], condition=Q(status='queued'), name='job_queued_run_at_idx'),
+			# Stale heartbeat reaper
+			models.Index(fields=['locked_at'], condition=Q(status='running'), name='job_running_locked_at_idx'),
+		]
+
+	def __str__(self):
+		return f"Job {self.id} {self.task} ({self.status})"
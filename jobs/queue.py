@@ -0,0 +1,178 @@
+"""
+Postgres-backed job queue.
+
+Tasks are plain functions decorated with @task; they are enqueued by dotted
+path with a JSON payload and executed by `manage.py run_workers`. Workers claim
+rows with SELECT ... FOR UPDATE SKIP LOCKED, so any number of processes can
+poll the same table without handing out a job twice. While a job runs its
+worker refreshes locked_at every HEARTBEAT_SECONDS; a running job whose
+heartbeat stops is handed out again by requeue_stale.
+"""
+
+import logging
+import random
+import threading
+import traceback
+from contextlib import contextmanager
+from datetime import timedelta
+from importlib import import_module
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from jobs.models import Job
+
+logger = logging.getLogger(__name__)
+
+_TASKS = {}
+
+DEFAULT_MAX_ATTEMPTS = 5
+RETRY_BASE_SECONDS = 10
+RETRY_MAX_SECONDS = 3600
+HEARTBEAT_SECONDS = 30
+# A running job without a heartbeat for this long is assumed to belong to a dead worker
+STALE_LOCK_SECONDS = 10 * HEARTBEAT_SECONDS
+
+
+def task(name=None, max_attempts=DEFAULT_MAX_ATTEMPTS):
+    """Register a function as a job task. Adds `func.enqueue(payload=None, user=None)`."""
+    def decorator(func):
+        task_name = name or f'{func.__module__}.{func.__name__}'
+        func.task_name = task_name
+        func.max_attempts = max_attempts
+        func.enqueue = lambda payload=None, user=None, **kwargs: enqueue(
+            task_name, payload, user=user, max_attempts=max_attempts, **kwargs
+        )
+        _TASKS[task_name] = func
+        return func
+    return decorator
+
+
+def get_task(name):
+    """Resolve a task name, importing its module on first use."""
+    if name not in _TASKS:
+        module_path = name.rsplit('.', 1)[0]
+        import_module(module_path)
+    try:
+        return _TASKS[name]
+    except KeyError:
+        raise LookupError(f'Unknown task: {name}')
+
+
+def enqueue(task_name, payload=None, user=None, max_attempts=DEFAULT_MAX_ATTEMPTS, delay=None):
+    """
+    Queue a task and return the Job. With settings.JOBS_EAGER the task runs
+    immediately in the calling process (for development without a worker).
+    """
+    job = Job.objects.create(
+        user=user,
+        task=task_name,
+        payload=payload or {},
+        max_attempts=max_attempts,
+        run_at=timezone.now() + (delay or timedelta(0)),
+    )
+    if getattr(settings, 'JOBS_EAGER', False):
+        job.status = Job.RUNNING
+        job.attempts = 1
+        job.locked_at = timezone.now()
+        job.save(update_fields=['status', 'attempts', 'locked_at'])
+        run_job(job)
+    else:
+        logger.debug("Job queued", extra={"job_id": job.id, "task": task_name})
+    return job
+
+
+def claim(worker_id, tasks=None):
+    """Atomically take the oldest due job, mark it running and return it (or None)."""
+    with transaction.atomic():
+        queryset = Job.objects.select_for_update(skip_locked=True).filter(
+            status=Job.QUEUED, run_at__lte=timezone.now()
+        )
+        if tasks:
+            queryset = queryset.filter(task__in=tasks)
+        job = queryset.order_by('run_at', 'id').first()
+        if job is None:
+            return None
+        job.status = Job.RUNNING
+        job.attempts += 1
+        job.locked_at = timezone.now()
+        job.locked_by = worker_id
+        job.save(update_fields=['status', 'attempts', 'locked_at', 'locked_by'])
+    return job
+
+
+@contextmanager
+def heartbeat(job, interval=HEARTBEAT_SECONDS):
+    """Refresh the running job's locked_at every `interval` seconds from a background thread."""
+    done = threading.Event()
+
+    def beat():
+        try:
+            while not done.wait(interval):
+                Job.objects.filter(pk=job.pk, status=Job.RUNNING, locked_by=job.locked_by).update(locked_at=timezone.now())
+        except Exception:
+            logger.exception("Job heartbeat failed", extra={"job_id": job.id, "task": job.task})
+        finally:
+            connection.close()
+
+    thread = threading.Thread(target=beat, name=f'job-heartbeat-{job.id}', daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        done.set()
+        thread.join()
+
+
+def run_job(job):
+    """Execute a claimed job and record success, a retry, or final failure."""
+    try:
+        func = get_task(job.task)
+        result = func(**job.payload)
+    except Exception as e:
+        fail(job, e)
+        return False
+    job.status = Job.SUCCEEDED
+    job.result = result if _is_json(result) else None
+    job.finished_at = timezone.now()
+    job.last_error = None
+    job.save(update_fields=['status', 'result', 'finished_at', 'last_error'])
+    logger.info("Job succeeded", extra={"job_id": job.id, "task": job.task, "attempts": job.attempts})
+    return True
+
+
+def fail(job, exc):
+    job.last_error = ''.join(traceback.format_exception(exc))[-4000:]
+    if job.attempts < job.max_attempts:
+        job.status = Job.QUEUED
+        job.run_at = timezone.now() + timedelta(seconds=retry_delay(job.attempts))
+        logger.warning("Job failed, retrying", extra={"job_id": job.id, "task": job.task, "attempts": job.attempts, "run_at": job.run_at})
+    else:
+        job.status = Job.FAILED
+        job.finished_at = timezone.now()
+        logger.error("Job failed permanently", extra={"job_id": job.id, "task": job.task, "attempts": job.attempts})
+    job.locked_at = None
+    job.locked_by = None
+    job.save(update_fields=['status', 'run_at', 'last_error', 'finished_at', 'locked_at', 'locked_by'])
+
+
+def retry_delay(attempts):
+    """Exponential backoff with jitter: ~10s, 20s, 40s, ... capped at an hour."""
+    delay = min(RETRY_BASE_SECONDS * 2 ** (attempts - 1), RETRY_MAX_SECONDS)
+    return delay * random.uniform(0.8, 1.2)
+
+
+def requeue_stale(max_age=STALE_LOCK_SECONDS):
+    """Put running jobs whose worker stopped sending heartbeats (died mid-run) back in the queue."""
+    cutoff = timezone.now() - timedelta(seconds=max_age)
+    count = Job.objects.filter(status=Job.RUNNING, locked_at__lt=cutoff).update(
+        status=Job.QUEUED, locked_at=None, locked_by=None, run_at=timezone.now()
+    )
+    if count:
+        logger.warning("Requeued stale jobs", extra={"count": count})
+    return count
+
+
+def _is_json(value):
+    return value is None or isinstance(value, (dict, list, str, int, float, bool))
@@ -0,0 +1,128 @@
+import logging
+import multiprocessing
+import tempfile
+import time
+from datetime import timedelta
+
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from emotuna.logging_utils import NonBlockingStreamHandler
+from jobs import queue
+from jobs.models import Job
+
+CALLS = []
+
+
+@queue.task(max_attempts=2)
+def record(value):
+    CALLS.append(value)
+    return {'value': value}
+
+
+@queue.task(max_attempts=2)
+def explode():
+    raise RuntimeError('boom')
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        CALLS.clear()
+
+    def test_claim_returns_oldest_due_job_once(self):
+        first = record.enqueue({'value': 1})
+        record.enqueue({'value': 2}, delay=timedelta(hours=1))
+        job = queue.claim('test')
+        self.assertEqual(job.id, first.id)
+        self.assertEqual(job.status, Job.RUNNING)
+        self.assertEqual(job.attempts, 1)
+        # The second job isn't due yet and the first is already running
+        self.assertIsNone(queue.claim('test'))
+
+    def test_run_job_records_result(self):
+        record.enqueue({'value': 3})
+        job = queue.claim('test')
+        self.assertTrue(queue.run_job(job))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.SUCCEEDED)
+        self.assertEqual(job.result, {'value': 3})
+        self.assertEqual(CALLS, [3])
+
+    def test_failure_retries_with_backoff_then_fails(self):
+        explode.enqueue()
+        job = queue.claim('test')
+        self.assertFalse(queue.run_job(job))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.QUEUED)
+        self.assertGreater(job.run_at, timezone.now())
+        self.assertIn('boom', job.last_error)
+
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        job = queue.claim('test')
+        queue.run_job(job)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertEqual(job.attempts, 2)
+
+    def test_stale_running_jobs_are_requeued(self):
+        record.enqueue({'value': 4})
+        job = queue.claim('test')
+        Job.objects.filter(pk=job.pk).update(locked_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(queue.requeue_stale(), 1)
+        self.assertEqual(queue.claim('test').id, job.id)
+
+    @override_settings(JOBS_EAGER=True)
+    def test_eager_mode_runs_inline(self):
+        job = record.enqueue({'value': 5})
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.SUCCEEDED)
+        self.assertEqual(CALLS, [5])
+
+
+@queue.task(max_attempts=2)
+def slow(seconds):
+    time.sleep(seconds)
+
+
+class JobHeartbeatTests(TransactionTestCase):
+    # The heartbeat thread has its own connection: rows must be committed
+
+    def test_long_running_job_is_not_requeued_while_alive(self):
+        slow.enqueue({'seconds': 0.5})
+        job = queue.claim('test')
+        # Claimed long ago, but its worker is still alive
+        Job.objects.filter(pk=job.pk).update(locked_at=timezone.now() - timedelta(hours=1))
+        with queue.heartbeat(job, interval=0.1):
+            time.sleep(0.3)
+            self.assertEqual(queue.requeue_stale(max_age=60), 0)
+            queue.run_job(job)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.SUCCEEDED)
+        self.assertEqual(job.attempts, 1)
+
+
+def _log_from_child(name):
+    logging.getLogger(name).warning('FROM CHILD')
+
+
+class WorkerLoggingTests(SimpleTestCase):
+    def test_forked_worker_records_are_written(self):
+        # run_workers forks after settings (and the logging handler) are loaded
+        with tempfile.TemporaryFile('w+') as stream:
+            handler = NonBlockingStreamHandler(stream)
+            logger = logging.getLogger('jobs.tests.fork')
+            logger.addHandler(handler)
+            logger.propagate = False
+            try:
+                logger.warning('FROM PARENT')
+                child = multiprocessing.get_context('fork').Process(target=_log_from_child, args=(logger.name,))
+                child.start()
+                child.join(10)
+                self.assertEqual(child.exitcode, 0)
+            finally:
+                logger.removeHandler(handler)
+                handler.close()
+            stream.seek(0)
+            output = stream.read()
+        self.assertIn('FROM PARENT', output)
+        self.assertIn('FROM CHILD', output)
@@ -0,0 +1,58 @@
+"""
+Worker loop for the job queue, run by `manage.py run_workers`.
+"""
+
+import logging
+import os
+import signal
+import socket
+import time
+
+from django.db import close_old_connections, connections
+
+from jobs import queue
+
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL = 1.0
+REAP_INTERVAL = 60.0
+
+
+class Worker:
+    def __init__(self, index=0, tasks=None, poll_interval=POLL_INTERVAL, burst=False):
+        self.worker_id = f'{socket.gethostname()}:{os.getpid()}:{index}'
+        self.tasks = tasks
+        self.poll_interval = poll_interval
+        self.burst = burst  # exit once the queue is empty
+        self.running = True
+
+    def stop(self, *args):
+        self.running = False
+
+    def run(self):
+        # Inherited connections can't be shared across processes
+        connections.close_all()
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        logger.info("Worker started", extra={"worker": self.worker_id})
+        last_reap = 0.0
+        while self.running:
+            close_old_connections()
+            if time.monotonic() - last_reap > REAP_INTERVAL:
+                queue.requeue_stale()
+                last_reap = time.monotonic()
+            job = queue.claim(self.worker_id, tasks=self.tasks)
+            if job is None:
+                if self.burst:
+                    break
+                time.sleep(self.poll_interval)
+                continue
+            logger.debug("Job claimed", extra={"worker": self.worker_id, "job_id": job.id, "task": job.task})
+            with queue.heartbeat(job):
+                queue.run_job(job)
+        connections.close_all()
+        logger.info("Worker stopped", extra={"worker": self.worker_id})
+
+
+def run_worker(index, tasks=None, poll_interval=POLL_INTERVAL, burst=False):
+    Worker(index, tasks=tasks, poll_interval=poll_interval, burst=burst).run()